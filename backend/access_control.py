@@ -0,0 +1,183 @@
+"""Repository permissions for the current request.
+
+Read access: the repository is public, or the user owns it or collaborates
+on it. Write access: the user owns it or collaborates on it.
+
+``AccessControl`` memoizes what it learns per repository for the lifetime
+of the request, so checking the same repository twice (or checking it and
+then filtering a list that contains it) costs a single lookup. Handlers get
+it through ``get_access`` (primary session), ``get_read_access`` (the
+session from ``get_read_db``) or ``get_optional_read_access`` (anonymous
+callers allowed).
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Set, Union
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import get_current_user_optional, verify_clerk_token
+from database import get_async_db, get_read_db
+from models import Repository as RepositoryModel, RepositoryCollaborator, User as UserModel
+
+RepositoryRef = Union[str, RepositoryModel]
+
+
+def access_query(repo_ids: Iterable[str], user_id: Optional[str]):
+    """Owner, visibility and (for a signed-in user) membership of ``repo_ids``"""
+    columns = [RepositoryModel.id, RepositoryModel.owner_id, RepositoryModel.is_private]
+    if user_id:
+        columns.append(exists().where(
+            RepositoryCollaborator.repository_id == RepositoryModel.id,
+            RepositoryCollaborator.user_id == user_id,
+        ).label("is_collaborator"))
+    return select(*columns).where(RepositoryModel.id.in_(list(repo_ids)))
+
+
+def readable_criterion(user_id: Optional[str]):
+    """SQL criterion selecting the repositories ``user_id`` may read"""
+    public = RepositoryModel.is_private == False  # noqa: E712
+    if user_id is None:
+        return public
+    return (
+        public
+        | (RepositoryModel.owner_id == user_id)
+        | RepositoryModel.collaborators.any(RepositoryCollaborator.user_id == user_id)
+    )
+
+
+@dataclass
+class _RepositoryAccess:
+    owner_id: str
+    is_private: bool
+    # None until looked up; owners never need the lookup
+    is_collaborator: Optional[bool] = None
+
+
+class AccessControl:
+    def __init__(self, db: AsyncSession, user: Optional[UserModel]):
+        self.db = db
+        self.user = user
+        self._repositories: Dict[str, Optional[_RepositoryAccess]] = {}
+
+    @property
+    def user_id(self) -> Optional[str]:
+        return self.user.id if self.user is not None else None
+
+    async def _resolve(self, repo_ids: Iterable[str], need_membership: bool) -> None:
+        """Load what is still unknown about ``repo_ids`` with one query"""
+        repo_ids = set(repo_ids)
+        pending = {repo_id for repo_id in repo_ids if repo_id not in self._repositories}
+        if need_membership and self.user_id:
+            pending |= {
+                repo_id for repo_id in repo_ids
+                if (access := self._repositories.get(repo_id)) is not None
+                and access.is_collaborator is None and not self._is_owner(access)
+            }
+        if not pending:
+            return
+
+        rows = (await self.db.execute(access_query(pending, self.user_id))).all()
+
+        for repo_id in pending:
+            self._repositories.setdefault(repo_id, None)
+        for row in rows:
+            self._repositories[row.id] = _RepositoryAccess(
+                owner_id=row.owner_id,
+                is_private=bool(row.is_private),
+                is_collaborator=bool(row.is_collaborator) if self.user_id else False,
+            )
+
+    def _remember(self, repo: RepositoryRef) -> str:
+        """Accept an already loaded repository without querying for its columns"""
+        if isinstance(repo, str):
+            return repo
+        if repo.id not in self._repositories:
+            self._repositories[repo.id] = _RepositoryAccess(owner_id=repo.owner_id, is_private=bool(repo.is_private))
+        return repo.id
+
+    def _is_owner(self, access: _RepositoryAccess) -> bool:
+        return self.user_id is not None and access.owner_id == self.user_id
+
+    async def _access(self, repo: RepositoryRef, need_membership: bool) -> Optional[_RepositoryAccess]:
+        repo_id = self._remember(repo)
+        await self._resolve([repo_id], need_membership)
+        return self._repositories[repo_id]
+
+    async def exists(self, repo: RepositoryRef) -> bool:
+        return await self._access(repo, need_membership=False) is not None
+
+    async def is_owner(self, repo: RepositoryRef) -> bool:
+        access = await self._access(repo, need_membership=False)
+        return access is not None and self._is_owner(access)
+
+    async def can_write(self, repo: RepositoryRef) -> bool:
+        access = await self._access(repo, need_membership=False)
+        if access is None or self.user_id is None:
+            return False
+        if self._is_owner(access):
+            return True
+        access = await self._access(repo, need_membership=True)
+        return bool(access.is_collaborator)
+
+    async def can_read(self, repo: RepositoryRef) -> bool:
+        access = await self._access(repo, need_membership=False)
+        if access is None:
+            return False
+        return not access.is_private or await self.can_write(repo)
+
+    async def filter_readable(self, repo_ids: Iterable[str]) -> Set[str]:
+        """The subset of ``repo_ids`` the user may read, in at most one query"""
+        repo_ids = set(repo_ids)
+        await self._resolve(repo_ids, need_membership=True)
+        return {repo_id for repo_id in repo_ids if await self.can_read(repo_id)}
+
+    def readable_filter(self):
+        """SQL criterion selecting the repositories the user may read, for list queries"""
+        return readable_criterion(self.user_id)
+
+    async def require_read(self, repo: RepositoryRef, detail: str = "Access denied to private repository") -> None:
+        """Raise 404 for a missing repository and 403 when the user may not read it"""
+        if not await self.exists(repo):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Repository not found")
+        if not await self.can_read(repo):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+    async def require_write(
+        self, repo: RepositoryRef, detail: str = "Insufficient permissions to modify this repository"
+    ) -> None:
+        """Raise 404 for a missing repository and 403 unless the user owns or collaborates on it"""
+        if not await self.exists(repo):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Repository not found")
+        if not await self.can_write(repo):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+    async def require_owner(
+        self, repo: RepositoryRef, detail: str = "Only the repository owner can do this"
+    ) -> None:
+        if not await self.exists(repo):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Repository not found")
+        if not await self.is_owner(repo):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+
+async def get_access(
+    current_user: UserModel = Depends(verify_clerk_token),
+    db: AsyncSession = Depends(get_async_db)
+) -> AccessControl:
+    return AccessControl(db, current_user)
+
+
+async def get_read_access(
+    current_user: UserModel = Depends(verify_clerk_token),
+    db: AsyncSession = Depends(get_read_db)
+) -> AccessControl:
+    return AccessControl(db, current_user)
+
+
+async def get_optional_read_access(
+    current_user: Optional[UserModel] = Depends(get_current_user_optional),
+    db: AsyncSession = Depends(get_read_db)
+) -> AccessControl:
+    return AccessControl(db, current_user)
@@ -3,6 +3,7 @@ import os
 from typing import Dict, List, Optional, AsyncGenerator
 from dotenv import load_dotenv
 from document_parser import DocumentParser, DocumentChange
+from instrumentation import ai_call
 import json
 import re
 
@@ -176,7 +177,8 @@ class EnhancedAIService:
             }}
             """
 
-            response = await self.model.generate_content_async(context)
+            async with ai_call("validate_merge_request"):
+                response = await self.model.generate_content_async(context)
 
             # Parse AI response
             analysis = self._parse_enhanced_ai_response(response.text)
@@ -223,7 +225,8 @@ class EnhancedAIService:
         """
 
         try:
-            response = await self.model.generate_content_async(prompt)
+            async with ai_call("document_credibility"):
+                response = await self.model.generate_content_async(prompt)
             return self._parse_credibility_response(response.text)
         except Exception as e:
             return {"credibility_score": 50, "analysis": f"Error: {str(e)}"}
@@ -246,7 +249,8 @@ class EnhancedAIService:
         """
 
         try:
-            response = await self.model.generate_content_async(prompt)
+            async with ai_call("sensitive_information"):
+                response = await self.model.generate_content_async(prompt)
             return self._parse_sensitivity_response(response.text)
         except Exception as e:
             return {"sensitive_items": [], "risk_level": "unknown"}
@@ -267,7 +271,8 @@ class EnhancedAIService:
         """
 
         try:
-            response = await self.model.generate_content_async(prompt)
+            async with ai_call("document_improvements"):
+                response = await self.model.generate_content_async(prompt)
             return self._extract_suggestions(response.text)
         except Exception as e:
             return [f"Error generating suggestions: {str(e)}"]
@@ -549,7 +554,8 @@ class EnhancedAIService:
             Provide a comprehensive, accurate answer based solely on the repository information above. Include specific details, file contents, commit information, and technical analysis as relevant to the question.
             """
 
-            response = await self.model.generate_content_async(prompt)
+            async with ai_call("chatbot"):
+                response = await self.model.generate_content_async(prompt)
             return response.text.strip()
 
         except Exception as e:
@@ -656,12 +662,13 @@ class EnhancedAIService:
             """
 
             # Use streaming generation
-            response = await self.model.generate_content_async(prompt, stream=True)
-            
-            # Stream the response
-            async for chunk in response:
-                if chunk.text:
-                    yield chunk.text
+            async with ai_call("chatbot_stream"):
+                response = await self.model.generate_content_async(prompt, stream=True)
+
+                # Stream the response
+                async for chunk in response:
+                    if chunk.text:
+                        yield chunk.text
                     
         except Exception as e:
             yield f"Error: {str(e)}"
\ No newline at end of file
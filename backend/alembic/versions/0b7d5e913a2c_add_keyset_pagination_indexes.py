@@ -0,0 +1,67 @@
+"""add_keyset_pagination_indexes
+
+Revision ID: 0b7d5e913a2c
+Revises: f3a91c2d7b64
+Create Date: 2026-10-19 14:03:55.720416
+
+Composite (sort key, id) indexes for cursor pagination. The commits and
+audit_entries indexes from f3a91c2d7b64 are superseded by the same
+columns plus id, so the old ones are dropped once the new ones exist.
+As in f3a91c2d7b64, INVALID leftovers of an interrupted concurrent build
+are dropped on re-run before the index is rebuilt.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b7d5e913a2c'
+down_revision = 'f3a91c2d7b64'
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns)
+INDEXES = [
+    ('ix_repositories_created_at_id', 'repositories', ['created_at', 'id']),
+    ('ix_merge_requests_created_at_id', 'merge_requests', ['created_at', 'id']),
+    ('ix_users_created_at_id', 'users', ['created_at', 'id']),
+    ('ix_commits_repository_id_timestamp_id', 'commits', ['repository_id', 'timestamp', 'id']),
+    ('ix_audit_entries_repository_id_created_at_id', 'audit_entries', ['repository_id', 'created_at', 'id']),
+]
+
+# (name, table, columns) replaced by the wider indexes above
+SUPERSEDED = [
+    ('ix_commits_repository_id_timestamp', 'commits', ['repository_id', 'timestamp']),
+    ('ix_audit_entries_repository_id_created_at', 'audit_entries', ['repository_id', 'created_at']),
+]
+
+
+def _drop_invalid_index(name: str) -> None:
+    """Drop an index left INVALID by an interrupted CREATE INDEX CONCURRENTLY"""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    invalid = op.get_bind().execute(sa.text(
+        'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+        'WHERE pg_class.relname = :name AND NOT pg_index.indisvalid'
+    ), {'name': name}).first()
+    if invalid:
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            _drop_invalid_index(name)
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+        for name, table, _ in SUPERSEDED:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in SUPERSEDED:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
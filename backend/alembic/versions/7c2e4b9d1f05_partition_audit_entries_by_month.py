@@ -0,0 +1,117 @@
+"""partition_audit_entries_by_month
+
+Revision ID: 7c2e4b9d1f05
+Revises: 0b7d5e913a2c
+Create Date: 2026-10-19 18:22:07.514093
+
+Rebuilds audit_entries on PostgreSQL as a table range partitioned by month
+on created_at (see audit_partitions.py), with a default partition for rows
+outside the monthly ranges. A partitioned table's primary key must contain
+the partition key, so it becomes (id, created_at), and created_at becomes
+NOT NULL (rows without one get the migration time).
+
+The rows are copied into the new table, so audit writes are blocked for the
+duration; run it in a maintenance window on a large table. Other databases
+keep the plain table.
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e4b9d1f05'
+down_revision = '0b7d5e913a2c'
+branch_labels = None
+depends_on = None
+
+
+MONTHS_AHEAD = 3
+
+COLUMNS = 'id, action, user_id, repository_id, details, created_at'
+
+INDEXES = [
+    ('ix_audit_entries_repository_id_created_at_id', ['repository_id', 'created_at', 'id']),
+    ('ix_audit_entries_created_at', ['created_at']),
+]
+
+
+def _month(year: int, month: int, offset: int = 0) -> datetime:
+    index = year * 12 + month - 1 + offset
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _create_table(name: str, partitioned: bool) -> None:
+    op.execute(f"""
+        CREATE TABLE {name} (
+            id VARCHAR NOT NULL,
+            action VARCHAR NOT NULL,
+            user_id VARCHAR NOT NULL REFERENCES users (id),
+            repository_id VARCHAR REFERENCES repositories (id),
+            details JSON,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT audit_entries_pkey PRIMARY KEY ({'id, created_at' if partitioned else 'id'})
+        ){' PARTITION BY RANGE (created_at)' if partitioned else ''}
+    """)
+
+
+def _swap_out_old_table() -> None:
+    op.execute('ALTER TABLE audit_entries RENAME TO audit_entries_old')
+    op.execute('ALTER TABLE audit_entries_old RENAME CONSTRAINT audit_entries_pkey TO audit_entries_old_pkey')
+    for name, _ in INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+def _create_indexes() -> None:
+    for name, columns in INDEXES:
+        op.create_index(name, 'audit_entries', columns)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    already = bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('audit_entries')"
+    )).first()
+    if already:
+        return
+
+    _swap_out_old_table()
+    _create_table('audit_entries', partitioned=True)
+
+    oldest = bind.execute(sa.text('SELECT min(created_at) FROM audit_entries_old')).scalar()
+    now = datetime.now(timezone.utc)
+    start = oldest or now
+    month = _month(start.year, start.month)
+    last = _month(now.year, now.month, MONTHS_AHEAD)
+    while month <= last:
+        following = _month(month.year, month.month, 1)
+        op.execute(
+            f"CREATE TABLE audit_entries_{month:%Y_%m} PARTITION OF audit_entries "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        )
+        month = following
+    op.execute('CREATE TABLE audit_entries_default PARTITION OF audit_entries DEFAULT')
+
+    op.execute(
+        f'INSERT INTO audit_entries ({COLUMNS}) '
+        f'SELECT id, action, user_id, repository_id, details, COALESCE(created_at, now()) FROM audit_entries_old'
+    )
+    op.execute('DROP TABLE audit_entries_old')
+    _create_indexes()
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    _swap_out_old_table()
+    _create_table('audit_entries', partitioned=False)
+    op.execute(f'INSERT INTO audit_entries ({COLUMNS}) SELECT {COLUMNS} FROM audit_entries_old')
+    # Drops the partitions with it; archived months stay in their files
+    op.execute('DROP TABLE audit_entries_old')
+    _create_indexes()
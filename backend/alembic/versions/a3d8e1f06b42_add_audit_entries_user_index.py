@@ -0,0 +1,55 @@
+"""add_audit_entries_user_index
+
+Revision ID: a3d8e1f06b42
+Revises: 7c2e4b9d1f05
+Create Date: 2026-10-19 21:40:12.318604
+
+(user_id, created_at, id) index for audit queries by user across
+repositories. PostgreSQL cannot build an index concurrently on a
+partitioned table, so there the index is created on the parent only, built
+concurrently on each partition and attached; writes are never blocked.
+Partitions created later get it automatically.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d8e1f06b42'
+down_revision = '7c2e4b9d1f05'
+branch_labels = None
+depends_on = None
+
+
+NAME = 'ix_audit_entries_user_id_created_at_id'
+COLUMNS = ['user_id', 'created_at', 'id']
+
+
+def _partitions(bind):
+    return bind.execute(sa.text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass('audit_entries')"
+    )).scalars().all()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    partitions = _partitions(bind) if bind.dialect.name == 'postgresql' else []
+    if not partitions:
+        with op.get_context().autocommit_block():
+            op.create_index(NAME, 'audit_entries', COLUMNS, if_not_exists=True, postgresql_concurrently=True)
+        return
+
+    op.execute(f"CREATE INDEX IF NOT EXISTS {NAME} ON ONLY audit_entries ({', '.join(COLUMNS)})")
+    with op.get_context().autocommit_block():
+        for partition in partitions:
+            child = f'{partition}_user_id_created_at_id_idx'
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} ({', '.join(COLUMNS)})")
+            op.execute(f'ALTER INDEX {NAME} ATTACH PARTITION {child}')
+
+
+def downgrade() -> None:
+    # Dropping the parent index drops the attached partition indexes with it
+    op.drop_index(NAME, table_name='audit_entries')
@@ -0,0 +1,45 @@
+"""layered_commit_graph_layout
+
+Revision ID: a8d3f1c6e592
+Revises: e6c2a9f4b718
+Create Date: 2026-10-22 09:17:40.561203
+
+Commit graph nodes record the layer and lane they were laid out on, and the
+graph the extent of its layout, so appended commits can be placed without
+laying the graph out again (see graph_layout.py). Stored graphs carry the old
+single-column layout and are dropped; the next POST /graph/generate of a
+repository rebuilds its graph.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d3f1c6e592'
+down_revision = 'e6c2a9f4b718'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute('DELETE FROM commit_graph_nodes')
+    op.execute('DELETE FROM commit_graph_edges')
+    op.execute('DELETE FROM commit_graphs')
+    op.add_column('commit_graphs', sa.Column('layer_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('commit_graphs', sa.Column('lane_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('commit_graphs', sa.Column('layout_height', sa.Float(), server_default='0', nullable=False))
+    op.add_column('commit_graph_nodes', sa.Column('layer', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('commit_graph_nodes', sa.Column('lane', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_commit_graph_nodes_graph_id_node_id', 'commit_graph_nodes', ['graph_id', 'node_id'])
+    op.create_index('ix_commit_graph_edges_graph_id_source', 'commit_graph_edges', ['graph_id', 'source'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_commit_graph_edges_graph_id_source', table_name='commit_graph_edges')
+    op.drop_index('ix_commit_graph_nodes_graph_id_node_id', table_name='commit_graph_nodes')
+    op.drop_column('commit_graph_nodes', 'lane')
+    op.drop_column('commit_graph_nodes', 'layer')
+    op.drop_column('commit_graphs', 'layout_height')
+    op.drop_column('commit_graphs', 'lane_count')
+    op.drop_column('commit_graphs', 'layer_count')
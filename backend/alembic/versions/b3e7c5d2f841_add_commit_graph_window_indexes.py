@@ -0,0 +1,33 @@
+"""add_commit_graph_window_indexes
+
+Revision ID: b3e7c5d2f841
+Revises: a8d3f1c6e592
+Create Date: 2026-10-22 15:03:51.822946
+
+Indexes behind GET /graph/window: node rows by layer, by layout position
+(y, then x) and by commit, and edge rows by target, so a window reads only
+the rows it returns.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e7c5d2f841'
+down_revision = 'a8d3f1c6e592'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_commit_graph_nodes_graph_id_layer', 'commit_graph_nodes', ['graph_id', 'layer'])
+    op.create_index('ix_commit_graph_nodes_graph_id_y_x', 'commit_graph_nodes', ['graph_id', 'y', 'x'])
+    op.create_index('ix_commit_graph_nodes_graph_id_commit_sha', 'commit_graph_nodes', ['graph_id', 'commit_sha'])
+    op.create_index('ix_commit_graph_edges_graph_id_target', 'commit_graph_edges', ['graph_id', 'target'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_commit_graph_edges_graph_id_target', table_name='commit_graph_edges')
+    op.drop_index('ix_commit_graph_nodes_graph_id_commit_sha', table_name='commit_graph_nodes')
+    op.drop_index('ix_commit_graph_nodes_graph_id_y_x', table_name='commit_graph_nodes')
+    op.drop_index('ix_commit_graph_nodes_graph_id_layer', table_name='commit_graph_nodes')
@@ -0,0 +1,27 @@
+"""add_repository_git_import_head
+
+Revision ID: c5f2a8e6d193
+Revises: b3e7c5d2f841
+Create Date: 2026-10-23 11:26:08.417395
+
+Repositories remember the last commit the git importer wrote, so the next
+import continues from there (see git_import.py).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f2a8e6d193'
+down_revision = 'b3e7c5d2f841'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('repositories', sa.Column('git_import_head', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('repositories', 'git_import_head')
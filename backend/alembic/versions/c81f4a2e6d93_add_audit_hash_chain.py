@@ -0,0 +1,75 @@
+"""add_audit_hash_chain
+
+Revision ID: c81f4a2e6d93
+Revises: a3d8e1f06b42
+Create Date: 2026-10-19 23:05:47.902115
+
+Adds the hash chain columns to audit_entries, the chain head and the
+verification checkpoints (see audit_chain.py). Existing entries stay
+outside the chain (chain_seq NULL); the chain starts with the first entry
+written after the upgrade. The chain_seq index is built like
+ix_audit_entries_user_id_created_at_id in a3d8e1f06b42.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f4a2e6d93'
+down_revision = 'a3d8e1f06b42'
+branch_labels = None
+depends_on = None
+
+
+INDEX = 'ix_audit_entries_chain_seq'
+
+
+def _partitions(bind):
+    return bind.execute(sa.text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass('audit_entries')"
+    )).scalars().all()
+
+
+def upgrade() -> None:
+    op.add_column('audit_entries', sa.Column('chain_seq', sa.BigInteger(), nullable=True))
+    op.add_column('audit_entries', sa.Column('prev_hash', sa.String(length=64), nullable=True))
+    op.add_column('audit_entries', sa.Column('hash', sa.String(length=64), nullable=True))
+    op.create_table(
+        'audit_chain_head',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(f"INSERT INTO audit_chain_head (id, seq, hash) VALUES (1, 0, '{'0' * 64}')")
+    op.create_table(
+        'audit_chain_checkpoints',
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('verified_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('seq')
+    )
+
+    bind = op.get_bind()
+    partitions = _partitions(bind) if bind.dialect.name == 'postgresql' else []
+    if not partitions:
+        op.create_index(INDEX, 'audit_entries', ['chain_seq'])
+        return
+    # The new column is all NULL, so these builds are quick
+    op.execute(f'CREATE INDEX {INDEX} ON ONLY audit_entries (chain_seq)')
+    for partition in partitions:
+        child = f'{partition}_chain_seq_idx'
+        op.execute(f'CREATE INDEX {child} ON {partition} (chain_seq)')
+        op.execute(f'ALTER INDEX {INDEX} ATTACH PARTITION {child}')
+
+
+def downgrade() -> None:
+    op.drop_index(INDEX, table_name='audit_entries')
+    op.drop_table('audit_chain_checkpoints')
+    op.drop_table('audit_chain_head')
+    op.drop_column('audit_entries', 'hash')
+    op.drop_column('audit_entries', 'prev_hash')
+    op.drop_column('audit_entries', 'chain_seq')
@@ -0,0 +1,53 @@
+"""add_dashboard_rollups
+
+Revision ID: d4b7e9a1c350
+Revises: c81f4a2e6d93
+Create Date: 2026-10-20 09:14:26.551870
+
+Daily rollup tables for /api/dashboard/stats (see rollups.py). They start
+empty; fill them for past days with rollup_reconcile.py, e.g.
+``python rollup_reconcile.py --from 2025-01-01``.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b7e9a1c350'
+down_revision = 'c81f4a2e6d93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'daily_repository_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('repositories_created', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table(
+        'daily_repository_activity',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('repository_id', sa.String(), nullable=False),
+        sa.Column('events', sa.Integer(), nullable=False),
+        sa.Column('uploads', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'repository_id')
+    )
+    op.create_table(
+        'daily_author_merge_request_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('author_id', sa.String(), nullable=False),
+        sa.Column('opened', sa.Integer(), nullable=False),
+        sa.Column('merged', sa.Integer(), nullable=False),
+        sa.Column('closed', sa.Integer(), nullable=False),
+        sa.Column('cycle_days_total', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'author_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('daily_author_merge_request_stats')
+    op.drop_table('daily_repository_activity')
+    op.drop_table('daily_repository_stats')
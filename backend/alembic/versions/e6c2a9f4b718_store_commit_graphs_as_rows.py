@@ -0,0 +1,71 @@
+"""store_commit_graphs_as_rows
+
+Revision ID: e6c2a9f4b718
+Revises: d4b7e9a1c350
+Create Date: 2026-10-21 10:42:13.204518
+
+Commit graphs move from one JSON blob per repository to node and edge rows
+that regeneration appends to (see commit_graph_service.py). Graphs are
+derived from the commits, so stored graphs are dropped instead of converted:
+the next POST /graph/generate of a repository rebuilds its graph.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6c2a9f4b718'
+down_revision = 'd4b7e9a1c350'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute('DELETE FROM commit_graphs')
+    op.drop_column('commit_graphs', 'graph_data')
+    op.add_column('commit_graphs', sa.Column('commit_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('commit_graphs', sa.Column('head_timestamp', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('commit_graphs', sa.Column('head_commit_id', sa.String(), nullable=True))
+    op.add_column('commit_graphs', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+    op.create_table(
+        'commit_graph_nodes',
+        sa.Column('graph_id', sa.String(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('node_id', sa.String(), nullable=False),
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('label', sa.String(), nullable=False),
+        sa.Column('details', sa.JSON(), nullable=True),
+        sa.Column('commit_sha', sa.String(), nullable=False),
+        sa.Column('file_path', sa.String(), nullable=True),
+        sa.Column('x', sa.Float(), nullable=False),
+        sa.Column('y', sa.Float(), nullable=False),
+        sa.Column('level', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['graph_id'], ['commit_graphs.id'], ),
+        sa.PrimaryKeyConstraint('graph_id', 'seq')
+    )
+    op.create_index('ix_commit_graph_nodes_graph_id_file_path_seq', 'commit_graph_nodes',
+                    ['graph_id', 'file_path', 'seq'])
+    op.create_table(
+        'commit_graph_edges',
+        sa.Column('graph_id', sa.String(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('target', sa.String(), nullable=False),
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('details', sa.JSON(), nullable=True),
+        sa.ForeignKeyConstraint(['graph_id'], ['commit_graphs.id'], ),
+        sa.PrimaryKeyConstraint('graph_id', 'seq')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('commit_graph_edges')
+    op.drop_index('ix_commit_graph_nodes_graph_id_file_path_seq', table_name='commit_graph_nodes')
+    op.drop_table('commit_graph_nodes')
+    op.execute('DELETE FROM commit_graphs')
+    op.drop_column('commit_graphs', 'version')
+    op.drop_column('commit_graphs', 'head_commit_id')
+    op.drop_column('commit_graphs', 'head_timestamp')
+    op.drop_column('commit_graphs', 'commit_count')
+    op.add_column('commit_graphs', sa.Column('graph_data', sa.JSON(), nullable=False))
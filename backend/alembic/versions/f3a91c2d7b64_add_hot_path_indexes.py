@@ -0,0 +1,113 @@
+"""add_hot_path_indexes
+
+Revision ID: f3a91c2d7b64
+Revises: e28c09e28228
+Create Date: 2026-10-19 10:12:41.318204
+
+Indexes are built with CREATE INDEX CONCURRENTLY on PostgreSQL so the
+tables stay writable while the migration runs. Unique constraints are
+attached to the concurrently built index afterwards (ADD CONSTRAINT ...
+USING INDEX), which only needs a brief lock.
+
+A CONCURRENTLY build that fails (e.g. cancelled, or a duplicate slipped in)
+leaves an INVALID index behind. Re-running the upgrade drops such leftovers
+before rebuilding them and skips indexes and constraints that already
+completed, so a failed run can simply be retried.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a91c2d7b64'
+down_revision = 'e28c09e28228'
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns) for plain secondary indexes
+INDEXES = [
+    ('ix_commits_repository_id_timestamp', 'commits', ['repository_id', 'timestamp']),
+    ('ix_commit_files_commit_id', 'commit_files', ['commit_id']),
+    ('ix_audit_entries_repository_id_created_at', 'audit_entries', ['repository_id', 'created_at']),
+    # Global recent-activity feed on the dashboard
+    ('ix_audit_entries_created_at', 'audit_entries', ['created_at']),
+    ('ix_merge_requests_status_created_at', 'merge_requests', ['status', 'created_at']),
+]
+
+# (name, table, columns) for uniqueness the application code already relies on
+UNIQUE_CONSTRAINTS = [
+    ('uq_repository_files_repository_id_path', 'repository_files', ['repository_id', 'path']),
+    ('uq_file_versions_file_id_version_number', 'file_versions', ['file_id', 'version_number']),
+    ('uq_merge_request_versions_merge_request_id_version_number', 'merge_request_versions',
+     ['merge_request_id', 'version_number']),
+    ('uq_repository_collaborators_repository_id_user_id', 'repository_collaborators', ['repository_id', 'user_id']),
+]
+
+
+def _is_postgresql() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def _assert_no_duplicates(table: str, columns: list) -> None:
+    """Fail early with a readable message instead of a half-built unique index"""
+    column_list = ', '.join(columns)
+    duplicates = op.get_bind().execute(sa.text(
+        f'SELECT {column_list}, COUNT(*) FROM {table} GROUP BY {column_list} HAVING COUNT(*) > 1 LIMIT 5'
+    )).fetchall()
+    if duplicates:
+        raise RuntimeError(
+            f'Cannot add unique constraint on {table}({column_list}): duplicate rows exist, e.g. '
+            f'{[tuple(row) for row in duplicates]}. Remove the duplicates and re-run the migration.'
+        )
+
+
+def _drop_invalid_index(name: str) -> None:
+    """Drop an index left INVALID by an interrupted CREATE INDEX CONCURRENTLY"""
+    if not _is_postgresql():
+        return
+    invalid = op.get_bind().execute(sa.text(
+        'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+        'WHERE pg_class.relname = :name AND NOT pg_index.indisvalid'
+    ), {'name': name}).first()
+    if invalid:
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+def _has_constraint(name: str) -> bool:
+    return op.get_bind().execute(
+        sa.text('SELECT 1 FROM pg_constraint WHERE conname = :name'), {'name': name}
+    ).first() is not None
+
+
+def upgrade() -> None:
+    for _, table, columns in UNIQUE_CONSTRAINTS:
+        _assert_no_duplicates(table, columns)
+
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            _drop_invalid_index(name)
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+        for name, table, columns in UNIQUE_CONSTRAINTS:
+            if _is_postgresql() and _has_constraint(name):
+                continue
+            _drop_invalid_index(name)
+            op.create_index(name, table, columns, unique=True, if_not_exists=True, postgresql_concurrently=True)
+            if _is_postgresql():
+                # The constraint takes over the index (and its name)
+                op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(UNIQUE_CONSTRAINTS):
+            if _is_postgresql():
+                op.drop_constraint(name, table, type_='unique')
+            else:
+                op.drop_index(name, table_name=table)
+
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
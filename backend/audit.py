@@ -1,31 +1,201 @@
-from typing import Optional, Dict
-from sqlalchemy.orm import Session
+"""Audit trail writes.
+
+``log_activity`` hands entries to ``audit_writer``, which buffers them in
+memory and inserts them in batches on its own connection, so an audited
+write endpoint commits once (its own change) instead of twice. A batch is
+written when ``AUDIT_BATCH_SIZE`` entries are waiting or ``AUDIT_FLUSH_SECONDS``
+after the first one arrived, whichever comes first, and whatever is left is
+written on shutdown. Pass ``durable=True`` for actions whose audit entry must
+be stored before the response goes out; that flushes the buffer in the
+request.
+
+Entries only live in memory until their batch is written: a worker that is
+killed (not shut down) loses up to ``AUDIT_FLUSH_SECONDS`` of entries.
+Each batch is linked onto the audit hash chain and folded into the
+dashboard rollups in the transaction that inserts it (audit_chain.py,
+rollups.py). Once a batch is committed it is published to
+the live Case History stream (audit_stream.py).
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from audit_chain import chain_rows
+from audit_partitions import ensure_partitions, month_floor
+from audit_stream import audit_broker
+from config import env_float, env_int
+from rollups import apply_audit_rows
+from database import async_engine
 from models import AuditEntry
-from datetime import datetime
 
-def log_activity(
-    db: Session,
+logger = logging.getLogger(__name__)
+
+AUDIT_BATCH_SIZE = env_int("AUDIT_BATCH_SIZE", 200)
+AUDIT_FLUSH_SECONDS = env_float("AUDIT_FLUSH_SECONDS", 0.5)
+# Entries kept while the database is unreachable; the oldest are dropped beyond this
+AUDIT_MAX_PENDING = env_int("AUDIT_MAX_PENDING", 50_000)
+
+
+class AuditWriter:
+    """Buffers audit rows and bulk-inserts them from a background task"""
+
+    def __init__(
+        self,
+        engine=async_engine,
+        broker=audit_broker,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_seconds: float = AUDIT_FLUSH_SECONDS,
+        max_pending: int = AUDIT_MAX_PENDING,
+    ):
+        self.engine = engine
+        self.broker = broker
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._pending: List[Dict] = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Month whose partitions are known to exist (PostgreSQL)
+        self._partitions_month: Optional[datetime] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write everything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def enqueue(self, row: Dict) -> None:
+        self._pending.append(row)
+        self._trim()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def _trim(self) -> None:
+        if len(self._pending) > self.max_pending:
+            dropped = len(self._pending) - self.max_pending
+            del self._pending[:dropped]
+            logger.error("Audit buffer full, dropped the %d oldest entries", dropped)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # Rows stay buffered and are retried on the next round
+                logger.exception("Audit flush failed")
+
+    async def flush(self) -> None:
+        """Write all buffered rows, ``batch_size`` per statement"""
+        async with self._lock:
+            if self._pending:
+                await self._ensure_partitions()
+            while self._pending:
+                # Taken off the buffer before awaiting, so enqueue can trim it meanwhile
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                try:
+                    written = await self._insert(batch)
+                except BaseException:
+                    # Back in front of the entries that arrived during the insert
+                    self._pending[:0] = batch
+                    self._trim()
+                    raise
+                await self._publish(written)
+
+    async def _publish(self, rows: List[Dict]) -> None:
+        if self.broker is None:
+            return
+        try:
+            await self.broker.publish(rows)
+        except Exception:
+            # The rows are stored; stream clients pick them up when they reconnect
+            logger.exception("Publishing %d audit entries failed", len(rows))
+
+    async def _ensure_partitions(self) -> None:
+        month = month_floor(datetime.now(timezone.utc))
+        if month != self._partitions_month:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(ensure_partitions)
+            self._partitions_month = month
+
+    async def _insert(self, batch: List[Dict]) -> List[Dict]:
+        """Insert ``batch`` and return the rows that were stored"""
+        try:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(chain_rows, batch)
+                await conn.execute(insert(AuditEntry), batch)
+                await conn.run_sync(apply_audit_rows, batch)
+            return batch
+        except (IntegrityError, DataError):
+            # One bad row (say, a repository deleted in the meantime) must not hold back the rest
+            written = []
+            for row in batch:
+                try:
+                    async with self.engine.begin() as conn:
+                        await conn.run_sync(chain_rows, [row])
+                        await conn.execute(insert(AuditEntry), [row])
+                        await conn.run_sync(apply_audit_rows, [row])
+                    written.append(row)
+                except (IntegrityError, DataError) as e:
+                    logger.error("Dropping audit entry %s (%s): %s", row["id"], row["action"], e.orig)
+            return written
+
+
+audit_writer = AuditWriter()
+
+
+async def log_activity(
+    db: AsyncSession,
     action: str,
     user_id: str,
     repository_id: Optional[str] = None,
-    details: Optional[Dict] = None
+    details: Optional[Dict] = None,
+    durable: bool = False
 ):
     """
-    Log an activity or audit entry to the database.
-    :param db: SQLAlchemy session
+    Record an activity or audit entry.
+    :param db: SQLAlchemy async session of the request (not used for the write)
     :param action: Action string (e.g., 'file_upload', 'merge_request_update')
     :param user_id: User performing the action
     :param repository_id: Optional repository context
     :param details: Optional dictionary with extra details
+    :param durable: Write the entry before returning instead of in the next batch
     """
-    entry = AuditEntry(
-        action=action,
-        user_id=user_id,
-        repository_id=repository_id,
-        details=details or {},
-        created_at=datetime.utcnow()
-    )
-    db.add(entry)
-    db.commit()
-    return entry
-
+    row = {
+        "id": str(uuid.uuid4()),
+        "action": action,
+        "user_id": user_id,
+        "repository_id": repository_id,
+        "details": details or {},
+        "created_at": datetime.utcnow(),
+    }
+    audit_writer.enqueue(row)
+    if durable or not audit_writer.running:
+        # Outside the app (scripts) there is no background task to write it later
+        await audit_writer.flush()
+    return AuditEntry(**row)
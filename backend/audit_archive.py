@@ -0,0 +1,69 @@
+"""Manage the monthly partitions of audit_entries (PostgreSQL only).
+
+Usage (from backend/):
+    python audit_archive.py list
+    python audit_archive.py ensure
+    python audit_archive.py archive --dir /var/backups/audit              # older than AUDIT_RETENTION_MONTHS
+    python audit_archive.py archive --dir /var/backups/audit --before 2026-01
+    python audit_archive.py restore /var/backups/audit/audit_entries_2025_11.csv.gz
+
+``archive`` detaches each month older than the cutoff, writes it to
+``<dir>/audit_entries_YYYY_MM.csv.gz`` and drops the table; ``restore``
+loads such a file and attaches it again, e.g. to answer an old inquiry.
+See audit_partitions.py.
+"""
+import argparse
+import sys
+from datetime import datetime, timezone
+
+from audit_partitions import (
+    AUDIT_RETENTION_MONTHS, add_months, archive_partition, attached_partitions, ensure_partitions,
+    is_partitioned, month_floor, restore_partition,
+)
+from database import engine
+
+
+def _month(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m").replace(tzinfo=timezone.utc)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Show the attached partitions and their row counts")
+    commands.add_parser("ensure", help="Create the partitions for this month and the months ahead")
+    archive = commands.add_parser("archive", help="Archive and drop partitions older than a month")
+    archive.add_argument("--dir", required=True, help="Directory for the .csv.gz files")
+    archive.add_argument("--before", type=_month, help="YYYY-MM; months before this one are archived")
+    restore = commands.add_parser("restore", help="Attach an archived month again")
+    restore.add_argument("path")
+    args = parser.parse_args(argv)
+
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            print("audit_entries is not partitioned (PostgreSQL with migration 7c2e4b9d1f05 required)",
+                  file=sys.stderr)
+            return 1
+
+        if args.command == "list":
+            for name, _ in attached_partitions(conn):
+                rows = conn.exec_driver_sql(f"SELECT count(*) FROM {name}").scalar()
+                print(f"{name}\t{rows}")
+        elif args.command == "ensure":
+            created = ensure_partitions(conn)
+            conn.commit()
+            print("\n".join(created))
+        elif args.command == "archive":
+            cutoff = args.before or add_months(month_floor(datetime.now(timezone.utc)), -AUDIT_RETENTION_MONTHS)
+            for name, month in attached_partitions(conn):
+                if month is not None and month < cutoff:
+                    path, rows = archive_partition(conn, month, args.dir)
+                    print(f"{name}: {rows} rows -> {path}")
+        elif args.command == "restore":
+            name, rows = restore_partition(conn, args.path)
+            print(f"{name}: {rows} rows attached")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""Hash chain over the audit trail.
+
+Every entry written by ``audit.AuditWriter`` gets the next sequence number
+(``chain_seq``), the hash of the entry before it (``prev_hash``) and its own
+``hash``: SHA-256 of the previous hash and the entry's content. Changing,
+removing or inserting an entry breaks the chain from that point on.
+``audit_chain_head`` holds the last link; the writer locks it for the
+duration of each batch insert, so writers in several processes extend one
+chain.
+
+Because each entry stores its predecessor's hash, any range of sequence
+numbers can be verified on its own and the ranges stitched together
+afterwards: ``verify_range`` checks one range, ``verify_chain`` walks the
+chain in ranges and records a checkpoint after each, so the next run only
+verifies what was written since. ``audit_verify.py`` runs the ranges in
+parallel worker processes.
+
+Archived partitions (audit_partitions.py) leave a gap at the start of the
+chain; a full verification starts at the oldest entry still present.
+
+Everything here takes a sync ``Connection``; from async code use
+``conn.run_sync``.
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Mapping, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.engine import Connection
+
+from config import env_int
+from models import AuditChainCheckpoint, AuditChainHead, AuditEntry
+
+AUDIT_VERIFY_BATCH = env_int("AUDIT_VERIFY_BATCH", 5000)
+# Entries verified between two checkpoints
+AUDIT_VERIFY_RANGE = env_int("AUDIT_VERIFY_RANGE", 500_000)
+
+GENESIS_HASH = "0" * 64
+_HEAD_ID = 1
+
+VERIFY_COLUMNS = [
+    AuditEntry.chain_seq, AuditEntry.prev_hash, AuditEntry.hash, AuditEntry.id, AuditEntry.action,
+    AuditEntry.user_id, AuditEntry.repository_id, AuditEntry.details, AuditEntry.created_at,
+]
+
+
+def _timestamp(value: datetime) -> str:
+    # Naive values are UTC (the writer uses utcnow); aware ones come back from PostgreSQL
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="microseconds")
+
+
+def entry_hash(prev_hash: str, seq: int, entry: Mapping) -> str:
+    content = json.dumps(
+        [seq, entry["id"], entry["action"], entry["user_id"], entry["repository_id"], entry["details"],
+         _timestamp(entry["created_at"])],
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(f"{prev_hash}\n{content}".encode()).hexdigest()
+
+
+def chain_rows(conn: Connection, rows: Iterable[dict]) -> None:
+    """Link ``rows`` onto the chain; call in the transaction that inserts them
+
+    Locks the head row until that transaction ends, so concurrent writers
+    take turns.
+    """
+    head = conn.execute(
+        select(AuditChainHead.seq, AuditChainHead.hash).where(AuditChainHead.id == _HEAD_ID).with_for_update()
+    ).first()
+    if head is None:
+        conn.execute(insert(AuditChainHead).values(id=_HEAD_ID, seq=0, hash=GENESIS_HASH))
+        seq, prev_hash = 0, GENESIS_HASH
+    else:
+        seq, prev_hash = head
+    for row in rows:
+        seq += 1
+        row["chain_seq"] = seq
+        row["prev_hash"] = prev_hash
+        row["hash"] = prev_hash = entry_hash(prev_hash, seq, row)
+    conn.execute(update(AuditChainHead).where(AuditChainHead.id == _HEAD_ID).values(seq=seq, hash=prev_hash))
+
+
+def chain_head(conn: Connection) -> Tuple[int, str]:
+    head = conn.execute(select(AuditChainHead.seq, AuditChainHead.hash).where(AuditChainHead.id == _HEAD_ID)).first()
+    return tuple(head) if head else (0, GENESIS_HASH)
+
+
+def latest_checkpoint(conn: Connection) -> Optional[Tuple[int, str]]:
+    checkpoint = conn.execute(
+        select(AuditChainCheckpoint.seq, AuditChainCheckpoint.hash).order_by(AuditChainCheckpoint.seq.desc()).limit(1)
+    ).first()
+    return tuple(checkpoint) if checkpoint else None
+
+
+def save_checkpoint(conn: Connection, seq: int, hash: str) -> None:
+    if conn.execute(select(AuditChainCheckpoint.seq).where(AuditChainCheckpoint.seq == seq)).first() is None:
+        conn.execute(insert(AuditChainCheckpoint).values(seq=seq, hash=hash))
+
+
+def first_seq(conn: Connection) -> Optional[int]:
+    return conn.execute(select(func.min(AuditEntry.chain_seq))).scalar()
+
+
+@dataclass
+class RangeResult:
+    """Outcome of verifying the entries ``first_seq``..``last_seq``"""
+    first_seq: int
+    last_seq: int
+    # prev_hash of the first entry, to be matched against the range before
+    first_prev_hash: Optional[str] = None
+    last_hash: Optional[str] = None
+    verified: int = 0
+    error_seq: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def verify_range(conn: Connection, first: int, last: int, batch_size: int = AUDIT_VERIFY_BATCH) -> RangeResult:
+    """Check that entries ``first``..``last`` are all present and correctly linked"""
+    result = RangeResult(first, last)
+    expected_seq, prev_hash = first, None
+    rows = conn.execute(
+        select(*VERIFY_COLUMNS)
+        .where(AuditEntry.chain_seq.between(first, last))
+        .order_by(AuditEntry.chain_seq)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in rows.mappings():
+        seq = row["chain_seq"]
+        if seq != expected_seq:
+            result.error_seq, result.error = expected_seq, "entry missing" if seq > expected_seq else "duplicate entry"
+            break
+        if prev_hash is None:
+            result.first_prev_hash = row["prev_hash"]
+        elif row["prev_hash"] != prev_hash:
+            result.error_seq, result.error = seq, "prev_hash does not match the previous entry"
+            break
+        if entry_hash(row["prev_hash"], seq, row) != row["hash"]:
+            result.error_seq, result.error = seq, "hash does not match the entry's content"
+            break
+        prev_hash = row["hash"]
+        expected_seq += 1
+        result.verified += 1
+    rows.close()
+    if result.ok and expected_seq <= last:
+        result.error_seq, result.error = expected_seq, "entry missing"
+    result.last_hash = prev_hash
+    return result
+
+
+def link(previous_hash: Optional[str], result: RangeResult) -> RangeResult:
+    """Check that ``result`` continues from a range that ended with ``previous_hash``"""
+    if result.ok and previous_hash is not None and result.first_prev_hash != previous_hash:
+        result.error_seq, result.error = result.first_seq, "prev_hash does not match the previous entry"
+    return result
+
+
+@dataclass
+class VerifyResult:
+    ok: bool
+    # First sequence number checked and the last one reached
+    from_seq: int
+    to_seq: int
+    head_seq: int
+    verified: int = 0
+    complete: bool = True
+    error_seq: Optional[int] = None
+    error: Optional[str] = None
+
+
+def plan_ranges(start: int, end: int, range_size: int):
+    return [(first, min(first + range_size - 1, end)) for first in range(start, end + 1, range_size)]
+
+
+def verification_start(conn: Connection, full: bool) -> Tuple[int, Optional[str], int, str]:
+    """(first seq to check, hash it must follow or None, head seq, head hash)"""
+    head_seq, head_hash = chain_head(conn)
+    checkpoint = None if full else latest_checkpoint(conn)
+    if checkpoint is not None:
+        return checkpoint[0] + 1, checkpoint[1], head_seq, head_hash
+    oldest = first_seq(conn)
+    if oldest is None or oldest == 1:
+        return 1, GENESIS_HASH, head_seq, head_hash
+    # Older entries were archived: trust the link into the oldest one left
+    return oldest, None, head_seq, head_hash
+
+
+def check_head(result: VerifyResult, last_hash: Optional[str], head_hash: str) -> VerifyResult:
+    if result.ok and result.complete and result.to_seq == result.head_seq and last_hash is not None \
+            and last_hash != head_hash:
+        result.ok, result.error_seq, result.error = False, result.head_seq, "chain head does not match the last entry"
+    return result
+
+
+def verify_chain(
+    conn: Connection,
+    full: bool = False,
+    max_entries: Optional[int] = None,
+    range_size: int = AUDIT_VERIFY_RANGE,
+    batch_size: int = AUDIT_VERIFY_BATCH,
+) -> VerifyResult:
+    """Verify the chain in this process from the last checkpoint (or the start) up to the head
+
+    Stops after about ``max_entries`` entries, with ``complete=False``; the
+    checkpoint lets the next call carry on. Commits each checkpoint.
+    """
+    start, previous_hash, head_seq, head_hash = verification_start(conn, full)
+    result = VerifyResult(ok=True, from_seq=start, to_seq=start - 1, head_seq=head_seq)
+    conn.commit()
+    for first, last in plan_ranges(start, head_seq, range_size):
+        if max_entries is not None and result.verified >= max_entries:
+            result.complete = False
+            break
+        checked = link(previous_hash, verify_range(conn, first, last, batch_size))
+        result.verified += checked.verified
+        if not checked.ok:
+            result.ok, result.error_seq, result.error = False, checked.error_seq, checked.error
+            result.to_seq = checked.error_seq
+            return result
+        previous_hash = checked.last_hash
+        result.to_seq = last
+        save_checkpoint(conn, last, previous_hash)
+        conn.commit()
+    return check_head(result, previous_hash, head_hash)
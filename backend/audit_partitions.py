@@ -0,0 +1,147 @@
+"""Monthly partitions of ``audit_entries`` on PostgreSQL.
+
+After migration 7c2e4b9d1f05 ``audit_entries`` is range partitioned on
+``created_at`` with one partition per calendar month
+(``audit_entries_2026_10``) and a default partition that catches anything
+outside them. ``audit.AuditWriter`` calls ``ensure_partitions`` before its
+first insert of each month, which creates partitions up to
+``AUDIT_PARTITION_MONTHS_AHEAD`` months in advance, so rows land in their own
+month and the default partition stays empty.
+
+Old months are archived by detaching the partition and copying its rows to a
+gzip'd CSV file (``archive_partition``); ``restore_partition`` loads such a
+file into a fresh table and attaches it again. ``audit_archive.py`` is the
+command line front end.
+
+Everything here takes a sync ``Connection``; from async code use
+``conn.run_sync``. On other databases (SQLite in development and tests) the
+table is a plain table and these functions do nothing.
+"""
+import gzip
+import os
+import re
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from config import env_int
+
+AUDIT_PARTITION_MONTHS_AHEAD = env_int("AUDIT_PARTITION_MONTHS_AHEAD", 3)
+# Months kept attached by ``audit_archive.py archive`` when no cutoff is given
+AUDIT_RETENTION_MONTHS = env_int("AUDIT_RETENTION_MONTHS", 12)
+
+PARENT = "audit_entries"
+DEFAULT_PARTITION = "audit_entries_default"
+_NAME = re.compile(r"^audit_entries_(\d{4})_(\d{2})$")
+
+
+def month_floor(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT}_{month:%Y_%m}"
+
+
+def partition_month(name: str) -> Optional[datetime]:
+    match = _NAME.match(name)
+    return datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc) if match else None
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:parent)"
+    ), {"parent": PARENT}).first() is not None
+
+
+def create_partition(conn: Connection, month: datetime) -> str:
+    name = partition_name(month)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    return name
+
+
+def ensure_partitions(conn: Connection, now: Optional[datetime] = None) -> List[str]:
+    """Create the partitions for this month and the next ``AUDIT_PARTITION_MONTHS_AHEAD``"""
+    if not is_partitioned(conn):
+        return []
+    current = month_floor(now or datetime.now(timezone.utc))
+    return [create_partition(conn, add_months(current, offset)) for offset in range(AUDIT_PARTITION_MONTHS_AHEAD + 1)]
+
+
+def attached_partitions(conn: Connection) -> List[Tuple[str, Optional[datetime]]]:
+    """(name, month) of the attached partitions, oldest first; month is None for the default partition"""
+    if not is_partitioned(conn):
+        return []
+    names = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:parent)"
+    ), {"parent": PARENT}).scalars().all()
+    return sorted(((name, partition_month(name)) for name in names),
+                  key=lambda item: (item[1] is None, item[1] or datetime.min.replace(tzinfo=timezone.utc)))
+
+
+def _copy(conn: Connection, statement: str, file) -> None:
+    # COPY streams through psycopg2; SQLAlchemy has no portable equivalent
+    with conn.connection.dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(statement, file)
+
+
+def archive_partition(conn: Connection, month: datetime, directory: str) -> Tuple[str, int]:
+    """Detach the partition for ``month``, write its rows to ``directory`` and drop it
+
+    The detach is committed on its own, so the parent table is only locked
+    briefly and not for the whole copy. If the copy fails the detached table
+    is left in place and running the archive again picks it up. Returns
+    (path, rows).
+    """
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+        raise ValueError(f"{name} does not exist")
+    if name in {attached for attached, _ in attached_partitions(conn)}:
+        conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        conn.commit()
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.csv.gz")
+    partial = path + ".partial"
+    rows = conn.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+    with gzip.open(partial, "wb") as file:
+        _copy(conn, f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", file)
+    os.replace(partial, path)
+    conn.execute(text(f"DROP TABLE {name}"))
+    conn.commit()
+    return path, rows
+
+
+def restore_partition(conn: Connection, path: str) -> Tuple[str, int]:
+    """Load an archive written by ``archive_partition`` and attach it again. Returns (name, rows)."""
+    name = os.path.basename(path).split(".", 1)[0]
+    month = partition_month(name)
+    if month is None:
+        raise ValueError(f"{path} is not an audit partition archive")
+
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    with gzip.open(path, "rt", newline="") as file:
+        # Columns by name, so archives survive columns added to the table later
+        columns = file.readline().strip()
+        _copy(conn, f"COPY {name} ({columns}) FROM STDIN WITH (FORMAT csv)", file)
+    conn.execute(text(
+        f"ALTER TABLE {PARENT} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    rows = conn.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+    conn.commit()
+    return name, rows
@@ -0,0 +1,270 @@
+"""Live audit events for the Case History stream.
+
+``audit.AuditWriter`` publishes every batch it has committed to
+``audit_broker``, which hands each entry to the subscribers of its
+repository (``routers/repositories.py`` streams them as server-sent events).
+
+With a single worker the broker delivers in process. With several workers
+set ``AUDIT_STREAM_NOTIFY=true`` (PostgreSQL only): entries are then sent
+with ``NOTIFY`` in the writing worker and every worker, including that one,
+delivers what it receives on ``LISTEN``. Entries too large for a
+notification payload are sent by id and loaded from the database.
+
+``open_stream`` produces the event stream for one client: the entries after
+its cursor (or the latest few) read from the table, then live entries as
+they are published. Each event's id is a keyset cursor, so a client that
+reconnects with ``Last-Event-ID`` resumes where it stopped. A subscriber
+that falls ``AUDIT_STREAM_QUEUE_SIZE`` events behind is cut off rather than
+buffered without bound; its client reconnects and catches up the same way.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func, select
+
+from cache import write_generation
+from config import env_bool, env_int
+from database import AsyncSessionLocal, async_engine
+from models import AuditEntry
+from pagination import encode_cursor, keyset_paginate
+
+logger = logging.getLogger(__name__)
+
+AUDIT_STREAM_NOTIFY = env_bool("AUDIT_STREAM_NOTIFY", False)
+AUDIT_STREAM_QUEUE_SIZE = env_int("AUDIT_STREAM_QUEUE_SIZE", 1000)
+AUDIT_STREAM_KEEPALIVE_SECONDS = env_int("AUDIT_STREAM_KEEPALIVE_SECONDS", 15)
+# Entries read per query when catching a client up
+_REPLAY_BATCH = 200
+# Reconnection delay suggested to EventSource clients, in milliseconds
+_RETRY_MS = 2000
+NOTIFY_CHANNEL = "audit_entries"
+# PostgreSQL rejects notification payloads of 8000 bytes or more
+_MAX_PAYLOAD_BYTES = 7900
+
+
+class SubscriberTooSlow(Exception):
+    """The subscriber's queue overflowed and it missed events"""
+
+
+def audit_event(entry) -> Dict:
+    """The JSON shape of an entry in the Case History feed, from a row dict or an ``AuditEntry``"""
+    get = entry.get if isinstance(entry, dict) else lambda key: getattr(entry, key)
+    created_at = get("created_at")
+    return {
+        "id": get("id"),
+        "action": get("action"),
+        "details": get("details"),
+        "created_at": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+        "user_id": get("user_id"),
+        "repository_id": get("repository_id"),
+        "cursor": encode_cursor(created_at, get("id")),
+    }
+
+
+class _Subscription:
+    def __init__(self, repository_id: str, maxsize: int):
+        self.repository_id = repository_id
+        self.queue: "asyncio.Queue[Dict]" = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def put(self, event: Dict) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout: float) -> Optional[Dict]:
+        """The next event, or None after ``timeout`` seconds without one"""
+        if self.overflowed and self.queue.empty():
+            raise SubscriberTooSlow()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class AuditBroker:
+    def __init__(self, notify: bool = AUDIT_STREAM_NOTIFY, queue_size: int = AUDIT_STREAM_QUEUE_SIZE):
+        self.notify = notify and async_engine.dialect.name == "postgresql"
+        self.queue_size = queue_size
+        self._subscriptions: Dict[str, Set[_Subscription]] = defaultdict(set)
+        self._listener: Optional[asyncio.Task] = None
+
+    @asynccontextmanager
+    async def subscribe(self, repository_id: str):
+        subscription = _Subscription(repository_id, self.queue_size)
+        self._subscriptions[repository_id].add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscribers = self._subscriptions.get(repository_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[repository_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscriptions.values())
+
+    def _deliver(self, events: Iterable[Dict]) -> None:
+        # Audited writes of every worker pass here when NOTIFY is on; cached views may be out of date
+        write_generation.bump()
+        for event in events:
+            for subscription in list(self._subscriptions.get(event["repository_id"], ())):
+                subscription.put(event)
+
+    async def publish(self, rows: List[Dict]) -> None:
+        """Announce committed audit rows"""
+        rows = [row for row in rows if row.get("repository_id")]
+        if not rows:
+            return
+        events = [audit_event(row) for row in rows]
+        if not self.notify:
+            self._deliver(events)
+            return
+
+        payloads = []
+        for event in events:
+            payload = json.dumps(event, default=str)
+            if len(payload.encode()) > _MAX_PAYLOAD_BYTES:
+                payload = json.dumps({"id": event["id"], "repository_id": event["repository_id"], "partial": True})
+            payloads.append(payload)
+        async with async_engine.begin() as conn:
+            for payload in payloads:
+                await conn.execute(select(func.pg_notify(NOTIFY_CHANNEL, payload)))
+
+    async def _load(self, entry_id: str) -> Optional[Dict]:
+        async with AsyncSessionLocal() as db:
+            entry = await db.get(AuditEntry, entry_id)
+            return audit_event(entry) if entry is not None else None
+
+    async def _on_notification(self, payload: str) -> None:
+        event = json.loads(payload)
+        if event.get("partial"):
+            event = await self._load(event["id"])
+        if event is not None:
+            self._deliver([event])
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                raw = await async_engine.raw_connection()
+                try:
+                    connection = raw.driver_connection
+                    loop = asyncio.get_running_loop()
+                    await connection.add_listener(
+                        NOTIFY_CHANNEL,
+                        lambda _conn, _pid, _channel, payload: loop.create_task(self._on_notification(payload)),
+                    )
+                    # Notifications arrive on the connection's own reader; just keep it open
+                    while not connection.is_closed():
+                        await asyncio.sleep(5)
+                finally:
+                    raw.invalidate()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Audit LISTEN connection failed; reconnecting")
+            await asyncio.sleep(1)
+
+    def start(self) -> None:
+        if self.notify and self._listener is None:
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+audit_broker = AuditBroker()
+
+
+def _format(event: Dict) -> str:
+    return f"id: {event['cursor']}\nevent: audit\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+def _replay_query(repository_id: str, cursor: Optional[str]):
+    """Entries after ``cursor`` in write order; raises HTTPException for a bad cursor"""
+    return keyset_paginate(
+        select(AuditEntry).where(AuditEntry.repository_id == repository_id),
+        AuditEntry.created_at, AuditEntry.id,
+        cursor=cursor, limit=_REPLAY_BATCH - 1, dialect_name=async_engine.dialect.name, descending=False
+    )
+
+
+async def _replay(repository_id: str, cursor: Optional[str], backlog: int, first_query) -> AsyncIterator[Dict]:
+    if cursor is None:
+        if not backlog:
+            return
+        async with AsyncSessionLocal() as db:
+            latest = (await db.scalars(
+                select(AuditEntry).where(AuditEntry.repository_id == repository_id)
+                .order_by(AuditEntry.created_at.desc(), AuditEntry.id.desc()).limit(backlog)
+            )).all()
+        for entry in reversed(latest):
+            yield audit_event(entry)
+        return
+
+    query = first_query
+    while True:
+        # A short session per batch: a stream must not hold a pooled connection while it idles
+        async with AsyncSessionLocal() as db:
+            entries = (await db.scalars(query)).all()
+        for entry in entries:
+            yield audit_event(entry)
+        if len(entries) < _REPLAY_BATCH:
+            return
+        last = entries[-1]
+        query = _replay_query(repository_id, encode_cursor(last.created_at, last.id))
+
+
+async def _events(
+    broker: AuditBroker, repository_id: str, cursor: Optional[str], backlog: int, first_query, keepalive: float
+) -> AsyncIterator[str]:
+    yield f"retry: {_RETRY_MS}\n\n"
+    # Subscribe before reading the table so nothing written in between is missed
+    async with broker.subscribe(repository_id) as subscription:
+        replayed = set()
+        async for event in _replay(repository_id, cursor, backlog, first_query):
+            replayed.add(event["id"])
+            yield _format(event)
+        while True:
+            try:
+                event = await subscription.get(timeout=keepalive)
+            except SubscriberTooSlow:
+                # Ending the stream makes the client reconnect from its last event id
+                return
+            if event is None:
+                # Anything published during the replay has been seen by now
+                replayed.clear()
+                yield ": keepalive\n\n"
+            elif event["id"] not in replayed:
+                yield _format(event)
+
+
+def open_stream(
+    repository_id: str,
+    cursor: Optional[str] = None,
+    backlog: int = 0,
+    broker: Optional[AuditBroker] = None,
+    keepalive: float = AUDIT_STREAM_KEEPALIVE_SECONDS,
+) -> AsyncIterator[str]:
+    """Server-sent events for a repository's audit entries after ``cursor``
+
+    Without a cursor the stream starts with the ``backlog`` latest entries.
+    The cursor is checked here, before any of the stream is sent.
+    """
+    first_query = _replay_query(repository_id, cursor) if cursor else None
+    return _events(broker or audit_broker, repository_id, cursor, backlog, first_query, keepalive)
@@ -0,0 +1,81 @@
+"""Verify the audit hash chain (see audit_chain.py).
+
+Usage (from backend/):
+    python audit_verify.py                  # from the last checkpoint to the head
+    python audit_verify.py --full           # from the oldest entry
+    python audit_verify.py --workers 8 --range-size 1000000
+
+The chain is split into ranges of ``--range-size`` entries that worker
+processes verify independently; this process checks that consecutive ranges
+link up and records a checkpoint after every range that does, in order, so
+an interrupted run resumes where it stopped. Exits 0 when the chain is
+intact and 2 at the first broken link.
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+
+from audit_chain import (
+    AUDIT_VERIFY_BATCH, AUDIT_VERIFY_RANGE, VerifyResult, check_head, link, plan_ranges, save_checkpoint,
+    verification_start, verify_range,
+)
+from database import engine
+
+
+def _init_worker() -> None:
+    # Connections inherited from the parent must not be shared with it
+    engine.dispose(close=False)
+
+
+def _verify(args):
+    first, last, batch_size = args
+    with engine.connect() as conn:
+        return verify_range(conn, first, last, batch_size)
+
+
+def verify(full: bool, workers: int, range_size: int, batch_size: int) -> VerifyResult:
+    with engine.connect() as conn:
+        start, previous_hash, head_seq, head_hash = verification_start(conn, full)
+    result = VerifyResult(ok=True, from_seq=start, to_seq=start - 1, head_seq=head_seq)
+    ranges = [(first, last, batch_size) for first, last in plan_ranges(start, head_seq, range_size)]
+    began = time.monotonic()
+
+    engine.dispose()
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool, engine.connect() as conn:
+        # imap yields in order, so checkpoints only ever advance over verified ranges
+        for checked in pool.imap(_verify, ranges):
+            checked = link(previous_hash, checked)
+            result.verified += checked.verified
+            if not checked.ok:
+                result.ok, result.error_seq, result.error = False, checked.error_seq, checked.error
+                result.to_seq = checked.error_seq
+                pool.terminate()
+                return result
+            previous_hash = checked.last_hash
+            result.to_seq = checked.last_seq
+            save_checkpoint(conn, checked.last_seq, previous_hash)
+            conn.commit()
+            rate = result.verified / max(time.monotonic() - began, 1e-9)
+            print(f"verified up to {checked.last_seq} of {head_seq} ({rate:,.0f} entries/s)", file=sys.stderr)
+    return check_head(result, previous_hash, head_hash)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="Ignore checkpoints and verify from the oldest entry")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--range-size", type=int, default=AUDIT_VERIFY_RANGE, help="Entries per worker task")
+    parser.add_argument("--batch-size", type=int, default=AUDIT_VERIFY_BATCH, help="Rows fetched per round trip")
+    args = parser.parse_args(argv)
+
+    result = verify(args.full, args.workers, args.range_size, args.batch_size)
+    if result.ok:
+        print(f"OK: {result.verified} entries verified, {result.from_seq}..{result.to_seq} of {result.head_seq}")
+        return 0
+    print(f"BROKEN at entry {result.error_seq}: {result.error}", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Commit graph generation time and statement count at large commit counts.
+
+Seeds one repository per size with a linear history of that many commits,
+each touching ``--files-per-commit`` of ``--paths`` files, then times
+``CommitGraphService.update_commit_graph``: a full build over the whole
+history, then an update after one more commit, which only appends that
+commit's rows. ``--compare`` also times the per-commit access pattern the
+graph was once built with (one ``CommitFile`` query and one author load per
+commit, pydantic models per node); it is slow at 100k commits.
+
+Point DATABASE_URL at a scratch database: the seeded rows are removed at the
+end unless ``--keep`` is given.
+
+Usage (from backend/):
+    python benchmarks/bench_commit_graph.py --sizes 10000,100000
+    python benchmarks/bench_commit_graph.py --sizes 10000 --compare
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, event, insert, select
+
+from commit_graph_service import CommitGraphService
+from database import SessionLocal, engine
+from models import (
+    Base, Commit, CommitFile, CommitGraph, CommitGraphEdge, CommitGraphNode, Repository, RepositoryFile, User
+)
+from schemas import GraphEdge, GraphNode
+
+BATCH_SIZE = 5000
+CHANGE_TYPES = ("added", "modified", "modified", "deleted")
+
+
+def _id() -> str:
+    return str(uuid.uuid4())
+
+
+def _insert(conn, model, rows) -> None:
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def _commit_rows(repo_id: str, user_id: str, files, index: int, timestamp, parent_sha, files_per_commit: int):
+    sha = uuid.uuid4().hex
+    commit = {"id": _id(), "repository_id": repo_id, "sha": sha, "message": f"bench commit {index}",
+              "author_id": user_id, "timestamp": timestamp, "parent_sha": parent_sha}
+    commit_files = []
+    for j in range(files_per_commit):
+        file = files[(index * files_per_commit + j) % len(files)]
+        commit_files.append({"id": _id(), "commit_id": commit["id"], "file_id": file["id"],
+                             "file_path": file["path"], "change_type": CHANGE_TYPES[(index + j) % 4],
+                             "additions": j, "deletions": index % 3})
+    return commit, commit_files
+
+
+def seed(commits: int, paths: int, files_per_commit: int) -> str:
+    """A repository with ``commits`` commits; returns its id"""
+    now = datetime.now(timezone.utc)
+    user_id, repo_id = _id(), _id()
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=user_id, clerk_id=_id(), username=f"bench_{user_id[:8]}",
+                                         email=f"bench_{user_id[:8]}@example.com", role="contributor"))
+        conn.execute(insert(Repository).values(id=repo_id, name=f"bench-graph-{commits}", description="benchmark",
+                                               owner_id=user_id, is_private=False))
+        files = [
+            {"id": _id(), "repository_id": repo_id, "name": f"note_{i}.md", "path": f"/notes/note_{i}.md",
+             "content": "", "file_type": "markdown", "size": 0, "author_id": user_id}
+            for i in range(paths)
+        ]
+        _insert(conn, RepositoryFile, files)
+
+        commit_rows, file_rows = [], []
+        parent_sha = None
+        for i in range(commits):
+            commit, commit_files = _commit_rows(repo_id, user_id, files, i, now - timedelta(minutes=commits - i),
+                                                parent_sha, files_per_commit)
+            parent_sha = commit["sha"]
+            commit_rows.append(commit)
+            file_rows.extend(commit_files)
+        _insert(conn, Commit, commit_rows)
+        _insert(conn, CommitFile, file_rows)
+    return repo_id
+
+
+def add_commit(repo_id: str, files_per_commit: int) -> None:
+    """One more commit on top of the seeded history"""
+    with engine.begin() as conn:
+        user_id, parent_sha = conn.execute(
+            select(Commit.author_id, Commit.sha).where(Commit.repository_id == repo_id)
+            .order_by(Commit.timestamp.desc()).limit(1)
+        ).one()
+        files = [{"id": file_id, "path": path} for file_id, path in conn.execute(
+            select(RepositoryFile.id, RepositoryFile.path).where(RepositoryFile.repository_id == repo_id))]
+        commit, commit_files = _commit_rows(repo_id, user_id, files, 0, datetime.now(timezone.utc), parent_sha,
+                                            files_per_commit)
+        conn.execute(insert(Commit), [commit])
+        conn.execute(insert(CommitFile), commit_files)
+
+
+def remove(repo_id: str) -> None:
+    with engine.begin() as conn:
+        owner_id = conn.scalar(select(Repository.owner_id).where(Repository.id == repo_id))
+        graph_ids = select(CommitGraph.id).where(CommitGraph.repository_id == repo_id)
+        conn.execute(delete(CommitGraphNode).where(CommitGraphNode.graph_id.in_(graph_ids)))
+        conn.execute(delete(CommitGraphEdge).where(CommitGraphEdge.graph_id.in_(graph_ids)))
+        conn.execute(delete(CommitGraph).where(CommitGraph.repository_id == repo_id))
+        commit_ids = select(Commit.id).where(Commit.repository_id == repo_id)
+        conn.execute(delete(CommitFile).where(CommitFile.commit_id.in_(commit_ids)))
+        conn.execute(delete(Commit).where(Commit.repository_id == repo_id))
+        conn.execute(delete(RepositoryFile).where(RepositoryFile.repository_id == repo_id))
+        conn.execute(delete(Repository).where(Repository.id == repo_id))
+        conn.execute(delete(User).where(User.id == owner_id))
+
+
+def build_graph(db, repository_id: str, max_commits: int) -> dict:
+    return CommitGraphService(db).update_commit_graph(repository_id, max_commits, rebuild=True)[1]
+
+
+def append_commit(db, repository_id: str, max_commits: int) -> dict:
+    return CommitGraphService(db).update_commit_graph(repository_id, max_commits)[1]
+
+
+def per_commit_graph(db, repository_id: str, max_commits: int) -> dict:
+    """The previous access pattern: files and author loaded commit by commit"""
+    commits = db.query(Commit).filter(Commit.repository_id == repository_id) \
+        .order_by(Commit.timestamp.desc()).limit(max_commits).all()
+    nodes, edges = [], []
+    for commit in commits:
+        nodes.append(GraphNode(id=f"commit_{commit.sha}", type="commit", label=commit.message[:50], metadata={
+            "author": commit.author.username if commit.author else "Unknown",
+            "timestamp": commit.timestamp.isoformat(), "parent_sha": commit.parent_sha,
+        }))
+    for commit in commits:
+        for commit_file in db.query(CommitFile).filter(CommitFile.commit_id == commit.id).all():
+            node_id = f"file_{commit_file.file_id}_{commit.sha}"
+            nodes.append(GraphNode(id=node_id, type="file", label=commit_file.file_path,
+                                   metadata={"commit_sha": commit.sha}))
+            edges.append(GraphEdge(source=f"commit_{commit.sha}", target=node_id, type="commit_to_file",
+                                   metadata={}))
+    return {"nodes": [node.model_dump() for node in nodes], "edges": [edge.model_dump() for edge in edges]}
+
+
+def measure(build, repo_id: str, commits: int):
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        with SessionLocal() as db:
+            start = time.perf_counter()
+            graph = build(db, repo_id, commits)
+            elapsed = time.perf_counter() - start
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    return elapsed, len(statements), len(graph["nodes"]), len(graph["edges"])
+
+
+def main(args) -> None:
+    Base.metadata.create_all(bind=engine)
+
+    print(f"{'commits':>8} | {'build':>10} | {'seconds':>8} | {'statements':>10} | {'nodes':>8} | {'edges':>8}")
+    print("-" * 67)
+    for size in [int(size) for size in args.sizes.split(",")]:
+        repo_id = seed(size, args.paths, args.files_per_commit)
+        try:
+            runs = [("full", build_graph), ("append 1", append_commit)]
+            if args.compare:
+                runs.append(("per-commit", per_commit_graph))
+            for name, build in runs:
+                if build is append_commit:
+                    add_commit(repo_id, args.files_per_commit)
+                elapsed, statements, nodes, edges = measure(build, repo_id, size)
+                print(f"{size:>8} | {name:>10} | {elapsed:>8.2f} | {statements:>10} | {nodes:>8} | {edges:>8}")
+        finally:
+            if not args.keep:
+                remove(repo_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="comma separated commit counts")
+    parser.add_argument("--paths", type=int, default=500, help="distinct files in the repository")
+    parser.add_argument("--files-per-commit", type=int, default=3)
+    parser.add_argument("--compare", action="store_true", help="also time the per-commit query pattern")
+    parser.add_argument("--keep", action="store_true", help="leave the seeded repositories in place")
+    main(parser.parse_args())
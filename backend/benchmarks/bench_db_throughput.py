@@ -0,0 +1,124 @@
+"""Concurrent request throughput of sync-Session vs AsyncSession handlers.
+
+Both routes run the same dashboard-shaped mix of count queries inside an
+``async def`` handler of one ASGI app, i.e. one uvicorn worker / one event
+loop. The ``/sync`` route uses ``SessionLocal`` the way the routers did before
+the async migration; ``/async`` uses ``AsyncSessionLocal``.
+
+Against a networked Postgres the sync route stays flat as concurrency grows,
+because every round-trip blocks the loop, while the async route scales until
+the pool is saturated. ``--latency-ms`` adds a server-side sleep before each
+query (``pg_sleep`` on Postgres, a registered function on SQLite) to model
+network round-trip time on a local database.
+
+Usage (from backend/):
+    python benchmarks/bench_db_throughput.py --requests 200 --concurrency 1,4,16,32 --latency-ms 2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import event, func, select, text
+
+from database import engine, async_engine, SessionLocal, AsyncSessionLocal
+from models import Base, Repository, MergeRequest
+
+# Same shapes as the dashboard KPI queries
+QUERY_MIX = [
+    (Repository, Repository.is_private == False),
+    (Repository, Repository.fork_count > 0),
+    (MergeRequest, MergeRequest.status == "open"),
+    (MergeRequest, MergeRequest.status == "merged"),
+    (MergeRequest, MergeRequest.status == "closed"),
+] * 2
+
+
+def _register_sqlite_sleep(sync_engine) -> None:
+    @event.listens_for(sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function("bench_sleep", 1, lambda ms: time.sleep(ms / 1000.0))
+
+
+def _sleep_statement(latency_ms: float):
+    if engine.dialect.name == "postgresql":
+        return text("SELECT pg_sleep(:seconds)").bindparams(seconds=latency_ms / 1000.0)
+    return text("SELECT bench_sleep(:ms)").bindparams(ms=latency_ms)
+
+
+def build_app(latency_ms: float) -> FastAPI:
+    app = FastAPI()
+    sleep_stmt = _sleep_statement(latency_ms) if latency_ms else None
+
+    @app.get("/sync")
+    async def sync_handler():
+        db = SessionLocal()
+        try:
+            total = 0
+            for model, criteria in QUERY_MIX:
+                if sleep_stmt is not None:
+                    db.execute(sleep_stmt)
+                total += db.scalar(select(func.count()).select_from(model).where(criteria))
+            return {"total": total}
+        finally:
+            db.close()
+
+    @app.get("/async")
+    async def async_handler():
+        async with AsyncSessionLocal() as db:
+            total = 0
+            for model, criteria in QUERY_MIX:
+                if sleep_stmt is not None:
+                    await db.execute(sleep_stmt)
+                total += await db.scalar(select(func.count()).select_from(model).where(criteria))
+            return {"total": total}
+
+    return app
+
+
+async def run_level(client: httpx.AsyncClient, path: str, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            response = await client.get(path)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+async def main(args) -> None:
+    if engine.dialect.name == "sqlite":
+        _register_sqlite_sleep(engine)
+        _register_sqlite_sleep(async_engine.sync_engine)
+    Base.metadata.create_all(bind=engine)
+
+    app = build_app(args.latency_ms)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm both pools before measuring
+        await client.get("/sync")
+        await client.get("/async")
+        print(f"{'concurrency':>11} | {'sync req/s':>10} | {'async req/s':>11} | {'speedup':>7}")
+        print("-" * 49)
+        for level in levels:
+            sync_rps = await run_level(client, "/sync", args.requests, level)
+            async_rps = await run_level(client, "/async", args.requests, level)
+            print(f"{level:>11} | {sync_rps:>10.1f} | {async_rps:>11.1f} | {async_rps / sync_rps:>6.2f}x")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16,32", help="comma separated concurrency levels")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated server latency per query")
+    asyncio.run(main(parser.parse_args()))
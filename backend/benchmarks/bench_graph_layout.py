@@ -0,0 +1,57 @@
+"""Layered commit graph layout time at large commit counts.
+
+Generates histories in memory (no database): each commit's parent is the
+commit before it, except for a ``--fork-rate`` share of commits that branch
+off a random older commit. Times ``graph_layout.layered_layout`` over each
+history and reports the layers and lanes it used. The layout is meant to
+stay under a second at 50k commits on one core.
+
+Usage (from backend/):
+    python benchmarks/bench_graph_layout.py --sizes 10000,50000,200000
+    python benchmarks/bench_graph_layout.py --sizes 50000 --fork-rate 0.3
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from graph_layout import layered_layout
+
+
+def history(commits: int, fork_rate: float, rng) -> np.ndarray:
+    """Parent index of each commit, -1 for the root"""
+    parents = np.arange(-1, commits - 1)
+    forks = rng.random(commits) < fork_rate
+    parents[forks] = (rng.random(forks.sum()) * np.arange(commits)[forks]).astype(np.int64)
+    parents[0] = -1
+    return parents
+
+
+def main(args) -> None:
+    rng = np.random.default_rng(args.seed)
+    print(f"{'commits':>8} | {'fork rate':>9} | {'seconds':>8} | {'layers':>8} | {'lanes':>6}")
+    print("-" * 52)
+    for size in [int(size) for size in args.sizes.split(",")]:
+        parents = history(size, args.fork_rate, rng)
+        file_counts = rng.integers(0, args.max_files + 1, size)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            layout = layered_layout(parents, file_counts)
+            timings.append(time.perf_counter() - start)
+        print(f"{size:>8} | {args.fork_rate:>9.2f} | {min(timings):>8.3f} | {layout.layer_count:>8} | "
+              f"{layout.lane_count:>6}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,50000,200000", help="comma separated commit counts")
+    parser.add_argument("--fork-rate", type=float, default=0.05, help="share of commits that start a branch")
+    parser.add_argument("--max-files", type=int, default=5, help="files per commit are drawn from 0..max")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size; the fastest is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
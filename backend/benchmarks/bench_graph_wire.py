@@ -0,0 +1,84 @@
+"""Size and build time of GET /graph payloads in each wire format.
+
+Seeds a repository per size (see bench_commit_graph.py), builds its commit
+graph, then produces the GET /graph body from the stored rows three ways:
+the default streamed JSON, the columnar document as MessagePack and the
+columnar document as JSON (graph_columns.py). Times include reading the rows.
+
+Point DATABASE_URL at a scratch database: the seeded rows are removed at the
+end unless ``--keep`` is given.
+
+Usage (from backend/):
+    python benchmarks/bench_graph_wire.py --sizes 1000,10000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from bench_commit_graph import remove, seed
+from commit_graph_service import CommitGraphService, graph_json_chunks
+from database import AsyncSessionLocal, SessionLocal, engine
+from graph_columns import GRAPH_COLUMNS_JSON, GRAPH_MSGPACK, encode, stored_graph_columns
+from models import Base, CommitGraph
+
+
+async def _json_body(db, graph) -> bytes:
+    return "".join([chunk async for chunk in graph_json_chunks(db, graph)]).encode()
+
+
+async def _columnar_body(db, graph, media_type: str) -> bytes:
+    return encode(await stored_graph_columns(db, graph), media_type)
+
+
+async def measure(repo_id: str, repeat: int):
+    bodies = {
+        "json": _json_body,
+        "msgpack": lambda db, graph: _columnar_body(db, graph, GRAPH_MSGPACK),
+        "columns json": lambda db, graph: _columnar_body(db, graph, GRAPH_COLUMNS_JSON),
+    }
+    results = []
+    async with AsyncSessionLocal() as db:
+        graph = await db.scalar(select(CommitGraph).where(CommitGraph.repository_id == repo_id))
+        for name, body in bodies.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                payload = await body(db, graph)
+                timings.append(time.perf_counter() - start)
+            results.append((name, len(payload), min(timings)))
+    return results
+
+
+def main(args) -> None:
+    Base.metadata.create_all(bind=engine)
+
+    print(f"{'commits':>8} | {'format':>12} | {'bytes':>11} | {'ratio':>6} | {'seconds':>8}")
+    print("-" * 58)
+    for size in [int(size) for size in args.sizes.split(",")]:
+        repo_id = seed(size, args.paths, args.files_per_commit)
+        try:
+            with SessionLocal() as db:
+                CommitGraphService(db).update_commit_graph(repo_id, size, rebuild=True)
+            results = asyncio.run(measure(repo_id, args.repeat))
+            baseline = results[0][1]
+            for name, length, elapsed in results:
+                print(f"{size:>8} | {name:>12} | {length:>11} | {baseline / length:>6.1f} | {elapsed:>8.3f}")
+        finally:
+            if not args.keep:
+                remove(repo_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="comma separated commit counts")
+    parser.add_argument("--paths", type=int, default=500, help="distinct files in the repository")
+    parser.add_argument("--files-per-commit", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per format; the fastest is reported")
+    parser.add_argument("--keep", action="store_true", help="leave the seeded repositories in place")
+    main(parser.parse_args())
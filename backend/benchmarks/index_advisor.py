@@ -0,0 +1,343 @@
+"""Query plans and timings for the router query shapes on a large dataset.
+
+Seeds a scratch database with a synthetic dataset (``--seed``), then runs each
+query the routers issue on hot request paths and prints its plan and median
+latency. The statements in ``router_queries`` are built exactly as the routers
+build them (same filters, ordering and pagination helpers), so keep them in
+step when a router query changes. Shapes a single request issues several
+times, such as the dashboard's per-day counts, report their per-request cost.
+Plans come from ``EXPLAIN (ANALYZE, BUFFERS)`` on PostgreSQL and
+``EXPLAIN QUERY PLAN`` on SQLite. Queries whose plan scans a whole table
+(``Seq Scan`` / ``SCAN``) are flagged, which is the signal that an index is
+missing or not being used.
+
+Point DATABASE_URL at a scratch database: ``--seed`` inserts a lot of rows.
+
+Usage (from backend/):
+    python benchmarks/index_advisor.py --seed --repos 200
+    python benchmarks/index_advisor.py --only commit_graph.list_commits --runs 20
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, or_, select
+
+from access_control import access_query, readable_criterion
+from database import engine
+from pagination import encode_cursor, keyset_paginate
+from models import (
+    Base, User, Repository, RepositoryCollaborator, RepositoryFile, FileVersion,
+    MergeRequest, MergeRequestVersion, AuditEntry, Commit, CommitFile
+)
+
+BATCH_SIZE = 5000
+FULL_SCAN = re.compile(r"Seq Scan on (\w+)|\bSCAN (?:TABLE )?(\w+)\b(?! USING)")
+
+
+def _id() -> str:
+    return str(uuid.uuid4())
+
+
+def _insert(conn, model, rows) -> None:
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def seed(args) -> None:
+    """Insert a synthetic dataset shaped like production traffic"""
+    rng = random.Random(args.random_seed)
+    now = datetime.now(timezone.utc)
+
+    def recent(days: int = 365) -> datetime:
+        return now - timedelta(seconds=rng.randint(0, days * 86400))
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        users = [
+            {"id": _id(), "clerk_id": f"seed_{i}_{uuid.uuid4().hex[:8]}", "username": f"seed_{uuid.uuid4().hex[:12]}",
+             "email": f"seed_{uuid.uuid4().hex[:12]}@example.com", "role": "contributor", "created_at": recent()}
+            for i in range(args.users)
+        ]
+        _insert(conn, User, users)
+        user_ids = [user["id"] for user in users]
+
+        repositories = [
+            {"id": _id(), "name": f"seed-repo-{i}", "description": "seeded", "owner_id": rng.choice(user_ids),
+             "is_private": rng.random() < 0.3, "fork_count": rng.randint(0, 3), "created_at": recent(),
+             "updated_at": recent(30)}
+            for i in range(args.repos)
+        ]
+        _insert(conn, Repository, repositories)
+        repo_ids = [repo["id"] for repo in repositories]
+
+        collaborators = []
+        for repo_id in repo_ids:
+            for user_id in rng.sample(user_ids, min(len(user_ids), args.collaborators_per_repo)):
+                collaborators.append({"id": _id(), "repository_id": repo_id, "user_id": user_id,
+                                      "role": "contributor", "created_at": recent()})
+        _insert(conn, RepositoryCollaborator, collaborators)
+
+        files, versions = [], []
+        for repo_id in repo_ids:
+            for i in range(args.files_per_repo):
+                file_id = _id()
+                author_id = rng.choice(user_ids)
+                files.append({"id": file_id, "repository_id": repo_id, "name": f"file_{i}.md",
+                              "path": f"/docs/file_{i}.md", "content": "x" * 512, "file_type": "markdown",
+                              "size": 512, "author_id": author_id, "created_at": recent()})
+                for version_number in range(1, args.versions_per_file + 1):
+                    versions.append({"id": _id(), "file_id": file_id, "version_number": version_number,
+                                     "content": "x" * 512, "commit_message": "seeded",
+                                     "author_id": author_id, "created_at": recent()})
+        _insert(conn, RepositoryFile, files)
+        _insert(conn, FileVersion, versions)
+        files_by_repo = {}
+        for file in files:
+            files_by_repo.setdefault(file["repository_id"], []).append(file)
+
+        merge_requests, mr_versions = [], []
+        for _ in range(args.repos * args.merge_requests_per_repo):
+            mr_id = _id()
+            created_at = recent()
+            merge_requests.append({"id": mr_id, "title": "seeded", "author_id": rng.choice(user_ids),
+                                   "source_repo_id": rng.choice(repo_ids), "target_repo_id": rng.choice(repo_ids),
+                                   "status": rng.choice(["open", "merged", "closed"]),
+                                   "ai_validation_status": "pending", "ai_validation_score": 0.0,
+                                   "created_at": created_at, "updated_at": created_at + timedelta(days=2)})
+            for version_number in range(1, 3):
+                mr_versions.append({"id": _id(), "merge_request_id": mr_id, "version_number": version_number,
+                                    "title": "seeded", "author_id": rng.choice(user_ids),
+                                    "created_at": created_at + timedelta(hours=version_number)})
+        _insert(conn, MergeRequest, merge_requests)
+        _insert(conn, MergeRequestVersion, mr_versions)
+
+        commits, commit_files = [], []
+        for repo_id in repo_ids:
+            repo_files = files_by_repo.get(repo_id, [])
+            parent_sha = None
+            for _ in range(args.commits_per_repo):
+                commit_id = _id()
+                sha = uuid.uuid4().hex + uuid.uuid4().hex[:8]
+                commits.append({"id": commit_id, "repository_id": repo_id, "sha": sha, "message": "seeded",
+                                "author_id": rng.choice(user_ids), "timestamp": recent(), "parent_sha": parent_sha})
+                parent_sha = sha
+                for file in rng.sample(repo_files, min(len(repo_files), 3)):
+                    commit_files.append({"id": _id(), "commit_id": commit_id, "file_id": file["id"],
+                                         "file_path": file["path"], "change_type": "modified",
+                                         "additions": rng.randint(0, 50), "deletions": rng.randint(0, 50)})
+        _insert(conn, Commit, commits)
+        _insert(conn, CommitFile, commit_files)
+
+        audit_entries = [
+            {"id": _id(), "action": rng.choice(["file_create", "file_update", "merge_request_create"]),
+             "user_id": rng.choice(user_ids), "repository_id": repo_id, "details": {}, "created_at": recent()}
+            for repo_id in repo_ids for _ in range(args.audit_per_repo)
+        ]
+        _insert(conn, AuditEntry, audit_entries)
+
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("ANALYZE")
+    elif engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+
+    total = sum(len(rows) for rows in (users, repositories, collaborators, files, versions, merge_requests,
+                                       mr_versions, commits, commit_files, audit_entries))
+    print(f"Seeded {total} rows in {time.perf_counter() - started:.1f}s")
+
+
+def _sample(conn):
+    """Pick representative parameter values from the existing data"""
+    repo_id = conn.scalar(
+        select(Commit.repository_id).group_by(Commit.repository_id).order_by(func.count().desc()).limit(1)
+    ) or conn.scalar(select(Repository.id).limit(1))
+    user_id = conn.scalar(select(RepositoryCollaborator.user_id).where(
+        RepositoryCollaborator.repository_id == repo_id).limit(1)) or conn.scalar(select(User.id).limit(1))
+    file_id = conn.scalar(select(RepositoryFile.id).where(RepositoryFile.repository_id == repo_id).limit(1))
+    file_path = conn.scalar(select(RepositoryFile.path).where(RepositoryFile.id == file_id))
+    commit_id = conn.scalar(select(Commit.id).where(Commit.repository_id == repo_id).limit(1))
+    mr_id = conn.scalar(select(MergeRequest.id).limit(1))
+    admin_id = conn.scalar(select(User.id).limit(1))
+    # A cursor halfway through the repository's commit history, for deep-page comparisons
+    depth = (conn.scalar(select(func.count()).select_from(Commit).where(Commit.repository_id == repo_id)) or 0) // 2
+    middle = conn.execute(
+        select(Commit.timestamp, Commit.id).where(Commit.repository_id == repo_id)
+        .order_by(Commit.timestamp.desc(), Commit.id.desc()).offset(depth).limit(1)
+    ).first()
+    return {"repo_id": repo_id, "user_id": user_id, "file_id": file_id, "file_path": file_path,
+            "commit_id": commit_id, "mr_id": mr_id, "admin_id": admin_id, "commit_depth": depth,
+            "commit_cursor": encode_cursor(*middle) if middle else None}
+
+
+def router_queries(p):
+    """(name, statement, executions per request) for the queries issued on hot request paths
+
+    Names are ``<router>.<endpoint>``; the statements are the routers' own,
+    minus eager-load options (those run as separate, keyed lookups).
+    """
+    dialect_name = engine.dialect.name
+    # dashboard.py compares against naive UTC timestamps
+    now = datetime.utcnow()
+    day_start = datetime(now.year, now.month, now.day)
+    like = "%seed%"
+
+    def page(query, sort_column, id_column, cursor=None, skip=0):
+        return keyset_paginate(query, sort_column, id_column, cursor=cursor, limit=100, skip=skip,
+                               dialect_name=dialect_name)
+
+    def count(model, *criteria):
+        return select(func.count()).select_from(model).where(*criteria)
+
+    return [
+        ("access_control.access_query", access_query([p["repo_id"]], p["user_id"]), 1),
+
+        ("repositories.list_repositories", page(
+            select(Repository).where(readable_criterion(p["user_id"])),
+            Repository.created_at, Repository.id), 1),
+        ("repositories.list_repository_audit", page(
+            select(AuditEntry).where(AuditEntry.repository_id == p["repo_id"]),
+            AuditEntry.created_at, AuditEntry.id), 1),
+
+        ("files.list_repository_files", select(RepositoryFile).where(
+            RepositoryFile.repository_id == p["repo_id"]), 1),
+        ("files.create_file_path_check", select(RepositoryFile.id).where(
+            RepositoryFile.repository_id == p["repo_id"], RepositoryFile.path == p["file_path"]).limit(1), 1),
+        ("upload_file.list_file_versions", page(
+            select(FileVersion).where(FileVersion.file_id == p["file_id"]),
+            FileVersion.version_number, FileVersion.id), 1),
+        ("upload_file.next_version_number", select(FileVersion.version_number).where(
+            FileVersion.file_id == p["file_id"]).order_by(FileVersion.version_number.desc()).limit(1), 1),
+
+        ("merge_requests.list_merge_requests", page(
+            select(MergeRequest).where(MergeRequest.target_repo.has(readable_criterion(p["user_id"]))),
+            MergeRequest.created_at, MergeRequest.id), 1),
+        ("merge_requests.list_merge_requests_for_repo", page(
+            select(MergeRequest).where(
+                MergeRequest.target_repo.has(readable_criterion(p["user_id"])),
+                (MergeRequest.source_repo_id == p["repo_id"]) | (MergeRequest.target_repo_id == p["repo_id"])),
+            MergeRequest.created_at, MergeRequest.id), 1),
+        ("merge_requests.list_merge_request_versions", page(
+            select(MergeRequestVersion).where(MergeRequestVersion.merge_request_id == p["mr_id"]),
+            MergeRequestVersion.version_number, MergeRequestVersion.id), 1),
+
+        ("commit_graph.list_commits", page(
+            select(Commit).where(Commit.repository_id == p["repo_id"]), Commit.timestamp, Commit.id), 1),
+        ("commit_graph.list_commits_deep_offset", page(
+            select(Commit).where(Commit.repository_id == p["repo_id"]), Commit.timestamp, Commit.id,
+            skip=p["commit_depth"]), 1),
+        ("commit_graph.list_commits_deep_cursor", page(
+            select(Commit).where(Commit.repository_id == p["repo_id"]), Commit.timestamp, Commit.id,
+            cursor=p["commit_cursor"]), 1),
+        ("commit_graph.get_commit_files", select(CommitFile).where(CommitFile.commit_id == p["commit_id"]), 1),
+
+        ("users.list_users", page(select(User), User.created_at, User.id), 1),
+
+        ("search.repositories", select(Repository).where(
+            or_(func.lower(Repository.name).like(like), func.lower(Repository.description).like(like)),
+            readable_criterion(p["user_id"])), 1),
+        ("search.files", select(RepositoryFile).where(
+            or_(func.lower(RepositoryFile.name).like(like), func.lower(RepositoryFile.content).like(like),
+                func.lower(RepositoryFile.path).like(like))), 1),
+        ("search.merge_requests", select(MergeRequest).where(
+            or_(func.lower(MergeRequest.title).like(like), func.lower(MergeRequest.description).like(like))), 1),
+
+        ("dashboard.ingested_24h", count(Repository, Repository.created_at >= now - timedelta(hours=24)), 2),
+        ("dashboard.active_cases_7d", count(
+            Repository, Repository.updated_at >= now - timedelta(days=14),
+            Repository.updated_at < now - timedelta(days=7)), 2),
+        ("dashboard.open_merge_requests", count(MergeRequest, MergeRequest.status == "open"), 1),
+        ("dashboard.open_merge_requests_24h_ago", count(
+            MergeRequest, MergeRequest.created_at < now - timedelta(hours=24), MergeRequest.status == "open"), 1),
+        ("dashboard.recent_activity", select(AuditEntry).where(
+            AuditEntry.created_at >= now - timedelta(days=7)).order_by(AuditEntry.created_at.desc()).limit(10), 1),
+        # One count per day of the 30-day ingest chart
+        ("dashboard.ingest_volume_day", count(
+            Repository, Repository.created_at >= day_start,
+            Repository.created_at < day_start + timedelta(days=1)), 30),
+        ("dashboard.investigator_performance", select(MergeRequest).where(
+            MergeRequest.created_at >= now - timedelta(days=30),
+            MergeRequest.status.in_(["merged", "closed"])), 1),
+    ]
+
+
+def _driver_sql(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    if conn.dialect.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    return compiled.string, params
+
+
+def explain(conn, statement) -> str:
+    sql, params = _driver_sql(conn, statement)
+    if conn.dialect.name == "postgresql":
+        rows = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params).fetchall()
+        return "\n".join(row[0] for row in rows)
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        return "\n".join(row[-1] for row in rows)
+    return "(EXPLAIN not supported for this dialect)"
+
+
+def time_query(conn, statement, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        conn.execute(statement).fetchall()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def report(args) -> None:
+    with engine.connect() as conn:
+        params = _sample(conn)
+        if not params["repo_id"]:
+            sys.exit("Database is empty; run with --seed first")
+        rows = []
+        for name, statement, executions in router_queries(params):
+            if args.only and name not in args.only:
+                continue
+            plan = explain(conn, statement)
+            median_ms = time_query(conn, statement, args.runs) * 1000
+            full_scans = sorted({table for match in FULL_SCAN.finditer(plan) for table in match.groups() if table})
+            rows.append((name, median_ms, median_ms * executions, full_scans))
+            print(f"== {name} ({median_ms:.2f} ms median of {args.runs}, x{executions} per request)")
+            print(plan)
+            print()
+
+    print(f"{'query':<48} | {'median ms':>9} | {'per request':>11} | full table scans")
+    print("-" * 100)
+    for name, median_ms, request_ms, full_scans in rows:
+        print(f"{name:<48} | {median_ms:>9.2f} | {request_ms:>11.2f} | {', '.join(full_scans) or '-'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="insert a synthetic dataset before reporting")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--repos", type=int, default=100)
+    parser.add_argument("--collaborators-per-repo", type=int, default=5)
+    parser.add_argument("--files-per-repo", type=int, default=50)
+    parser.add_argument("--versions-per-file", type=int, default=3)
+    parser.add_argument("--merge-requests-per-repo", type=int, default=20)
+    parser.add_argument("--commits-per-repo", type=int, default=200)
+    parser.add_argument("--audit-per-repo", type=int, default=500)
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=10, help="timed executions per query")
+    parser.add_argument("--only", nargs="*", help="restrict the report to these query names")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    if args.seed:
+        seed(args)
+    report(args)
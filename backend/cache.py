@@ -0,0 +1,152 @@
+"""Small in-process caches.
+
+State is per process, like ``database.ReadYourWritesTracker``: every uvicorn
+worker keeps its own copy, so entries must be safe to serve for up to their
+TTL after the underlying row changed.
+
+``write_generation`` counts the writes this process knows about: database
+commits that changed rows (database.py) and committed audit batches, which
+with ``AUDIT_STREAM_NOTIFY`` include those of the other workers
+(audit_stream.py). ``StaleWhileRevalidateCache`` treats entries computed
+before the latest write as stale.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire ``ttl_seconds`` after they were set"""
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class WriteGeneration:
+    """Monotonic counter bumped whenever data may have changed"""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def bump(self) -> None:
+        with self._lock:
+            self._value += 1
+
+
+write_generation = WriteGeneration()
+
+
+class StaleWhileRevalidateCache:
+    """Async results cached for ``ttl_seconds`` or until the next write
+
+    A stale entry (expired, or computed before ``generation`` last moved) is
+    still served for up to ``stale_seconds`` after it was stored while one
+    background task recomputes it. Callers that find nothing usable share a
+    single computation instead of each starting their own.
+    """
+
+    def __init__(self, ttl_seconds: float, stale_seconds: float, maxsize: int = 128,
+                 generation: WriteGeneration = write_generation):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.maxsize = maxsize
+        self.generation = generation
+        # key -> (generation, stored_at, value)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def _store(self, key: Hashable, generation: int, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = (generation, time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _refresh(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            async def run():
+                # Taken before computing: a write that lands meanwhile leaves the result stale
+                generation = self.generation.value
+                try:
+                    value = await compute()
+                finally:
+                    self._inflight.pop(key, None)
+                self._store(key, generation, value)
+                return value
+
+            task = self._inflight[key] = asyncio.get_running_loop().create_task(run())
+            task.add_done_callback(_log_failure)
+        return task
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            generation, stored_at, value = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl_seconds and generation == self.generation.value:
+                return value
+            if age < self.ttl_seconds + self.stale_seconds:
+                self._refresh(key, compute)
+                return value
+        # shield: one caller going away must not cancel the computation the others wait on
+        return await asyncio.shield(self._refresh(key, compute))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Cache refresh failed", exc_info=task.exception())
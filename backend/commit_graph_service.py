@@ -1,14 +1,19 @@
 import json
-import uuid
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, delete, func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from config import env_int
+from graph_layout import LANE_X_SPACING, file_position, layer_height, layered_layout
 from models import (
-    Commit, CommitFile, CommitGraph, Repository, RepositoryFile, User
+    Commit, CommitFile, CommitGraph, CommitGraphEdge, CommitGraphNode, Repository, RepositoryFile, User
 )
-from schemas import GraphNode, GraphEdge, GraphData
+from pagination import encode_cursor, keyset_paginate
+
+# Rows fetched per round trip when streaming a stored graph
+GRAPH_STREAM_BATCH = env_int("GRAPH_STREAM_BATCH", 2000)
 
 
 class CommitGraphService:
@@ -17,197 +22,250 @@ class CommitGraphService:
     def __init__(self, db: Session):
         self.db = db
     
-    def generate_commit_graph(self, repository_id: str, max_commits: int = 10) -> Dict[str, Any]:
+    def update_commit_graph(
+        self, repository_id: str, max_commits: int = 10, rebuild: bool = False
+    ) -> Tuple[CommitGraph, Dict[str, Any]]:
         """
-        Generate a commit graph for a repository
+        Bring a repository's commit graph up to date with its commits
+        
+        The first build takes the newest ``max_commits`` commits. After that
+        only commits newer than the graph's head are read and appended, so
+        the cost follows the number of new commits, not the history. The
+        graph is rebuilt from the newest ``max_commits`` commits when
+        ``rebuild`` is set or when more than ``max_commits`` commits arrived
+        since the last update. Commits added behind the head (older
+        timestamps) only show up after a rebuild.
+        
+        A build lays the graph out as a whole (``graph_layout.layered_layout``);
+        appended commits go on new layers below it, in their parent's lane
+        when they are its first child and in a new lane otherwise. The
+        stored positions are the layout of the graph's version and are never
+        recomputed on read; a rebuild lays the graph out afresh.
         
         Args:
             repository_id: Repository ID
-            max_commits: Maximum number of commits to include
+            max_commits: Maximum number of commits to build from or append
+            rebuild: Drop the stored graph and build it again
             
         Returns:
-            Dictionary containing graph data
+            The updated CommitGraph and the nodes, edges and layout added
         """
-        # Get commits for the repository
-        commits = self.db.query(Commit).filter(
-            Commit.repository_id == repository_id
-        ).order_by(Commit.timestamp.desc()).limit(max_commits).all()
+        # Serializes concurrent updates of one graph on PostgreSQL
+        graph = self.db.scalar(
+            select(CommitGraph).where(CommitGraph.repository_id == repository_id).limit(1).with_for_update()
+        )
+        if graph is None:
+            graph = CommitGraph(repository_id=repository_id, node_count=0, edge_count=0, commit_count=0, version=0,
+                                layer_count=0, lane_count=0, layout_height=0.0)
+            self.db.add(graph)
+            self.db.flush()
         
-        if not commits:
-            return {"nodes": [], "edges": [], "layout": {}}
+        rows = None
+        cleared = False
+        if graph.head_commit_id is not None and not rebuild:
+            rows = self._commit_rows(repository_id, max_commits, after=(graph.head_timestamp, graph.head_commit_id))
+            if len({row.id for row in rows}) > max_commits:
+                rows = None  # too far behind to catch up commit by commit
+        if rows is None:
+            if graph.node_count or graph.edge_count:
+                self._clear(graph)
+                cleared = True
+            rows = self._commit_rows(repository_id, max_commits)
         
-        nodes = []
-        edges = []
+        node_rows, edge_rows = self._graph_rows(graph, rows)
+        if node_rows:
+            # Core inserts: one executemany, where ORM bulk inserts split on the rows' NULL columns
+            self.db.execute(insert(CommitGraphNode.__table__), node_rows)
+        if edge_rows:
+            self.db.execute(insert(CommitGraphEdge.__table__), edge_rows)
+        if rows:
+            graph.head_timestamp, graph.head_commit_id = rows[-1].timestamp, rows[-1].id
+        if cleared or node_rows or edge_rows:
+            graph.version += 1
+        graph.last_updated = datetime.utcnow()
+        self.db.commit()
+        return graph, graph_segment(node_rows, edge_rows)
+    
+    def _commit_rows(self, repository_id: str, max_commits: int, after: Optional[Tuple[datetime, str]] = None) -> List:
+        """
+        Commits joined with their author and files, oldest first, in one query
         
-        # Create commit nodes
-        for commit in commits:
-            commit_node = GraphNode(
-                id=f"commit_{commit.sha}",
-                type="commit",
-                label=f"{commit.sha[:8]}: {commit.message[:50]}...",
-                metadata={
-                    "sha": commit.sha,
-                    "message": commit.message,
-                    "author": commit.author.username if commit.author else "Unknown",
-                    "timestamp": commit.timestamp.isoformat(),
-                    "parent_sha": commit.parent_sha
-                }
+        Without ``after``: the newest ``max_commits`` commits. With it: the
+        commits after that (timestamp, id) key, up to ``max_commits + 1`` so
+        the caller can tell whether it would fall behind.
+        """
+        commits = select(Commit.id, Commit.sha, Commit.message, Commit.parent_sha, Commit.timestamp, Commit.author_id) \
+            .where(Commit.repository_id == repository_id)
+        if after is None:
+            commits = commits.order_by(Commit.timestamp.desc(), Commit.id.desc()).limit(max_commits)
+        else:
+            # The same keyset range the commit list pages with
+            commits = keyset_paginate(
+                commits, Commit.timestamp, Commit.id, cursor=encode_cursor(*after), limit=max_commits,
+                dialect_name=self.db.get_bind().dialect.name, descending=False
             )
-            nodes.append(commit_node)
-            
-            # Create parent-child relationships between commits
-            if commit.parent_sha:
-                parent_node_id = f"commit_{commit.parent_sha}"
-                edges.append(GraphEdge(
-                    source=parent_node_id,
-                    target=f"commit_{commit.sha}",
-                    type="commit_parent",
-                    metadata={"relationship": "parent_child"}
-                ))
-        
-        # Create file nodes and relationships
-        file_versions = {}  # Track file versions across commits
-        
-        for commit in commits:
-            commit_files = self.db.query(CommitFile).filter(
-                CommitFile.commit_id == commit.id
-            ).all()
-            
-            for commit_file in commit_files:
-                file_node_id = f"file_{commit_file.file_id}_{commit.sha}"
-                
-                # Create file node for this commit
-                file_node = GraphNode(
-                    id=file_node_id,
-                    type="file",
-                    label=f"{commit_file.file_path} ({commit_file.change_type})",
-                    metadata={
-                        "file_path": commit_file.file_path,
-                        "change_type": commit_file.change_type,
-                        "additions": commit_file.additions,
-                        "deletions": commit_file.deletions,
-                        "commit_sha": commit.sha
-                    }
-                )
-                nodes.append(file_node)
-                
-                # Connect file to commit
-                edges.append(GraphEdge(
-                    source=f"commit_{commit.sha}",
-                    target=file_node_id,
-                    type="commit_to_file",
-                    metadata={"relationship": "contains"}
-                ))
-                
-                # Track file evolution
-                file_key = commit_file.file_path
-                if file_key in file_versions:
-                    # Create edge from previous version to current version
-                    previous_file_node = file_versions[file_key]
-                    edges.append(GraphEdge(
-                        source=previous_file_node,
-                        target=file_node_id,
-                        type="file_evolution",
-                        metadata={
-                            "relationship": "evolved_from",
-                            "change_type": commit_file.change_type
-                        }
-                    ))
-                
-                file_versions[file_key] = file_node_id
+        recent = commits.subquery()
+        return self.db.execute(
+            select(
+                recent.c.id, recent.c.sha, recent.c.message, recent.c.parent_sha, recent.c.timestamp,
+                User.username, CommitFile.file_id, CommitFile.file_path, CommitFile.change_type,
+                CommitFile.additions, CommitFile.deletions,
+            )
+            .outerjoin(User, User.id == recent.c.author_id)
+            .outerjoin(CommitFile, CommitFile.commit_id == recent.c.id)
+            .order_by(recent.c.timestamp, recent.c.id, CommitFile.id)
+        ).all()
+    
+    def _clear(self, graph: CommitGraph) -> None:
+        self.db.execute(delete(CommitGraphNode).where(CommitGraphNode.graph_id == graph.id))
+        self.db.execute(delete(CommitGraphEdge).where(CommitGraphEdge.graph_id == graph.id))
+        graph.node_count = graph.edge_count = graph.commit_count = 0
+        graph.layer_count = graph.lane_count = 0
+        graph.layout_height = 0.0
+        graph.head_timestamp = graph.head_commit_id = None
+    
+    def _latest_file_nodes(self, graph_id: str, paths: List[str]) -> Dict[str, str]:
+        """Node id of the newest version of each path already in the graph"""
+        latest = (
+            select(CommitGraphNode.file_path, func.max(CommitGraphNode.seq).label("seq"))
+            .where(CommitGraphNode.graph_id == graph_id, CommitGraphNode.file_path.in_(paths))
+            .group_by(CommitGraphNode.file_path)
+            .subquery()
+        )
+        return dict(self.db.execute(
+            select(CommitGraphNode.file_path, CommitGraphNode.node_id)
+            .join(latest, and_(CommitGraphNode.graph_id == graph_id, CommitGraphNode.seq == latest.c.seq))
+        ).all())
+    
+    def _place_commits(self, graph: CommitGraph, commits: List[Tuple[str, str, Optional[str], int]]) -> Dict[str, Tuple]:
+        """
+        (layer, lane, x, y) of each new commit, given as (id, sha, parent sha, file count) oldest first
         
-        # Generate layout positions
-        layout = self._generate_layout(nodes, edges)
+        Updates the graph's layout extent.
+        """
+        if not graph.commit_count:
+            index = {sha: i for i, (_, sha, _, _) in enumerate(commits)}
+            layout = layered_layout(
+                [index.get(parent_sha, -1) for _, _, parent_sha, _ in commits],
+                [file_count for _, _, _, file_count in commits],
+            )
+            graph.layer_count, graph.lane_count, graph.layout_height = \
+                layout.layer_count, layout.lane_count, layout.height
+            return {
+                commit_id: (int(layer), int(lane), float(x), float(y))
+                for (commit_id, _, _, _), layer, lane, x, y in zip(commits, layout.layer, layout.lane, layout.x, layout.y)
+            }
         
-        graph_data = {
-            "nodes": [node.dict() for node in nodes],
-            "edges": [edge.dict() for edge in edges],
-            "layout": layout
-        }
+        parents = list({f"commit_{parent_sha}" for _, _, parent_sha, _ in commits if parent_sha})
+        lanes = dict(self.db.execute(
+            select(CommitGraphNode.node_id, CommitGraphNode.lane)
+            .where(CommitGraphNode.graph_id == graph.id, CommitGraphNode.node_id.in_(parents))
+        ).all()) if parents else {}
+        forked = set(self.db.scalars(
+            select(CommitGraphEdge.source)
+            .where(CommitGraphEdge.graph_id == graph.id, CommitGraphEdge.source.in_(parents),
+                   CommitGraphEdge.type == "commit_parent")
+        ).all()) if parents else set()
         
-        return graph_data
+        placed = {}
+        for commit_id, sha, parent_sha, file_count in commits:
+            parent = f"commit_{parent_sha}" if parent_sha else None
+            if parent in lanes and parent not in forked:
+                lane = lanes[parent]
+            else:
+                lane = graph.lane_count
+                graph.lane_count += 1
+            forked.add(parent)
+            lanes[f"commit_{sha}"] = lane
+            placed[commit_id] = (graph.layer_count, lane, float(lane * LANE_X_SPACING), graph.layout_height)
+            graph.layer_count += 1
+            graph.layout_height += float(layer_height(file_count))
+        return placed
     
-    def _generate_layout(self, nodes: List[GraphNode], edges: List[GraphEdge]) -> Dict[str, Any]:
+    def _graph_rows(self, graph: CommitGraph, rows: List) -> Tuple[List[Dict], List[Dict]]:
         """
-        Generate layout positions for nodes using a simple algorithm
+        Node and edge rows for ``rows`` (from ``_commit_rows``), appended after the graph's current ones
         
-        Args:
-            nodes: List of graph nodes
-            edges: List of graph edges
-            
-        Returns:
-            Layout configuration
+        Updates the graph's counters.
         """
-        layout = {}
+        node_rows = []
+        edge_rows = []
+        paths = list({row.file_path for row in rows if row.file_path is not None})
+        file_versions = self._latest_file_nodes(graph.id, paths) if graph.node_count and paths else {}
         
-        # Separate commit and file nodes
-        commit_nodes = [node for node in nodes if node.type == "commit"]
-        file_nodes = [node for node in nodes if node.type == "file"]
-        
-        # Position commit nodes in a vertical line
-        commit_y_spacing = 200
-        for i, commit_node in enumerate(commit_nodes):
-            layout[commit_node.id] = {
-                "x": 0,
-                "y": i * commit_y_spacing,
-                "level": 0
-            }
+        commits = {}
+        for row in rows:
+            if row.id not in commits:
+                commits[row.id] = [row.id, row.sha, row.parent_sha, 0]
+            commits[row.id][3] += row.file_path is not None
+        positions = self._place_commits(graph, [tuple(commit) for commit in commits.values()])
+        previous_commit_id = None
         
-        # Position file nodes to the right of their commits
-        file_x_offset = 300
-        file_y_spacing = 50
+        def add_edge(source, target, edge_type, metadata):
+            edge_rows.append({
+                "graph_id": graph.id, "seq": graph.edge_count, "source": source, "target": target,
+                "type": edge_type, "details": metadata,
+            })
+            graph.edge_count += 1
         
-        for i, file_node in enumerate(file_nodes):
-            # Find the commit this file belongs to
-            commit_sha = file_node.metadata.get("commit_sha")
-            if commit_sha:
-                commit_node_id = f"commit_{commit_sha}"
-                commit_y = layout.get(commit_node_id, {}).get("y", 0)
+        for (commit_id, sha, message, parent_sha, timestamp, username,
+             file_id, file_path, change_type, additions, deletions) in rows:
+            commit_node_id = f"commit_{sha}"
+            if commit_id != previous_commit_id:
+                previous_commit_id = commit_id
+                layer, lane, commit_x, commit_y = positions[commit_id]
+                file_index = 0
+                node_rows.append({
+                    "graph_id": graph.id, "seq": graph.node_count, "node_id": commit_node_id, "type": "commit",
+                    "label": commit_label(sha, message),
+                    "details": {
+                        "sha": sha,
+                        "message": message,
+                        "author": username or "Unknown",
+                        "timestamp": timestamp.isoformat(),
+                        "parent_sha": parent_sha
+                    },
+                    "commit_sha": sha, "file_path": None, "x": commit_x, "y": commit_y, "level": 0,
+                    "layer": layer, "lane": lane,
+                })
+                graph.node_count += 1
+                graph.commit_count += 1
                 
-                layout[file_node.id] = {
-                    "x": file_x_offset,
-                    "y": commit_y + (i % 5) * file_y_spacing,  # Stack files vertically
-                    "level": 1
-                }
-        
-        return layout
-    
-    def save_commit_graph(self, repository_id: str, graph_data: Dict[str, Any]) -> CommitGraph:
-        """
-        Save commit graph to database
-        
-        Args:
-            repository_id: Repository ID
-            graph_data: Graph data to save
+                # Parent-child relationships between commits
+                if parent_sha:
+                    add_edge(f"commit_{parent_sha}", commit_node_id, "commit_parent", {"relationship": "parent_child"})
             
-        Returns:
-            Saved CommitGraph object
-        """
-        # Check if graph already exists
-        existing_graph = self.db.query(CommitGraph).filter(
-            CommitGraph.repository_id == repository_id
-        ).first()
+            if file_path is None:
+                continue  # a commit without files
+            
+            file_node_id = f"file_{file_id}_{sha}"
+            file_x, file_y = file_position(commit_x, commit_y, file_index)
+            file_index += 1
+            node_rows.append({
+                "graph_id": graph.id, "seq": graph.node_count, "node_id": file_node_id, "type": "file",
+                "label": file_label(file_path, change_type),
+                "details": {
+                    "file_path": file_path,
+                    "change_type": change_type,
+                    "additions": additions,
+                    "deletions": deletions,
+                    "commit_sha": sha
+                },
+                "commit_sha": sha, "file_path": file_path,
+                "x": file_x, "y": file_y, "level": 1, "layer": layer, "lane": lane,
+            })
+            graph.node_count += 1
+            add_edge(commit_node_id, file_node_id, "commit_to_file", {"relationship": "contains"})
+            
+            # Track file evolution: the previous version evolved into this one
+            if file_path in file_versions:
+                add_edge(file_versions[file_path], file_node_id, "file_evolution", {
+                    "relationship": "evolved_from",
+                    "change_type": change_type
+                })
+            file_versions[file_path] = file_node_id
         
-        if existing_graph:
-            # Update existing graph
-            existing_graph.graph_data = graph_data
-            existing_graph.node_count = len(graph_data.get("nodes", []))
-            existing_graph.edge_count = len(graph_data.get("edges", []))
-            existing_graph.last_updated = datetime.utcnow()
-            self.db.commit()
-            return existing_graph
-        else:
-            # Create new graph
-            commit_graph = CommitGraph(
-                repository_id=repository_id,
-                graph_data=graph_data,
-                node_count=len(graph_data.get("nodes", [])),
-                edge_count=len(graph_data.get("edges", []))
-            )
-            self.db.add(commit_graph)
-            self.db.commit()
-            self.db.refresh(commit_graph)
-            return commit_graph
+        return node_rows, edge_rows
     
     def get_commit_graph(self, repository_id: str) -> Optional[CommitGraph]:
         """
@@ -223,117 +281,6 @@ class CommitGraphService:
             CommitGraph.repository_id == repository_id
         ).first()
     
-    def add_commits_from_repo(self, repository_id: str, repo_path: str, max_commits: int = 5) -> List[Commit]:
-        """
-        Add commits from a git repository path
-        
-        Args:
-            repository_id: Repository ID
-            repo_path: Path to git repository
-            max_commits: Maximum number of commits to add
-            
-        Returns:
-            List of created Commit objects
-        """
-        import subprocess
-        import os
-        
-        if not os.path.exists(repo_path):
-            raise ValueError(f"Repository path does not exist: {repo_path}")
-        
-        try:
-            # Get git log
-            result = subprocess.run([
-                'git', 'log', '--oneline', f'-{max_commits}',
-                '--pretty=format:%H|%an|%ae|%ad|%s'
-            ], cwd=repo_path, capture_output=True, text=True, check=True)
-            
-            commits = []
-            lines = result.stdout.strip().split('\n')
-            
-            for line in lines:
-                if not line:
-                    continue
-                    
-                parts = line.split('|', 4)
-                if len(parts) < 5:
-                    continue
-                
-                sha, author_name, author_email, date_str, message = parts
-                
-                # Parse date
-                from dateutil import parser
-                timestamp = parser.parse(date_str)
-                
-                # Find or create user
-                user = self.db.query(User).filter(User.email == author_email).first()
-                if not user:
-                    user = User(
-                        clerk_id=str(uuid.uuid4()),
-                        username=author_name.lower().replace(' ', '_'),
-                        email=author_email,
-                        role="contributor"
-                    )
-                    self.db.add(user)
-                    self.db.commit()
-                    self.db.refresh(user)
-                
-                # Create commit
-                commit = Commit(
-                    repository_id=repository_id,
-                    sha=sha,
-                    message=message,
-                    author_id=user.id,
-                    timestamp=timestamp
-                )
-                self.db.add(commit)
-                commits.append(commit)
-            
-            self.db.commit()
-            
-            # Refresh commits to get IDs
-            for commit in commits:
-                self.db.refresh(commit)
-            
-            return commits
-            
-        except subprocess.CalledProcessError as e:
-            raise ValueError(f"Failed to read git repository: {e}")
-        except Exception as e:
-            raise ValueError(f"Error processing repository: {e}")
-    
-    def create_file_relationships(self, repository_id: str) -> None:
-        """
-        Create file relationships based on file versions and changes
-        
-        Args:
-            repository_id: Repository ID
-        """
-        # Get all commits for the repository
-        commits = self.db.query(Commit).filter(
-            Commit.repository_id == repository_id
-        ).order_by(Commit.timestamp.asc()).all()
-        
-        file_history = {}  # Track file paths and their versions
-        
-        for commit in commits:
-            commit_files = self.db.query(CommitFile).filter(
-                CommitFile.commit_id == commit.id
-            ).all()
-            
-            for commit_file in commit_files:
-                file_path = commit_file.file_path
-                
-                # Track file evolution
-                if file_path in file_history:
-                    # Link to previous version
-                    commit_file.previous_file_id = file_history[file_path]
-                
-                # Update file history
-                file_history[file_path] = commit_file.file_id
-        
-        self.db.commit()
-    
     def get_graph_statistics(self, repository_id: str) -> Dict[str, Any]:
         """
         Get statistics about the commit graph
@@ -362,3 +309,177 @@ class CommitGraphService:
             "unique_files": unique_files,
             "average_files_per_commit": files / commits if commits > 0 else 0
         }
+
+
+def commit_label(sha: str, message: str) -> str:
+    return f"{sha[:8]}: {message[:50]}..."
+
+
+def file_label(file_path: str, change_type: str) -> str:
+    return f"{file_path} ({change_type})"
+
+
+def _node_dict(node_id: str, node_type: str, label: str, metadata) -> Dict[str, Any]:
+    return {"id": node_id, "type": node_type, "label": label, "metadata": metadata, "position": None}
+
+
+def _edge_dict(source: str, target: str, edge_type: str, metadata) -> Dict[str, Any]:
+    return {"source": source, "target": target, "type": edge_type, "metadata": metadata}
+
+
+def _position_dict(x: float, y: float, level: int, layer: int, lane: int) -> Dict[str, Any]:
+    return {"x": x, "y": y, "level": level, "layer": layer, "lane": lane}
+
+
+def graph_segment(node_rows: List[Dict], edge_rows: List[Dict]) -> Dict[str, Any]:
+    """Node and edge table rows in the API's graph shape"""
+    return {
+        "nodes": [_node_dict(row["node_id"], row["type"], row["label"], row["details"]) for row in node_rows],
+        "edges": [_edge_dict(row["source"], row["target"], row["type"], row["details"]) for row in edge_rows],
+        "layout": {row["node_id"]: _position_dict(row["x"], row["y"], row["level"], row["layer"], row["lane"])
+                   for row in node_rows},
+    }
+
+
+def graph_header(graph: CommitGraph) -> Dict[str, Any]:
+    """The fields of GET /graph besides graph_data"""
+    return {
+        "id": graph.id,
+        "repository_id": graph.repository_id,
+        "node_count": graph.node_count,
+        "edge_count": graph.edge_count,
+        "commit_count": graph.commit_count,
+        "version": graph.version,
+        "layer_count": graph.layer_count,
+        "lane_count": graph.lane_count,
+        "layout_height": graph.layout_height,
+        "last_updated": graph.last_updated.isoformat() if graph.last_updated else None,
+        "created_at": graph.created_at.isoformat() if graph.created_at else None,
+    }
+
+
+async def stream_rows(db: AsyncSession, graph: CommitGraph, *columns, model) -> AsyncIterator[List]:
+    """``columns`` of a stored graph's node or edge rows in insertion order, a batch at a time"""
+    query = (
+        select(*columns).where(model.graph_id == graph.id).order_by(model.seq)
+        .execution_options(yield_per=GRAPH_STREAM_BATCH)
+    )
+    result = await db.stream(query)
+    async for partition in result.partitions():
+        yield partition
+
+
+async def graph_json_chunks(db: AsyncSession, graph: CommitGraph) -> AsyncIterator[str]:
+    """
+    A stored graph as the JSON document of GET /graph, a batch of rows at a time
+    
+    Nodes, edges and layout are each read off a server-side cursor in
+    insertion order, so memory holds one batch, not the graph.
+    """
+    yield json.dumps(graph_header(graph))[:-1] + ', "graph_data": {"nodes": ['
+    
+    def rows(*columns, model):
+        return stream_rows(db, graph, *columns, model=model)
+    
+    separator = ""
+    async for batch in rows(CommitGraphNode.node_id, CommitGraphNode.type, CommitGraphNode.label,
+                            CommitGraphNode.details, model=CommitGraphNode):
+        yield separator + ",".join(json.dumps(_node_dict(*row)) for row in batch)
+        separator = ","
+    yield '], "edges": ['
+    separator = ""
+    async for batch in rows(CommitGraphEdge.source, CommitGraphEdge.target, CommitGraphEdge.type,
+                            CommitGraphEdge.details, model=CommitGraphEdge):
+        yield separator + ",".join(json.dumps(_edge_dict(*row)) for row in batch)
+        separator = ","
+    yield '], "layout": {'
+    separator = ""
+    async for batch in rows(CommitGraphNode.node_id, CommitGraphNode.x, CommitGraphNode.y, CommitGraphNode.level,
+                            CommitGraphNode.layer, CommitGraphNode.lane, model=CommitGraphNode):
+        yield separator + ",".join(
+            f'{json.dumps(node_id)}: {json.dumps(_position_dict(*position))}' for node_id, *position in batch
+        )
+        separator = ","
+    yield "}}}"
+
+
+_WINDOW_NODE_COLUMNS = (
+    CommitGraphNode.node_id, CommitGraphNode.type, CommitGraphNode.label, CommitGraphNode.details,
+    CommitGraphNode.x, CommitGraphNode.y, CommitGraphNode.level, CommitGraphNode.layer, CommitGraphNode.lane,
+)
+
+
+async def window_rows(
+    db: AsyncSession,
+    graph: CommitGraph,
+    limit: int,
+    first_layer: Optional[int] = None,
+    last_layer: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    x_min: Optional[float] = None,
+    x_max: Optional[float] = None,
+    y_min: Optional[float] = None,
+    y_max: Optional[float] = None,
+) -> Tuple[List, List, List, bool]:
+    """
+    Rows of a stored graph inside a window: (nodes, edges, boundary nodes, truncated)
+    
+    The window is every bound given: a layer range (topological order), a
+    commit time range and a layout box, each end optional. Node rows are
+    (node_id, type, label, details, x, y, level, layer, lane), in insertion
+    order. Edges with one end outside the window are included, so edges
+    leaving the viewport can be drawn; boundary nodes are their outer ends.
+    truncated tells whether more than ``limit`` nodes matched.
+    """
+    conditions = [CommitGraphNode.graph_id == graph.id]
+    for column, low, high in ((CommitGraphNode.layer, first_layer, last_layer),
+                              (CommitGraphNode.y, y_min, y_max), (CommitGraphNode.x, x_min, x_max)):
+        if low is not None:
+            conditions.append(column >= low)
+        if high is not None:
+            conditions.append(column <= high)
+    if since is not None or until is not None:
+        commits = select(Commit.sha).where(Commit.repository_id == graph.repository_id)
+        if since is not None:
+            commits = commits.where(Commit.timestamp >= since)
+        if until is not None:
+            commits = commits.where(Commit.timestamp < until)
+        conditions.append(CommitGraphNode.commit_sha.in_(commits))
+    
+    nodes = (await db.execute(
+        select(*_WINDOW_NODE_COLUMNS).where(*conditions).order_by(CommitGraphNode.seq).limit(limit + 1)
+    )).all()
+    truncated = len(nodes) > limit
+    nodes = nodes[:limit]
+    inside = [node.node_id for node in nodes]
+    
+    edges = (await db.execute(
+        select(CommitGraphEdge.source, CommitGraphEdge.target, CommitGraphEdge.type, CommitGraphEdge.details)
+        .where(CommitGraphEdge.graph_id == graph.id,
+               or_(CommitGraphEdge.source.in_(inside), CommitGraphEdge.target.in_(inside)))
+        .order_by(CommitGraphEdge.seq)
+    )).all() if inside else []
+    outside = list({end for edge in edges for end in (edge.source, edge.target)} - set(inside))
+    boundary = (await db.execute(
+        select(*_WINDOW_NODE_COLUMNS)
+        .where(CommitGraphNode.graph_id == graph.id, CommitGraphNode.node_id.in_(outside))
+        .order_by(CommitGraphNode.seq)
+    )).all() if outside else []
+    return nodes, edges, boundary, truncated
+
+
+async def graph_window(db: AsyncSession, graph: CommitGraph, limit: int, **bounds) -> Dict[str, Any]:
+    """
+    The part of a stored graph inside a window (see ``window_rows``), in the API's graph shape
+    """
+    nodes, edges, boundary, truncated = await window_rows(db, graph, limit, **bounds)
+    return {
+        "graph_id": graph.id,
+        "version": graph.version,
+        "truncated": truncated,
+        "nodes": [_node_dict(*node[:4]) for node in nodes],
+        "edges": [_edge_dict(*edge) for edge in edges],
+        "boundary_nodes": [_node_dict(*node[:4]) for node in boundary],
+        "layout": {node[0]: _position_dict(*node[4:]) for node in (*nodes, *boundary)},
+    }
@@ -0,0 +1,271 @@
+"""Full-history import of a git repository's commits.
+
+One ``git log`` subprocess streams the history oldest first: each commit's
+parents, author and date, then its changed paths (``--raw``) and line counts
+(``--numstat``). Commits are parsed as the output arrives and written in
+batches of ``GIT_IMPORT_BATCH``. Each batch is one bulk insert apiece for
+new authors, new repository files, commits and commit files. Rows that
+already exist are skipped, so importing the same history twice is harmless.
+
+After each batch, ``Repository.git_import_head`` records the last commit
+written. The next import reads ``<head>..HEAD`` only, so an interrupted
+import resumes where it stopped and a finished one picks up new commits.
+If the head is unknown to the git repository (another clone, rewritten
+history), the whole history is read again and existing commits are skipped.
+
+``Commit.parent_sha`` holds a commit's first parent. Merge commits list no
+files, as ``git log`` shows no diff for them by default. Commit SHAs are
+unique across repositories: a commit already stored under another repository
+(a fork imported separately) is skipped and counted in
+``commits_in_other_repositories``.
+
+Authors are matched by email. A new author gets a username derived from
+their name, with a short suffix when another user already has it.
+
+The import blocks on the ``git`` subprocess and the database; call it from a
+worker thread, not the event loop.
+"""
+import hashlib
+import os
+import posixpath
+import subprocess
+import tempfile
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from config import env_int
+from models import Commit, CommitFile, Repository, RepositoryFile, User
+
+GIT_IMPORT_BATCH = env_int("GIT_IMPORT_BATCH", 1000)
+# Rounds of username suffixes tried for new authors before giving up
+_USERNAME_ATTEMPTS = 5
+
+# Commit header lines start with a record separator; fields are split by unit separators
+_RECORD, _FIELD = "\x1e", "\x1f"
+_FORMAT = _RECORD + _FIELD.join(("%H", "%P", "%an", "%ae", "%at", "%s"))
+CHANGE_TYPES = {"A": "added", "M": "modified", "D": "deleted", "T": "modified"}
+FILE_TYPES = {".md": "markdown", ".json": "json", ".csv": "csv"}
+
+
+@dataclass
+class GitCommit:
+    sha: str
+    parent_sha: Optional[str]
+    author_name: str
+    author_email: str
+    timestamp: datetime
+    message: str
+    # path -> [change type, additions, deletions]
+    files: Dict[str, List] = field(default_factory=dict)
+
+
+def parse_log(lines: Iterator[str]) -> Iterator[GitCommit]:
+    """Commits from ``git log --raw --numstat`` output in ``_FORMAT``, as the lines arrive"""
+    commit = None
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith(_RECORD):
+            if commit is not None:
+                yield commit
+            sha, parents, name, email, timestamp, message = line[1:].split(_FIELD, 5)
+            commit = GitCommit(
+                sha=sha, parent_sha=parents.split()[0] if parents else None, author_name=name,
+                author_email=email, timestamp=datetime.fromtimestamp(int(timestamp), timezone.utc),
+                message=message,
+            )
+        elif commit is None or not line:
+            continue
+        elif line.startswith(":"):
+            # :<old mode> <new mode> <old blob> <new blob> <status>\t<path>
+            status, path = line.split("\t", 1)
+            commit.files[path] = [CHANGE_TYPES.get(status.split()[-1][:1], "modified"), 0, 0]
+        else:
+            # <additions>\t<deletions>\t<path>, "-" for binary files
+            additions, deletions, path = line.split("\t", 2)
+            if path in commit.files:
+                commit.files[path][1:] = [int(additions) if additions != "-" else 0,
+                                          int(deletions) if deletions != "-" else 0]
+    if commit is not None:
+        yield commit
+
+
+def _username(name: str, email: str, attempt: int) -> str:
+    """Username for a new author: from the name, then with a suffix derived from the email"""
+    username = name.lower().replace(" ", "_")
+    if attempt == 0:
+        return username
+    return f"{username}_{hashlib.sha1(f'{email}:{attempt}'.encode()).hexdigest()[:8]}"
+
+
+class GitImporter:
+    """Imports a git repository's history into a repository's commits"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+
+    def import_history(self, repository_id: str, repo_path: str, max_commits: Optional[int] = None) -> Dict:
+        """
+        Import the commits of ``repo_path`` not imported yet, oldest first
+
+        Args:
+            repository_id: Repository ID
+            repo_path: Path to a git working tree or bare repository
+            max_commits: Stop after this many commits; the next import continues from there
+
+        Returns:
+            Counts of what was read and written, and the new import head
+        """
+        if not os.path.isdir(repo_path):
+            raise ValueError(f"Repository path does not exist: {repo_path}")
+        repository = self.db.get(Repository, repository_id)
+        if repository is None:
+            raise ValueError(f"Repository not found: {repository_id}")
+
+        revisions = "HEAD"
+        if repository.git_import_head and self._has_commit(repo_path, repository.git_import_head):
+            revisions = f"{repository.git_import_head}..HEAD"
+
+        # stderr goes to a file: a pipe read only at the end could fill up and stall git
+        errors = tempfile.TemporaryFile()
+        process = subprocess.Popen(
+            ["git", "-c", "core.quotePath=false", "log", "--reverse", "--topo-order", "--no-renames",
+             "--raw", "--numstat", f"--format={_FORMAT}", revisions],
+            cwd=repo_path, stdout=subprocess.PIPE, stderr=errors,
+            text=True, encoding="utf-8", errors="replace",
+        )
+        summary = {"commits_read": 0, "commits_imported": 0, "commit_files_imported": 0,
+                   "commits_in_other_repositories": 0, "authors_created": 0, "files_created": 0, "complete": True}
+        batch = []
+        read_all = False
+        try:
+            for commit in parse_log(process.stdout):
+                if max_commits is not None and summary["commits_read"] == max_commits:
+                    summary["complete"] = False
+                    break
+                summary["commits_read"] += 1
+                batch.append(commit)
+                if len(batch) == GIT_IMPORT_BATCH:
+                    self._write(repository, batch, summary)
+                    batch = []
+            else:
+                read_all = True
+            if batch:
+                self._write(repository, batch, summary)
+        finally:
+            if not read_all:
+                process.kill()
+            returncode = process.wait()
+            process.stdout.close()
+            errors.seek(0)
+            stderr = errors.read().decode("utf-8", "replace")
+            errors.close()
+        if read_all and returncode != 0:
+            raise ValueError(f"Failed to read git repository: {stderr.strip()}")
+        summary["head_sha"] = repository.git_import_head
+        return summary
+
+    @staticmethod
+    def _has_commit(repo_path: str, sha: str) -> bool:
+        return subprocess.run(["git", "cat-file", "-e", f"{sha}^{{commit}}"], cwd=repo_path,
+                              capture_output=True).returncode == 0
+
+    def _insert_missing(self, model, rows: List[Dict]) -> None:
+        """Insert ``rows``, skipping those that hit a unique constraint"""
+        if rows:
+            self.db.execute(self.dialect.insert(model.__table__).on_conflict_do_nothing(), rows)
+
+    def _authors(self, batch: List[GitCommit], summary: Dict) -> Dict[str, str]:
+        """User id by author email, creating users for new authors"""
+        names = {commit.author_email: commit.author_name for commit in batch}
+        users = dict(self.db.execute(select(User.email, User.id).where(User.email.in_(names))).all())
+        missing = {email: name for email, name in names.items() if email not in users}
+        for attempt in range(_USERNAME_ATTEMPTS):
+            if not missing:
+                return users
+            usernames = {email: _username(name, email, attempt) for email, name in missing.items()}
+            taken = set(self.db.scalars(select(User.username).where(User.username.in_(set(usernames.values())))))
+            rows = []
+            for email, username in usernames.items():
+                if username in taken:
+                    username = _username(missing[email], email, attempt + 1)
+                taken.add(username)
+                rows.append({"id": str(uuid.uuid4()), "clerk_id": str(uuid.uuid4()), "username": username,
+                             "email": email, "role": "contributor"})
+            # A row whose username was taken meanwhile is skipped here and retried with the next suffix
+            self._insert_missing(User, rows)
+            created = dict(self.db.execute(select(User.email, User.id).where(User.email.in_(missing))).all())
+            users.update(created)
+            summary["authors_created"] += len(created)
+            missing = {email: name for email, name in missing.items() if email not in created}
+        if missing:
+            raise ValueError(f"Could not create users for authors: {', '.join(sorted(missing))}")
+        return users
+
+    def _files(self, repository: Repository, batch: List[GitCommit], authors: Dict[str, str],
+               summary: Dict) -> Dict[str, str]:
+        """Repository file id by path, creating files for paths the repository does not have"""
+        creators = {}
+        for commit in batch:
+            for path in commit.files:
+                creators.setdefault("/" + path, authors[commit.author_email])
+        query = select(RepositoryFile.path, RepositoryFile.id).where(
+            RepositoryFile.repository_id == repository.id, RepositoryFile.path.in_(creators)
+        )
+        files = dict(self.db.execute(query).all())
+        rows = [
+            {"id": str(uuid.uuid4()), "repository_id": repository.id, "name": posixpath.basename(path), "path": path,
+             "file_type": FILE_TYPES.get(posixpath.splitext(path)[1].lower(), "txt"), "size": 0,
+             "author_id": author_id}
+            for path, author_id in creators.items() if path not in files
+        ]
+        if rows:
+            self._insert_missing(RepositoryFile, rows)
+            files = dict(self.db.execute(query).all())
+            summary["files_created"] += len(rows)
+        return files
+
+    def _write(self, repository: Repository, batch: List[GitCommit], summary: Dict) -> None:
+        """Write one batch of commits and move the import head past it"""
+        # SHAs are unique across repositories, so the lookup is too
+        existing = dict(self.db.execute(
+            select(Commit.sha, Commit.repository_id).where(Commit.sha.in_([commit.sha for commit in batch]))
+        ).all())
+        summary["commits_in_other_repositories"] += sum(
+            repository_id != repository.id for repository_id in existing.values()
+        )
+        new = [commit for commit in batch if commit.sha not in existing]
+        if new:
+            authors = self._authors(new, summary)
+            files = self._files(repository, new, authors, summary)
+            commit_rows, file_rows = [], []
+            for commit in new:
+                commit_id = str(uuid.uuid4())
+                commit_rows.append({
+                    "id": commit_id, "repository_id": repository.id, "sha": commit.sha, "message": commit.message,
+                    "author_id": authors[commit.author_email], "timestamp": commit.timestamp,
+                    "parent_sha": commit.parent_sha,
+                })
+                for path, (change_type, additions, deletions) in commit.files.items():
+                    file_id = files["/" + path]
+                    file_rows.append({
+                        "id": str(uuid.uuid4()), "commit_id": commit_id, "file_id": file_id, "file_path": "/" + path,
+                        "change_type": change_type, "additions": additions, "deletions": deletions,
+                        # Modified and deleted files had an earlier version at the same path
+                        "previous_file_id": None if change_type == "added" else file_id,
+                    })
+            self._insert_missing(Commit, commit_rows)
+            # Commits stored by another import since the lookup above were skipped, and so are their files
+            stored = set(self.db.scalars(select(Commit.id).where(Commit.id.in_([row["id"] for row in commit_rows]))))
+            file_rows = [row for row in file_rows if row["commit_id"] in stored]
+            self._insert_missing(CommitFile, file_rows)
+            summary["commits_imported"] += len(stored)
+            summary["commit_files_imported"] += len(file_rows)
+        repository.git_import_head = batch[-1].sha
+        self.db.commit()
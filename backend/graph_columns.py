@@ -0,0 +1,232 @@
+"""Columnar wire format for commit graphs.
+
+GET /graph and GET /graph/window return the graph as lists of node and edge
+objects by default, which repeats every key, node type and full SHA once per
+node or edge. Clients that send one of these ``Accept`` types get the same
+graph as columns instead:
+
+- ``application/vnd.osinthub.graph+msgpack`` (or ``application/msgpack``):
+  MessagePack
+- ``application/vnd.osinthub.graph+json``: the same document as JSON, for
+  clients without a MessagePack decoder
+
+The document holds ``graph`` (the header GET /graph returns), ``strings``
+(the distinct SHAs, authors, paths, file ids, change types, node and edge
+types and edge metadata, each in first-seen order), ``nodes`` and ``edges``.
+Node and edge columns hold one entry per row; columns named after a
+``strings`` table hold indexes into it, -1 standing for none. Commit columns
+(``message``, ``author``, ``timestamp``, ``parent``) are null on file rows and
+file columns (``file_id``, ``path``, ``change_type``, ``additions``,
+``deletions``) on commit rows. Edge ``source`` and ``target`` are node row
+indexes, or ``-(k + 1)`` for the k-th id in ``edges.external`` when that end
+is not among the nodes. Node ids and labels are left out: they follow from
+the SHA, file id, path and change type (see ``graph_from_columns``).
+
+Columns are filled straight from node and edge rows, without building node
+objects, and integral coordinates are sent as integers.
+"""
+import json
+from typing import Any, Dict, Iterable, Optional
+
+import msgpack
+from sqlalchemy import Text, cast
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from commit_graph_service import commit_label, file_label, graph_header, stream_rows, window_rows
+from models import CommitGraph, CommitGraphEdge, CommitGraphNode
+
+GRAPH_MSGPACK = "application/vnd.osinthub.graph+msgpack"
+GRAPH_COLUMNS_JSON = "application/vnd.osinthub.graph+json"
+_ACCEPTED = {
+    GRAPH_MSGPACK: GRAPH_MSGPACK,
+    "application/msgpack": GRAPH_MSGPACK,
+    "application/x-msgpack": GRAPH_MSGPACK,
+    GRAPH_COLUMNS_JSON: GRAPH_COLUMNS_JSON,
+}
+
+STRING_TABLES = ("sha", "author", "path", "file_id", "change_type", "node_type", "edge_type", "edge_metadata")
+NODE_COLUMNS = (
+    "type", "sha", "message", "author", "timestamp", "parent", "file_id", "path", "change_type",
+    "additions", "deletions", "x", "y", "level", "layer", "lane",
+)
+EDGE_COLUMNS = ("source", "target", "type", "metadata")
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """The columnar media type an ``Accept`` header asks for, or None for the default JSON"""
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        if media_type in _ACCEPTED:
+            return _ACCEPTED[media_type]
+    return None
+
+
+def encode(document: Dict[str, Any], media_type: str) -> bytes:
+    if media_type == GRAPH_MSGPACK:
+        return msgpack.packb(document, use_bin_type=True)
+    return json.dumps(document, separators=(",", ":")).encode()
+
+
+def _number(value: float):
+    return int(value) if float(value).is_integer() else value
+
+
+class GraphColumns:
+    """Collects node and edge rows into the columnar document"""
+
+    def __init__(self, header: Dict[str, Any]):
+        self.header = header
+        self.strings = {table: {} for table in STRING_TABLES}
+        self.nodes = {column: [] for column in NODE_COLUMNS}
+        self.edges = []
+        self.rows = {}
+
+    def code(self, table: str, value) -> int:
+        if value is None:
+            return -1
+        codes = self.strings[table]
+        return codes.setdefault(value, len(codes))
+
+    def add_node(self, node_id: str, node_type: str, details, x, y, level, layer, lane) -> None:
+        """A node row, as (node_id, type, details, x, y, level, layer, lane)"""
+        details = details or {}
+        nodes, code = self.nodes, self.code
+        self.rows[node_id] = len(self.rows)
+        nodes["type"].append(code("node_type", node_type))
+        if node_type == "commit":
+            commit_values = (details.get("message"), code("author", details.get("author")),
+                             details.get("timestamp"), code("sha", details.get("parent_sha")))
+            nodes["sha"].append(code("sha", details.get("sha")))
+            file_values = (None,) * 5
+        else:
+            sha = details.get("commit_sha")
+            commit_values = (None,) * 4
+            nodes["sha"].append(code("sha", sha))
+            file_values = (code("file_id", node_id[len("file_"):-len(sha) - 1]), code("path", details.get("file_path")),
+                           code("change_type", details.get("change_type")), details.get("additions"),
+                           details.get("deletions"))
+        for column, value in zip(("message", "author", "timestamp", "parent"), commit_values):
+            nodes[column].append(value)
+        for column, value in zip(("file_id", "path", "change_type", "additions", "deletions"), file_values):
+            nodes[column].append(value)
+        for column, value in (("x", _number(x)), ("y", _number(y)), ("level", level), ("layer", layer),
+                              ("lane", lane)):
+            nodes[column].append(value)
+
+    def add_nodes(self, rows: Iterable) -> None:
+        for row in rows:
+            self.add_node(*row)
+
+    def add_edges(self, rows: Iterable) -> None:
+        """
+        Edge rows, as (source, target, type, details), details as JSON text
+
+        Edge metadata repeats a few distinct values, so it is dictionary
+        encoded as read and only the distinct values are parsed. Ends are
+        resolved once all nodes are in.
+        """
+        self.edges.extend(rows)
+
+    def document(self, **extra) -> Dict[str, Any]:
+        external = {}
+
+        def end(node_id):
+            if node_id in self.rows:
+                return self.rows[node_id]
+            return -external.setdefault(node_id, len(external)) - 1
+
+        edges = {column: [] for column in EDGE_COLUMNS}
+        for source, target, edge_type, details in self.edges:
+            edges["source"].append(end(source))
+            edges["target"].append(end(target))
+            edges["type"].append(self.code("edge_type", edge_type))
+            edges["metadata"].append(self.code("edge_metadata", details))
+        edges["external"] = list(external)
+
+        strings = {table: list(codes) for table, codes in self.strings.items()}
+        strings["edge_metadata"] = [
+            None if metadata is None else json.loads(metadata) for metadata in strings["edge_metadata"]
+        ]
+        return {"graph": self.header, "strings": strings, "nodes": self.nodes, "edges": edges, **extra}
+
+
+# Details as their JSON text: see GraphColumns.add_edges
+_EDGE_COLUMNS = (
+    CommitGraphEdge.source, CommitGraphEdge.target, CommitGraphEdge.type, cast(CommitGraphEdge.details, Text),
+)
+
+
+async def stored_graph_columns(db: AsyncSession, graph: CommitGraph) -> Dict[str, Any]:
+    """A stored graph as a columnar document, read a batch of rows at a time"""
+    columns = GraphColumns(graph_header(graph))
+    async for batch in stream_rows(db, graph, CommitGraphNode.node_id, CommitGraphNode.type, CommitGraphNode.details,
+                                   CommitGraphNode.x, CommitGraphNode.y, CommitGraphNode.level,
+                                   CommitGraphNode.layer, CommitGraphNode.lane, model=CommitGraphNode):
+        columns.add_nodes(batch)
+    async for batch in stream_rows(db, graph, *_EDGE_COLUMNS, model=CommitGraphEdge):
+        columns.add_edges(batch)
+    return columns.document()
+
+
+async def window_columns(db: AsyncSession, graph: CommitGraph, limit: int, **bounds) -> Dict[str, Any]:
+    """
+    A graph window (see ``commit_graph_service.window_rows``) as a columnar document
+    
+    The window's nodes come first; ``boundary`` holds the rows of the outer
+    ends of edges leaving it.
+    """
+    nodes, edges, boundary, truncated = await window_rows(db, graph, limit, **bounds)
+    columns = GraphColumns(graph_header(graph))
+    # Node rows without their label
+    columns.add_nodes(node[:2] + node[3:] for node in (*nodes, *boundary))
+    columns.add_edges(
+        (source, target, edge_type, None if details is None else json.dumps(details))
+        for source, target, edge_type, details in edges
+    )
+    return columns.document(truncated=truncated, boundary=list(range(len(nodes), len(nodes) + len(boundary))))
+
+
+def graph_from_columns(document: Dict[str, Any]) -> Dict[str, Any]:
+    """The nodes, edges and layout of a columnar document, in the default JSON shape"""
+    strings, columns = document["strings"], document["nodes"]
+
+    def lookup(table, code):
+        return None if code is None or code < 0 else strings[table][code]
+
+    nodes, layout, ids = [], {}, []
+    for row in range(len(columns["type"])):
+        value = {column: columns[column][row] for column in NODE_COLUMNS}
+        sha = lookup("sha", value["sha"])
+        if lookup("node_type", value["type"]) == "commit":
+            node_id = f"commit_{sha}"
+            node = {"id": node_id, "type": "commit", "label": commit_label(sha, value["message"]), "metadata": {
+                "sha": sha, "message": value["message"], "author": lookup("author", value["author"]),
+                "timestamp": value["timestamp"], "parent_sha": lookup("sha", value["parent"]),
+            }}
+        else:
+            path, change_type = lookup("path", value["path"]), lookup("change_type", value["change_type"])
+            node_id = f"file_{lookup('file_id', value['file_id'])}_{sha}"
+            node = {"id": node_id, "type": "file", "label": file_label(path, change_type), "metadata": {
+                "file_path": path, "change_type": change_type, "additions": value["additions"],
+                "deletions": value["deletions"], "commit_sha": sha,
+            }}
+        node["position"] = None
+        nodes.append(node)
+        ids.append(node_id)
+        layout[node_id] = {column: value[column] for column in ("x", "y", "level", "layer", "lane")}
+
+    edges = document["edges"]
+
+    def end(index):
+        return ids[index] if index >= 0 else edges["external"][-index - 1]
+
+    return {
+        "nodes": nodes,
+        "edges": [
+            {"source": end(source), "target": end(target), "type": strings["edge_type"][edge_type],
+             "metadata": strings["edge_metadata"][metadata]}
+            for source, target, edge_type, metadata in zip(
+                edges["source"], edges["target"], edges["type"], edges["metadata"])
+        ],
+        "layout": layout,
+    }
@@ -0,0 +1,186 @@
+"""Layered layout of commit graphs.
+
+Commits sit on layers by their depth along parent edges: a root (a commit
+whose parent is not in the graph) is on layer 0 and every other commit one
+layer below its parent, so commit edges always point down. Of a commit's
+children, the one with the deepest history continues the commit's lane; the
+others start branches, each in a lane of its own that is reused once the
+branch in it has ended. Lanes are then reordered by barycenter sweeps that
+pull forked branches next to the branch they forked from, which shortens
+fork edges and removes the crossings a first-come lane order leaves behind.
+
+Files are listed below and to the right of their commit, and each layer is as
+tall as the longest file list on it, so nodes never overlap.
+
+The work is a few NumPy passes over the commits (pointer jumping for depths,
+histories and branches, bincount for barycenters); only lane assignment loops
+in Python, once per branch. ``benchmarks/bench_graph_layout.py`` times it.
+"""
+from dataclasses import dataclass
+from typing import Sequence, Tuple
+
+import numpy as np
+
+LANE_X_SPACING = 600
+COMMIT_Y_SPACING = 200
+FILE_X_OFFSET = 300
+FILE_Y_SPACING = 50
+
+# Barycenter sweeps over the lanes, alternating towards parents and children
+CROSSING_SWEEPS = 4
+
+
+@dataclass
+class GraphLayout:
+    """Per-commit layer, lane and position, in the order the commits were given"""
+    layer: np.ndarray
+    lane: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    layer_count: int
+    lane_count: int
+    height: float  # Top of the next layer
+
+
+def layer_height(file_count):
+    """Height of a layer holding a commit with ``file_count`` files"""
+    return np.maximum(COMMIT_Y_SPACING, (np.asarray(file_count) + 1) * FILE_Y_SPACING)
+
+
+def file_position(x: float, y: float, index: int) -> Tuple[float, float]:
+    """Position of the ``index``-th file of a commit at (x, y)"""
+    return x + FILE_X_OFFSET, y + index * FILE_Y_SPACING
+
+
+def _depths(parents: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Distance of each commit from its root, and the parents it was measured on
+
+    Commits on or below a parent cycle (git cannot produce one, but commit
+    rows can) are made roots.
+    """
+    index = np.arange(len(parents))
+    ancestor = np.where(parents >= 0, parents, index)
+    depth = (parents >= 0).astype(np.int64)
+    for _ in range(len(parents).bit_length() + 1):
+        if not (parents[ancestor] >= 0).any():
+            return depth, parents
+        depth += depth[ancestor]
+        ancestor = ancestor[ancestor]
+    return _depths(np.where(parents[ancestor] >= 0, -1, parents))
+
+
+def _reach(parents: np.ndarray, depth: np.ndarray) -> np.ndarray:
+    """Depth of the deepest descendant of each commit (itself included)"""
+    reach = depth.copy()
+    up = parents.copy()
+    # Doubling: after k rounds each commit has seen its descendants less than 2**k below it
+    while (has_up := up >= 0).any():
+        np.maximum.at(reach, up[has_up], reach[has_up])
+        up = np.where(has_up, up[np.maximum(up, 0)], -1)
+    return reach
+
+
+def _branches(parents: np.ndarray, reach: np.ndarray) -> np.ndarray:
+    """The first commit of each commit's branch"""
+    index = np.arange(len(parents))
+    children = np.flatnonzero(parents >= 0)
+    # The child with the deepest history (then the first given) continues its parent's branch
+    children = children[np.lexsort((children, -reach[children], parents[children]))]
+    first = np.ones(len(children), dtype=bool)
+    first[1:] = parents[children[1:]] != parents[children[:-1]]
+    heir = np.full(len(parents), -1)
+    heir[parents[children[first]]] = children[first]
+
+    starts = parents < 0
+    starts[children] = heir[parents[children]] != children
+    branch = np.where(starts, index, parents)
+    for _ in range(len(parents).bit_length() + 1):
+        hop = branch[branch]
+        if np.array_equal(hop, branch):
+            break
+        branch = hop
+    return branch
+
+
+def _assign_lanes(parents: np.ndarray, depth: np.ndarray, branch: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Lane of each branch (indexed by its first commit) and the number of lanes"""
+    heads = np.flatnonzero(branch == np.arange(len(branch)))
+    length = np.bincount(branch, minlength=len(branch))
+    lane = np.full(len(branch), -1)
+    lane_end = np.empty(len(heads), dtype=np.int64)  # Depth of the last commit in each lane
+    lanes = 0
+    for head in heads[np.lexsort((heads, depth[heads]))]:
+        start = depth[head]
+        free = np.flatnonzero(lane_end[:lanes] < start)
+        if not len(free):
+            chosen = lanes
+            lanes += 1
+        elif parents[head] >= 0:
+            # The free lane closest to the branch this one forks from
+            chosen = free[np.argmin(np.abs(free - lane[branch[parents[head]]]))]
+        else:
+            chosen = free[0]
+        lane[head] = chosen
+        lane_end[chosen] = start + length[head] - 1
+    return lane, lanes
+
+
+def _reduce_crossings(forks: Tuple[np.ndarray, np.ndarray], lanes: int) -> np.ndarray:
+    """
+    Position of each lane after barycenter sweeps over the fork edges
+
+    ``forks`` holds the lanes at both ends of every fork edge (parent lane,
+    child lane). A sweep moves every lane to the mean position of the lanes
+    it forks from (or, on alternate sweeps, into); it is kept when it
+    shortens the fork edges in total.
+    """
+    position = np.arange(lanes)
+    source, target = forks
+    if not len(source):
+        return position
+
+    def span(pos):
+        return np.abs(pos[source] - pos[target]).sum()
+
+    best = span(position)
+    for sweep in range(CROSSING_SWEEPS):
+        moving, anchor = (target, source) if sweep % 2 == 0 else (source, target)
+        count = np.bincount(moving, minlength=lanes)
+        total = np.bincount(moving, weights=position[anchor], minlength=lanes)
+        barycenter = np.where(count > 0, total / np.maximum(count, 1), position)
+        candidate = np.empty(lanes, dtype=np.int64)
+        candidate[np.lexsort((position, barycenter))] = np.arange(lanes)
+        cost = span(candidate)
+        if cost < best:
+            position, best = candidate, cost
+    return position
+
+
+def layered_layout(parents: Sequence[int], file_counts: Sequence[int]) -> GraphLayout:
+    """
+    Lay out commits given each one's parent (an index into the same list, or
+    -1 when the parent is not in the graph) and number of files
+    """
+    parents = np.asarray(parents, dtype=np.int64).reshape(-1)
+    parents = np.where((parents >= 0) & (parents < len(parents)), parents, -1)
+    if not len(parents):
+        empty = np.zeros(0, dtype=np.int64)
+        return GraphLayout(empty, empty, empty.astype(float), empty.astype(float), 0, 0, 0.0)
+
+    depth, parents = _depths(parents)
+    branch = _branches(parents, _reach(parents, depth))
+    branch_lane, lanes = _assign_lanes(parents, depth, branch)
+
+    forked = np.flatnonzero((branch == np.arange(len(branch))) & (parents >= 0))
+    position = _reduce_crossings((branch_lane[branch[parents[forked]]], branch_lane[forked]), lanes)
+    lane = position[branch_lane[branch]]
+
+    layer_count = int(depth.max()) + 1
+    heights = np.full(layer_count, COMMIT_Y_SPACING, dtype=float)
+    np.maximum.at(heights, depth, layer_height(file_counts).astype(float))
+    tops = np.concatenate(([0.0], np.cumsum(heights)[:-1]))
+    return GraphLayout(
+        layer=depth, lane=lane, x=lane * float(LANE_X_SPACING), y=tops[depth],
+        layer_count=layer_count, lane_count=lanes, height=float(heights.sum()),
+    )
@@ -0,0 +1,173 @@
+"""Per-route request, database and AI metrics in Prometheus format.
+
+``RequestMetricsMiddleware`` times every HTTP request and counts the bytes it
+received and sent. SQL statements (``instrument_engine``) and Gemini calls
+(``ai_call``) made while a request is in progress are added up on the
+request and reported under its route, so the numbers show which endpoints
+spend the database and AI time. Routes are labelled with their template
+(``/api/files/{file_id}``), never the raw path; requests that match no route
+share the ``unmatched`` label.
+
+State is per process, like ``database.PoolMetrics``: with several uvicorn
+workers each one reports its own counters. ``render`` produces the text that
+``/api/internal/metrics`` serves.
+"""
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+from metrics import Counter, Family, Gauge, Histogram, render_prometheus
+
+UNMATCHED_ROUTE = "unmatched"
+# SQL and AI work done outside a request (startup, scripts)
+NO_ROUTE = "none"
+
+REQUESTS = Family("http_requests_total", "HTTP requests by route and status", Counter, ("method", "route", "status"))
+REQUEST_SECONDS = Family(
+    "http_request_duration_seconds", "Time until the response body was sent", Histogram, ("method", "route"))
+IN_FLIGHT = Family("http_requests_in_flight", "Requests currently being handled", Gauge)
+REQUEST_BYTES = Family("http_request_bytes_total", "Request body bytes received", Counter, ("method", "route"))
+RESPONSE_BYTES = Family("http_response_bytes_total", "Response body bytes sent", Counter, ("method", "route"))
+DB_STATEMENTS = Family("db_statements_total", "SQL statements executed", Counter, ("route",))
+DB_SECONDS = Family("db_statement_seconds_total", "Time spent executing SQL statements", Counter, ("route",))
+AI_CALLS = Family("ai_calls_total", "Gemini calls by route and outcome", Counter, ("route", "operation", "outcome"))
+AI_SECONDS = Family("ai_call_duration_seconds", "Gemini call latency", Histogram, ("operation",),
+                    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0))
+
+FAMILIES = (
+    REQUESTS, REQUEST_SECONDS, IN_FLIGHT, REQUEST_BYTES, RESPONSE_BYTES,
+    DB_STATEMENTS, DB_SECONDS, AI_CALLS, AI_SECONDS,
+)
+
+
+@dataclass
+class _RequestStats:
+    db_statements: int = 0
+    db_seconds: float = 0.0
+    # (operation, outcome) -> calls
+    ai_calls: Dict[Tuple[str, str], int] = field(default_factory=dict)
+
+
+_current: ContextVar[Optional[_RequestStats]] = ContextVar("request_metrics", default=None)
+
+
+class _RouteTemplates:
+    """Route template for the endpoint the router picked, without re-matching every route"""
+
+    def __init__(self):
+        self._by_endpoint: Optional[Dict] = None
+
+    def lookup(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        if self._by_endpoint is None:
+            by_endpoint: Dict = {}
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is not None:
+                    by_endpoint.setdefault(route.endpoint, []).append(route)
+            self._by_endpoint = by_endpoint
+        routes = self._by_endpoint.get(endpoint, [])
+        if len(routes) == 1:
+            return routes[0].path
+        # The same function is registered under several paths
+        for route in routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return route.path
+        return UNMATCHED_ROUTE
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.routes = _RouteTemplates()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = _RequestStats()
+        token = _current.set(stats)
+        received = sent = 0
+        status_code = 500
+        start = time.perf_counter()
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal sent, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        IN_FLIGHT.labels().inc()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            IN_FLIGHT.labels().dec()
+            _current.reset(token)
+            method, route = scope["method"], self.routes.lookup(scope)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            REQUEST_SECONDS.labels(method, route).observe(time.perf_counter() - start)
+            REQUEST_BYTES.labels(method, route).inc(received)
+            RESPONSE_BYTES.labels(method, route).inc(sent)
+            if stats.db_statements:
+                DB_STATEMENTS.labels(route).inc(stats.db_statements)
+                DB_SECONDS.labels(route).inc(stats.db_seconds)
+            for (operation, outcome), count in stats.ai_calls.items():
+                AI_CALLS.labels(route, operation, outcome).inc(count)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started_at
+    stats = _current.get()
+    if stats is None:
+        DB_STATEMENTS.labels(NO_ROUTE).inc()
+        DB_SECONDS.labels(NO_ROUTE).inc(elapsed)
+    else:
+        stats.db_statements += 1
+        stats.db_seconds += elapsed
+
+
+def instrument_engine(engine) -> None:
+    """Count and time the statements a sync engine (or an async engine's ``sync_engine``) executes"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@asynccontextmanager
+async def ai_call(operation: str):
+    """Time one Gemini call; use around the request and, for streams, the iteration too"""
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        AI_SECONDS.labels(operation).observe(time.perf_counter() - start)
+        stats = _current.get()
+        if stats is None:
+            AI_CALLS.labels(NO_ROUTE, operation, outcome).inc()
+        else:
+            stats.ai_calls[(operation, outcome)] = stats.ai_calls.get((operation, outcome), 0) + 1
+
+
+def render() -> str:
+    return render_prometheus(FAMILIES)
@@ -0,0 +1,164 @@
+"""Local verification of Clerk session tokens.
+
+Clerk signs session tokens (RS256) with keys published as a JWKS. The keys
+are fetched once, kept in memory and refreshed in the background when they
+get old, so verifying a token is a signature check with no network call. A
+token signed with a key id we have not seen yet (key rotation) triggers one
+immediate refetch, rate limited by ``JWKS_MIN_REFRESH_SECONDS``.
+
+Configuration: ``CLERK_JWKS_URL`` and ``CLERK_ISSUER`` default to the
+Frontend API encoded in ``CLERK_PUBLISHABLE_KEY`` (or the frontend's
+``VITE_CLERK_PUBLISHABLE_KEY``), so usually only the publishable key is needed.
+"""
+import asyncio
+import base64
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+import jwt
+from dotenv import load_dotenv
+
+from config import env_float
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def frontend_api_from_publishable_key(publishable_key: Optional[str]) -> Optional[str]:
+    """``pk_test_<base64 "<host>$">`` -> ``https://<host>``"""
+    if not publishable_key:
+        return None
+    try:
+        encoded = publishable_key.split("_", 2)[2]
+        host = base64.b64decode(encoded + "=" * (-len(encoded) % 4)).decode().rstrip("$")
+    except (IndexError, ValueError, UnicodeDecodeError):
+        return None
+    return f"https://{host}" if host else None
+
+
+_FRONTEND_API = frontend_api_from_publishable_key(
+    os.getenv("CLERK_PUBLISHABLE_KEY") or os.getenv("VITE_CLERK_PUBLISHABLE_KEY")
+)
+CLERK_ISSUER = os.getenv("CLERK_ISSUER") or _FRONTEND_API
+CLERK_JWKS_URL = os.getenv("CLERK_JWKS_URL") or (f"{CLERK_ISSUER}/.well-known/jwks.json" if CLERK_ISSUER else None)
+# Clerk session tokens carry no aud by default; set this if you add one
+CLERK_AUDIENCE = os.getenv("CLERK_AUDIENCE") or None
+JWKS_REFRESH_SECONDS = env_float("JWKS_REFRESH_SECONDS", 600.0)
+JWKS_MIN_REFRESH_SECONDS = env_float("JWKS_MIN_REFRESH_SECONDS", 30.0)
+JWT_LEEWAY_SECONDS = env_float("JWT_LEEWAY_SECONDS", 5.0)
+
+ALGORITHMS = ["RS256"]
+
+
+class InvalidToken(Exception):
+    """The token is malformed, expired, or not signed by a known key"""
+
+
+class JWKSCache:
+    """Signing keys by key id, refreshed without blocking requests
+
+    ``fetch`` returns the JWKS document; it defaults to an HTTP GET of ``url``
+    and is replaceable so tests can serve keys from a local key pair.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str],
+        refresh_seconds: float = JWKS_REFRESH_SECONDS,
+        min_refresh_seconds: float = JWKS_MIN_REFRESH_SECONDS,
+        fetch: Optional[Callable[[], Awaitable[Dict[str, Any]]]] = None,
+    ):
+        self.url = url
+        self.refresh_seconds = refresh_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self._fetch = fetch or self._fetch_http
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._attempted_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self._background: Optional[asyncio.Task] = None
+
+    async def _fetch_http(self) -> Dict[str, Any]:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            response = await client.get(self.url)
+            response.raise_for_status()
+            return response.json()
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            self._attempted_at = time.monotonic()
+            document = await self._fetch()
+            keys = {}
+            for jwk in document.get("keys", []):
+                if jwk.get("use", "sig") != "sig" or "kid" not in jwk:
+                    continue
+                try:
+                    keys[jwk["kid"]] = jwt.PyJWK(jwk).key
+                except jwt.PyJWKError as e:
+                    logger.warning("Skipping unusable JWK %s: %s", jwk.get("kid"), e)
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+
+    async def _refresh_quietly(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning("JWKS refresh failed, keeping the cached keys: %s", e)
+
+    def _refresh_in_background(self) -> None:
+        if self._background is None or self._background.done():
+            self._background = asyncio.get_running_loop().create_task(self._refresh_quietly())
+
+    async def get_key(self, kid: str) -> Optional[Any]:
+        if not self._keys:
+            await self.refresh()
+        elif time.monotonic() - self._fetched_at > self.refresh_seconds:
+            # Serve the cached keys while newer ones are fetched
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and time.monotonic() - self._attempted_at >= self.min_refresh_seconds:
+            # Clerk rotated its signing key since the last fetch
+            await self._refresh_quietly()
+            key = self._keys.get(kid)
+        return key
+
+
+jwks_cache = JWKSCache(CLERK_JWKS_URL) if CLERK_JWKS_URL else None
+
+
+async def decode_session_token(token: str) -> Dict[str, Any]:
+    """Verified claims of a Clerk session token; raises InvalidToken"""
+    if jwks_cache is None:
+        raise InvalidToken("token verification is not configured (set CLERK_PUBLISHABLE_KEY or CLERK_JWKS_URL)")
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except jwt.PyJWTError as e:
+        raise InvalidToken(str(e))
+    if not kid:
+        raise InvalidToken("token has no key id")
+
+    try:
+        key = await jwks_cache.get_key(kid)
+    except Exception as e:
+        logger.error("Could not load signing keys from %s: %s", jwks_cache.url, e)
+        raise InvalidToken("signing keys unavailable")
+    if key is None:
+        raise InvalidToken("unknown signing key")
+
+    try:
+        return jwt.decode(
+            token,
+            key,
+            algorithms=ALGORITHMS,
+            issuer=CLERK_ISSUER,
+            audience=CLERK_AUDIENCE,
+            leeway=JWT_LEEWAY_SECONDS,
+            options={"require": ["exp", "sub"], "verify_aud": CLERK_AUDIENCE is not None},
+        )
+    except jwt.PyJWTError as e:
+        raise InvalidToken(str(e))
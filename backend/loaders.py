@@ -0,0 +1,88 @@
+"""Eager-loading options matching the nested response schemas.
+
+Async sessions cannot lazy-load relationships while a response is being
+serialized, so every query whose result is returned through a schema with
+nested objects must load those relationships up front.
+
+List endpoints leave large text columns (file content, diffs) unloaded unless
+the caller asks for them with ``?include=content``. Those columns are deferred
+with ``raiseload`` so a schema that touches one fails loudly instead of
+issuing a query per row.
+"""
+from typing import Optional, Set
+
+from sqlalchemy.orm import selectinload, load_only, defer
+
+from models import (
+    User, Repository, RepositoryCollaborator, RepositoryFile, MergeRequest, Comment,
+    FileVersion, MergeRequestVersion, Commit, CommitFile, AuditEntry
+)
+
+
+def parse_include(include: Optional[str]) -> Set[str]:
+    """Split a comma separated ?include= value into a set of field names"""
+    if not include:
+        return set()
+    return {field.strip() for field in include.split(",") if field.strip()}
+
+
+def repository_options():
+    return (
+        selectinload(Repository.owner),
+        selectinload(Repository.collaborators).selectinload(RepositoryCollaborator.user),
+    )
+
+
+def merge_request_options():
+    return (
+        selectinload(MergeRequest.author),
+        selectinload(MergeRequest.source_repo).options(*repository_options()),
+        selectinload(MergeRequest.target_repo).options(*repository_options()),
+    )
+
+
+def repository_file_options():
+    return (selectinload(RepositoryFile.author),)
+
+
+def repository_file_summary_options():
+    return (
+        load_only(
+            RepositoryFile.id, RepositoryFile.repository_id, RepositoryFile.name, RepositoryFile.path,
+            RepositoryFile.file_type, RepositoryFile.size, RepositoryFile.author_id,
+            RepositoryFile.created_at, RepositoryFile.updated_at,
+            raiseload=True,
+        ),
+        selectinload(RepositoryFile.author).load_only(User.id, User.username, raiseload=True),
+    )
+
+
+def comment_options():
+    return (selectinload(Comment.author),)
+
+
+def file_version_options():
+    return (selectinload(FileVersion.author),)
+
+
+def file_version_summary_options():
+    return (
+        defer(FileVersion.content, raiseload=True),
+        selectinload(FileVersion.author).load_only(User.id, User.username, raiseload=True),
+    )
+
+
+def merge_request_version_options():
+    return (selectinload(MergeRequestVersion.author),)
+
+
+def commit_options():
+    return (selectinload(Commit.author),)
+
+
+def commit_file_summary_options():
+    return (defer(CommitFile.diff_content, raiseload=True),)
+
+
+def audit_entry_options():
+    return (selectinload(AuditEntry.user),)
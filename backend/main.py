@@ -8,8 +8,12 @@ from dotenv import load_dotenv
 
 from database import get_db, engine
 from models import Base
-from routers import repositories, merge_requests, users, files, search, upload_file, webhooks, commit_graph, chatbot, dashboard, demo_seed, legal
+from routers import repositories, merge_requests, users, files, search, upload_file, webhooks, commit_graph, chatbot, dashboard, demo_seed, legal, internal, audit_trail
 from auth import verify_clerk_token
+from pagination import NEXT_CURSOR_HEADER
+from instrumentation import RequestMetricsMiddleware
+from audit import audit_writer
+from audit_stream import audit_broker
 
 load_dotenv()
 
@@ -43,8 +47,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Outermost, so latency and bytes cover everything below it
+app.add_middleware(RequestMetricsMiddleware)
+
 security = HTTPBearer()
 
 # Include routers
@@ -60,6 +68,20 @@ app.include_router(chatbot.router, prefix="/api", tags=["chatbot"])
 app.include_router(dashboard.router, prefix="/api/dashboard", tags=["dashboard"])
 app.include_router(demo_seed.router, prefix="/api/demo", tags=["demo"])
 app.include_router(legal.router, prefix="/api/legal", tags=["legal"])
+app.include_router(internal.router, prefix="/api/internal", tags=["internal"])
+app.include_router(audit_trail.router, prefix="/api/audit", tags=["audit"])
+
+@app.on_event("startup")
+async def start_audit_writer():
+    audit_writer.start()
+    audit_broker.start()
+
+
+@app.on_event("shutdown")
+async def stop_audit_writer():
+    await audit_writer.stop()
+    await audit_broker.stop()
+
 @app.get("/")
 async def root():
     return {"message": "OSINT Collaboration Platform API"}
@@ -0,0 +1,130 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Sequence
+
+# Default latency buckets (seconds), roughly log-spaced from 1ms to 10s
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram (cumulative buckets, Prometheus style)"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counts = list(self._counts)
+            total_sum = self._sum
+            total_count = self._count
+        cumulative: List[Dict] = []
+        running = 0
+        for bound, count in zip(list(self.buckets) + [float("inf")], counts):
+            running += count
+            cumulative.append({"le": "+Inf" if bound == float("inf") else bound, "count": running})
+        return {"buckets": cumulative, "sum": total_sum, "count": total_count}
+
+
+class Counter:
+    """Thread-safe monotonically increasing counter"""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Gauge:
+    """Thread-safe value that goes up and down"""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Family:
+    """A named Counter, Gauge or Histogram with one child per combination of label values"""
+
+    _TYPES = {Counter: "counter", Gauge: "gauge", Histogram: "histogram"}
+
+    def __init__(self, name: str, documentation: str, kind=Counter, labelnames: Sequence[str] = (), **kwargs):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._kwargs = kwargs
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = kind(**kwargs)
+
+    def labels(self, *values: str):
+        key = tuple(values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self.kind(**self._kwargs))
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self._TYPES[self.kind]}"]
+        for values, child in sorted(self._children.items()):
+            if self.kind is Histogram:
+                snapshot = child.snapshot()
+                for bucket in snapshot["buckets"]:
+                    le = _labels(self.labelnames, values, f'le="{bucket["le"]}"')
+                    lines.append(f"{self.name}_bucket{le} {bucket['count']}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {snapshot['sum']}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {snapshot['count']}")
+            else:
+                lines.append(f"{self.name}{_labels(self.labelnames, values)} {child.value}")
+        return lines
+
+
+def render_prometheus(families: Sequence[Family]) -> str:
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines: List[str] = []
+    for family in families:
+        lines.extend(family.render())
+    return "\n".join(lines) + "\n"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Float, JSON
+from sqlalchemy import BigInteger, Column, Date, Integer, String, Text, Boolean, DateTime, ForeignKey, Float, JSON, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -9,6 +9,9 @@ Base = declarative_base()
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     clerk_id = Column(String, unique=True, nullable=False)
@@ -27,6 +30,9 @@ class User(Base):
 
 class Repository(Base):
     __tablename__ = "repositories"
+    __table_args__ = (
+        Index("ix_repositories_created_at_id", "created_at", "id"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     name = Column(String, nullable=False)
@@ -35,6 +41,8 @@ class Repository(Base):
     is_private = Column(Boolean, default=False)
     fork_count = Column(Integer, default=0)
     forked_from_id = Column(String, ForeignKey("repositories.id"))
+    # Last commit written by the git importer; the next import continues after it (see git_import.py)
+    git_import_head = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -48,6 +56,9 @@ class Repository(Base):
 
 class RepositoryCollaborator(Base):
     __tablename__ = "repository_collaborators"
+    __table_args__ = (
+        UniqueConstraint("repository_id", "user_id", name="uq_repository_collaborators_repository_id_user_id"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     repository_id = Column(String, ForeignKey("repositories.id"), nullable=False)
@@ -61,6 +72,9 @@ class RepositoryCollaborator(Base):
 
 class RepositoryFile(Base):
     __tablename__ = "repository_files"
+    __table_args__ = (
+        UniqueConstraint("repository_id", "path", name="uq_repository_files_repository_id_path"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     repository_id = Column(String, ForeignKey("repositories.id"), nullable=False)
@@ -81,6 +95,10 @@ class RepositoryFile(Base):
 
 class MergeRequest(Base):
     __tablename__ = "merge_requests"
+    __table_args__ = (
+        Index("ix_merge_requests_status_created_at", "status", "created_at"),
+        Index("ix_merge_requests_created_at_id", "created_at", "id"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     title = Column(String, nullable=False)
@@ -150,20 +168,50 @@ class Comment(Base):
 
 class AuditEntry(Base):
     __tablename__ = "audit_entries"
+    __table_args__ = (
+        Index("ix_audit_entries_repository_id_created_at_id", "repository_id", "created_at", "id"),
+        Index("ix_audit_entries_created_at", "created_at"),
+        Index("ix_audit_entries_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_audit_entries_chain_seq", "chain_seq"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     action = Column(String, nullable=False)
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     repository_id = Column(String, ForeignKey("repositories.id"))
     details = Column(JSON)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Partition key on PostgreSQL, where the primary key is (id, created_at); see audit_partitions.py
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Tamper evidence, set by the audit writer; see audit_chain.py. NULL for entries older than the chain.
+    chain_seq = Column(BigInteger)
+    prev_hash = Column(String(64))
+    hash = Column(String(64))
     
     # Relationships
     user = relationship("User")
     repository = relationship("Repository")
 
+class AuditChainHead(Base):
+    """The last link of the audit hash chain (a single row)"""
+    __tablename__ = "audit_chain_head"
+
+    id = Column(Integer, primary_key=True)
+    seq = Column(BigInteger, nullable=False)
+    hash = Column(String(64), nullable=False)
+
+class AuditChainCheckpoint(Base):
+    """A chain position up to which verification succeeded"""
+    __tablename__ = "audit_chain_checkpoints"
+
+    seq = Column(BigInteger, primary_key=True)
+    hash = Column(String(64), nullable=False)
+    verified_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class FileVersion(Base):
     __tablename__ = "file_versions"
+    __table_args__ = (
+        UniqueConstraint("file_id", "version_number", name="uq_file_versions_file_id_version_number"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     file_id = Column(String, ForeignKey("repository_files.id"), nullable=False)
@@ -179,6 +227,9 @@ class FileVersion(Base):
 
 class MergeRequestVersion(Base):
     __tablename__ = "merge_request_versions"
+    __table_args__ = (
+        UniqueConstraint("merge_request_id", "version_number", name="uq_merge_request_versions_merge_request_id_version_number"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     merge_request_id = Column(String, ForeignKey("merge_requests.id"), nullable=False)
@@ -199,6 +250,9 @@ class MergeRequestVersion(Base):
 
 class Commit(Base):
     __tablename__ = "commits"
+    __table_args__ = (
+        Index("ix_commits_repository_id_timestamp_id", "repository_id", "timestamp", "id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     repository_id = Column(String, ForeignKey("repositories.id"), nullable=False)
@@ -216,6 +270,9 @@ class Commit(Base):
 
 class CommitFile(Base):
     __tablename__ = "commit_files"
+    __table_args__ = (
+        Index("ix_commit_files_commit_id", "commit_id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     commit_id = Column(String, ForeignKey("commits.id"), nullable=False)
@@ -233,15 +290,99 @@ class CommitFile(Base):
     previous_file = relationship("RepositoryFile", foreign_keys=[previous_file_id])
 
 class CommitGraph(Base):
+    """A repository's commit graph; its nodes and edges are rows of their own (see commit_graph_service.py)"""
     __tablename__ = "commit_graphs"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     repository_id = Column(String, ForeignKey("repositories.id"), nullable=False)
-    graph_data = Column(JSON, nullable=False)  # Serialized graph structure
     node_count = Column(Integer, default=0)
     edge_count = Column(Integer, default=0)
+    commit_count = Column(Integer, nullable=False, default=0)
+    # Newest commit in the graph, in (timestamp, id) order; later commits are appended after it
+    head_timestamp = Column(DateTime(timezone=True))
+    head_commit_id = Column(String)
+    # Bumped whenever nodes or edges change
+    version = Column(Integer, nullable=False, default=0)
+    # Extent of the layout (graph_layout.py); appended commits go on new layers below it
+    layer_count = Column(Integer, nullable=False, default=0)
+    lane_count = Column(Integer, nullable=False, default=0)
+    layout_height = Column(Float, nullable=False, default=0.0)
     last_updated = Column(DateTime(timezone=True), server_default=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
-    repository = relationship("Repository")
\ No newline at end of file
+    repository = relationship("Repository")
+
+class CommitGraphNode(Base):
+    __tablename__ = "commit_graph_nodes"
+    __table_args__ = (
+        # Latest node of a file path, to link the next version of the file to it
+        Index("ix_commit_graph_nodes_graph_id_file_path_seq", "graph_id", "file_path", "seq"),
+        # Lane of a parent commit, when appending its children
+        Index("ix_commit_graph_nodes_graph_id_node_id", "graph_id", "node_id"),
+        # Windows of a graph by layer range, layout box and commit (see graph_window)
+        Index("ix_commit_graph_nodes_graph_id_layer", "graph_id", "layer"),
+        Index("ix_commit_graph_nodes_graph_id_y_x", "graph_id", "y", "x"),
+        Index("ix_commit_graph_nodes_graph_id_commit_sha", "graph_id", "commit_sha"),
+    )
+
+    graph_id = Column(String, ForeignKey("commit_graphs.id"), primary_key=True)
+    seq = Column(Integer, primary_key=True)  # Insertion order within the graph
+    node_id = Column(String, nullable=False)
+    type = Column(String, nullable=False)  # "commit" or "file"
+    label = Column(String, nullable=False)
+    details = Column(JSON)  # The node's metadata
+    commit_sha = Column(String, nullable=False)
+    file_path = Column(String)
+    x = Column(Float, nullable=False)
+    y = Column(Float, nullable=False)
+    level = Column(Integer, nullable=False)
+    # Layer and lane of the node's commit
+    layer = Column(Integer, nullable=False)
+    lane = Column(Integer, nullable=False)
+
+class CommitGraphEdge(Base):
+    __tablename__ = "commit_graph_edges"
+    __table_args__ = (
+        # Whether a commit already has children, when appending commits
+        Index("ix_commit_graph_edges_graph_id_source", "graph_id", "source"),
+        # Edges into a window's nodes
+        Index("ix_commit_graph_edges_graph_id_target", "graph_id", "target"),
+    )
+
+    graph_id = Column(String, ForeignKey("commit_graphs.id"), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    source = Column(String, nullable=False)
+    target = Column(String, nullable=False)
+    type = Column(String, nullable=False)  # "commit_parent", "commit_to_file" or "file_evolution"
+    details = Column(JSON)
+
+
+# Daily dashboard rollups, kept up to date by the audit writer; see rollups.py
+
+class DailyRepositoryStats(Base):
+    __tablename__ = "daily_repository_stats"
+
+    day = Column(Date, primary_key=True)
+    repositories_created = Column(Integer, nullable=False, default=0)
+
+class DailyRepositoryActivity(Base):
+    """One row per repository with audited activity on a day"""
+    __tablename__ = "daily_repository_activity"
+
+    day = Column(Date, primary_key=True)
+    repository_id = Column(String, primary_key=True)
+    events = Column(Integer, nullable=False, default=0)
+    uploads = Column(Integer, nullable=False, default=0)
+
+class DailyAuthorMergeRequestStats(Base):
+    """Merge requests opened, merged and closed per author and day"""
+    __tablename__ = "daily_author_merge_request_stats"
+
+    day = Column(Date, primary_key=True)
+    author_id = Column(String, primary_key=True)
+    opened = Column(Integer, nullable=False, default=0)
+    merged = Column(Integer, nullable=False, default=0)
+    closed = Column(Integer, nullable=False, default=0)
+    # Sum over merged and closed requests of days from opening; divide by merged + closed for the mean
+    cycle_days_total = Column(Float, nullable=False, default=0.0)
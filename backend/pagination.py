@@ -0,0 +1,126 @@
+"""Opaque cursor (keyset) pagination for list endpoints.
+
+A page is requested with ``?cursor=<token>&limit=N``; the token for the next
+page is returned in the ``X-Next-Cursor`` response header and is absent on the
+last page. Each cursor encodes the sort key and id of the last row served, so
+the next page is a range scan on a (sort key, id) index instead of an OFFSET,
+and rows inserted meanwhile do not shift later pages. ``skip`` still works for
+existing clients but degrades with depth.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import DateTime, and_, literal, or_, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# SQLite keeps timestamps as text: server defaults (CURRENT_TIMESTAMP) without
+# fractional seconds, values bound by SQLAlchemy with six digits of them.
+_SQLITE_SECONDS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def encode_cursor(sort_value: Any, row_id: str) -> str:
+    if isinstance(sort_value, datetime):
+        payload = {"t": sort_value.isoformat(), "id": row_id}
+    else:
+        payload = {"v": sort_value, "id": row_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid pagination cursor"
+    )
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if "t" in payload:
+            return datetime.fromisoformat(payload["t"]), payload["id"]
+        return payload["v"], payload["id"]
+    except (ValueError, KeyError, TypeError):
+        raise _invalid_cursor()
+
+
+def _sqlite_datetime_bounds(value: datetime, descending: bool):
+    """Text bound and equal forms for ``value`` that work for either SQLite storage format
+
+    Comparing the raw column (rather than a normalizing function of it) keeps
+    the composite index usable.
+    """
+    seconds = value.strftime(_SQLITE_SECONDS_FORMAT)
+    with_fraction = f"{seconds}.{value.microsecond:06d}"
+    if value.microsecond:
+        return with_fraction, [with_fraction]
+    # "S" < "S.000000" as text: both are the same instant
+    return (seconds if descending else with_fraction), [seconds, with_fraction]
+
+
+def _after_cursor(sort_column, id_column, sort_value, row_id: str, dialect_name: str, descending: bool):
+    if dialect_name == "postgresql":
+        # Row-value comparison lets the planner use the composite index directly
+        key = tuple_(sort_column, id_column)
+        bound = tuple_(literal(sort_value, type_=sort_column.type), literal(row_id))
+        return key < bound if descending else key > bound
+
+    if dialect_name == "sqlite" and isinstance(sort_column.type, DateTime):
+        bound, equal_values = _sqlite_datetime_bounds(sort_value, descending)
+        same_key = sort_column.in_([literal(v) for v in equal_values])
+        edge = literal(max(equal_values) if descending else min(equal_values))
+    else:
+        bound = edge = literal(sort_value, type_=sort_column.type)
+        same_key = sort_column == bound
+    beyond = sort_column < bound if descending else sort_column > bound
+    tie = id_column < row_id if descending else id_column > row_id
+    # The redundant range term gives the planner an index seek instead of a walk
+    within = sort_column <= edge if descending else sort_column >= edge
+    return and_(within, or_(beyond, and_(same_key, tie)))
+
+
+def keyset_paginate(
+    query,
+    sort_column,
+    id_column,
+    *,
+    cursor: Optional[str],
+    limit: int,
+    skip: int = 0,
+    dialect_name: str,
+    descending: bool = True,
+):
+    """Order ``query`` by (sort_column, id_column) and restrict it to the page after ``cursor``
+
+    Fetches ``limit + 1`` rows; pass the result to ``finish_page`` to trim the
+    extra row and emit the next cursor.
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        # A cursor minted for another list (or hand-edited) must not reach the SQL
+        if isinstance(sort_column.type, DateTime) != isinstance(sort_value, datetime) or not isinstance(row_id, str):
+            raise _invalid_cursor()
+        query = query.where(_after_cursor(sort_column, id_column, sort_value, row_id, dialect_name, descending))
+    elif skip:
+        query = query.offset(skip)
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    return query.limit(limit + 1)
+
+
+def finish_page(rows: Sequence, limit: int, response: Response, sort_attr: str) -> List:
+    """Trim the look-ahead row and set ``X-Next-Cursor`` when another page exists"""
+    rows = list(rows)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, sort_attr), last.id)
+    return rows
@@ -1,5 +1,5 @@
 from typing import Dict, List, Any, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from models import Repository as RepositoryModel, RepositoryFile, Commit, User, RepositoryCollaborator
 import json
 
@@ -14,22 +14,30 @@ class RepositoryAnalysisService:
         """Get comprehensive repository data for chatbot analysis"""
         try:
             # Get repository
-            repo = self.db.query(RepositoryModel).filter(RepositoryModel.id == repository_id).first()
+            repo = self.db.query(RepositoryModel).options(
+                selectinload(RepositoryModel.owner)
+            ).filter(RepositoryModel.id == repository_id).first()
             if not repo:
                 return {}
             
             # Get files with full content
-            files = self.db.query(RepositoryFile).filter(
+            files = self.db.query(RepositoryFile).options(
+                selectinload(RepositoryFile.author)
+            ).filter(
                 RepositoryFile.repository_id == repository_id
             ).all()
             
             # Get commits
-            commits = self.db.query(Commit).filter(
+            commits = self.db.query(Commit).options(
+                selectinload(Commit.author)
+            ).filter(
                 Commit.repository_id == repository_id
             ).order_by(Commit.timestamp.desc()).limit(50).all()
             
             # Get collaborators
-            collaborators = self.db.query(RepositoryCollaborator).filter(
+            collaborators = self.db.query(RepositoryCollaborator).options(
+                selectinload(RepositoryCollaborator.user)
+            ).filter(
                 RepositoryCollaborator.repository_id == repository_id
             ).all()
             
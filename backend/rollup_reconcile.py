@@ -0,0 +1,39 @@
+"""Rebuild the dashboard rollups from the source tables (see rollups.py).
+
+Usage (from backend/):
+    python rollup_reconcile.py                                  # yesterday and today
+    python rollup_reconcile.py --from 2026-01-01 --to 2026-10-19
+
+Run it after writes that bypass the audit path (imports, seed scripts,
+manual fixes), or nightly to correct drift. Each day is rebuilt and
+committed on its own.
+"""
+import argparse
+import sys
+from datetime import date, datetime, timedelta
+
+from database import engine
+from rollups import reconcile
+
+
+def _day(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main(argv=None) -> int:
+    today = datetime.utcnow().date()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="first", type=_day, default=today - timedelta(days=1), help="YYYY-MM-DD")
+    parser.add_argument("--to", dest="last", type=_day, default=today, help="YYYY-MM-DD")
+    args = parser.parse_args(argv)
+    if args.first > args.last:
+        parser.error("--from is after --to")
+
+    with engine.connect() as conn:
+        days = reconcile(conn, args.first, args.last)
+    print(f"Rebuilt {len(days)} days, {args.first} to {args.last}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
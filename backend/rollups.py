@@ -0,0 +1,231 @@
+"""Daily rollups behind /api/dashboard/stats.
+
+The dashboard reads per-day totals instead of scanning repositories,
+merge requests and the audit trail on every page load:
+
+- ``daily_repository_stats``: repositories created per day
+- ``daily_repository_activity``: audited events and uploads per repository and day
+- ``daily_author_merge_request_stats``: merge requests opened, merged and
+  closed per author and day, with their summed cycle time
+
+``apply_audit_rows`` folds a batch of audit rows into the rollups. The audit
+writer calls it in the transaction that inserts the batch, so the rollups
+move together with the audit trail. Writes that bypass the audit path (seed
+scripts, imports, manual fixes) are picked up by ``reconcile_day``, which
+recomputes a day from the source tables; ``rollup_reconcile.py`` runs it for
+a range of days.
+
+Days are UTC calendar days. Merged and closed requests count on the day they
+were merged or closed. When rebuilding, those days come from the version
+history: a version whose status is merged or closed while the version
+before it was not marks the transition, and the cycle time runs from the
+first version. ``transitions`` finds them with window functions.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import delete, func, insert, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+
+from models import (
+    AuditEntry, DailyAuthorMergeRequestStats, DailyRepositoryActivity, DailyRepositoryStats, MergeRequest,
+    MergeRequestVersion, Repository,
+)
+
+UPLOAD_ACTIONS = ("file_create", "file_upload")
+CLOSING_STATUSES = ("merged", "closed")
+
+
+def _day(moment: datetime) -> date:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+
+def _as_utc_naive(moment: datetime) -> datetime:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _cycle_days(opened: datetime, finished: datetime) -> float:
+    return max(0.0, (_as_utc_naive(finished) - _as_utc_naive(opened)).total_seconds() / 86400.0)
+
+
+def _closing_status(row: Dict):
+    """'merged' or 'closed' when the audited action merged or closed a merge request"""
+    details = row.get("details") or {}
+    if row["action"] == "merge_request_merged":
+        return "merged"
+    if row["action"] == "merge_request_closed":
+        return "closed"
+    if row["action"] in ("merge_request_update", "merge_request_restore_version") \
+            and details.get("status") in CLOSING_STATUSES \
+            and details.get("previous_status") not in CLOSING_STATUSES:
+        return details["status"]
+    return None
+
+
+def _increment(conn: Connection, model, keys: Tuple[str, ...], rows: List[Dict]) -> None:
+    """Add ``rows``' counters onto existing rollup rows, creating missing ones"""
+    if not rows:
+        return
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(model)
+    counters = [column for column in rows[0] if column not in keys]
+    conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: getattr(model, column) + getattr(statement.excluded, column) for column in counters},
+        ),
+        rows,
+    )
+
+
+def _write(conn: Connection, created: Dict, activity: Dict, authors: Dict) -> None:
+    _increment(conn, DailyRepositoryStats, ("day",),
+               [{"day": day, "repositories_created": count} for day, count in created.items()])
+    _increment(conn, DailyRepositoryActivity, ("day", "repository_id"),
+               [{"day": day, "repository_id": repo_id, **counts} for (day, repo_id), counts in activity.items()])
+    _increment(conn, DailyAuthorMergeRequestStats, ("day", "author_id"),
+               [{"day": day, "author_id": author_id, **counts} for (day, author_id), counts in authors.items()])
+
+
+def _author_counts() -> Dict:
+    return {"opened": 0, "merged": 0, "closed": 0, "cycle_days_total": 0.0}
+
+
+def apply_audit_rows(conn: Connection, rows: Iterable[Dict]) -> None:
+    """Fold audit rows (as written by ``audit.AuditWriter``) into the rollups"""
+    created = defaultdict(int)
+    activity = defaultdict(lambda: {"events": 0, "uploads": 0})
+    authors = defaultdict(_author_counts)
+    closing = []
+
+    for row in rows:
+        day = _day(row["created_at"])
+        if row.get("repository_id"):
+            counts = activity[(day, row["repository_id"])]
+            counts["events"] += 1
+            counts["uploads"] += row["action"] in UPLOAD_ACTIONS
+        if row["action"] in ("repository_create", "repository_fork"):
+            created[day] += 1
+        elif row["action"] == "merge_request_create":
+            authors[(day, row["user_id"])]["opened"] += 1
+        else:
+            status = _closing_status(row)
+            if status:
+                closing.append((row, day, status))
+
+    if closing:
+        # Credit the request's author (not whoever merged it), with its age as cycle time
+        ids = {(row.get("details") or {}).get("merge_request_id") for row, _, _ in closing}
+        requests = {
+            mr_id: (author_id, created_at)
+            for mr_id, author_id, created_at in conn.execute(
+                select(MergeRequest.id, MergeRequest.author_id, MergeRequest.created_at)
+                .where(MergeRequest.id.in_([mr_id for mr_id in ids if mr_id]))
+            )
+        }
+        for row, day, status in closing:
+            request = requests.get((row.get("details") or {}).get("merge_request_id"))
+            if request is None:
+                continue
+            author_id, opened_at = request
+            counts = authors[(day, author_id)]
+            counts[status] += 1
+            if opened_at is not None:
+                counts["cycle_days_total"] += _cycle_days(opened_at, row["created_at"])
+
+    _write(conn, created, activity, authors)
+
+
+def transitions(start: datetime, end: datetime):
+    """(author_id, status, opened_at, finished_at) of merge requests merged or closed in [start, end)"""
+    touched = select(MergeRequestVersion.merge_request_id).where(
+        MergeRequestVersion.created_at >= start, MergeRequestVersion.created_at < end
+    )
+    history = {"partition_by": MergeRequestVersion.merge_request_id, "order_by": MergeRequestVersion.version_number}
+    versions = (
+        select(
+            MergeRequestVersion.merge_request_id,
+            MergeRequestVersion.status,
+            MergeRequestVersion.created_at,
+            func.lag(MergeRequestVersion.status).over(**history).label("previous_status"),
+            func.first_value(MergeRequestVersion.created_at, type_=MergeRequestVersion.created_at.type).over(**history).label("opened_at"),
+        )
+        # Whole histories, but only of the requests that changed in the range
+        .where(MergeRequestVersion.merge_request_id.in_(touched))
+        .subquery()
+    )
+    return (
+        select(MergeRequest.author_id, versions.c.status, versions.c.opened_at, versions.c.created_at)
+        .join(MergeRequest, MergeRequest.id == versions.c.merge_request_id)
+        .where(
+            versions.c.status.in_(CLOSING_STATUSES),
+            or_(versions.c.previous_status.is_(None), versions.c.previous_status.not_in(CLOSING_STATUSES)),
+            versions.c.created_at >= start,
+            versions.c.created_at < end,
+        )
+    )
+
+
+def _bounds(day: date) -> Tuple[datetime, datetime]:
+    start = datetime(day.year, day.month, day.day)
+    return start, start + timedelta(days=1)
+
+
+def reconcile_day(conn: Connection, day: date) -> None:
+    """Recompute the rollups of ``day`` from the source tables; call inside a transaction"""
+    start, end = _bounds(day)
+    for model in (DailyRepositoryStats, DailyRepositoryActivity, DailyAuthorMergeRequestStats):
+        conn.execute(delete(model).where(model.day == day))
+
+    created = conn.execute(
+        select(func.count()).select_from(Repository).where(Repository.created_at >= start, Repository.created_at < end)
+    ).scalar()
+    if created:
+        conn.execute(insert(DailyRepositoryStats).values(day=day, repositories_created=created))
+
+    uploads = func.count().filter(AuditEntry.action.in_(UPLOAD_ACTIONS))
+    activity = conn.execute(
+        select(AuditEntry.repository_id, func.count(), uploads)
+        .where(AuditEntry.created_at >= start, AuditEntry.created_at < end, AuditEntry.repository_id.is_not(None))
+        .group_by(AuditEntry.repository_id)
+    ).all()
+    if activity:
+        conn.execute(insert(DailyRepositoryActivity), [
+            {"day": day, "repository_id": repo_id, "events": events, "uploads": uploaded}
+            for repo_id, events, uploaded in activity
+        ])
+
+    authors = defaultdict(_author_counts)
+    for author_id, opened in conn.execute(
+        select(MergeRequest.author_id, func.count())
+        .where(MergeRequest.created_at >= start, MergeRequest.created_at < end)
+        .group_by(MergeRequest.author_id)
+    ):
+        authors[author_id]["opened"] = opened
+    for author_id, status, opened_at, finished_at in conn.execute(transitions(start, end)):
+        counts = authors[author_id]
+        counts[status] += 1
+        if opened_at is not None:
+            counts["cycle_days_total"] += _cycle_days(opened_at, finished_at)
+    if authors:
+        conn.execute(insert(DailyAuthorMergeRequestStats), [
+            {"day": day, "author_id": author_id, **counts} for author_id, counts in authors.items()
+        ])
+
+
+def reconcile(conn: Connection, first: date, last: date) -> List[date]:
+    """Rebuild every day from ``first`` to ``last``, committing each one"""
+    days = []
+    day = first
+    while day <= last:
+        reconcile_day(conn, day)
+        conn.commit()
+        days.append(day)
+        day += timedelta(days=1)
+    return days
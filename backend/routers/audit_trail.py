@@ -0,0 +1,76 @@
+import asyncio
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from access_control import AccessControl, get_read_access
+from audit_chain import verify_chain
+from audit_query import AuditQuery, EXPORT_MEDIA_TYPES, audit_entry_dict, export_rows
+from auth import admin_required
+from database import engine, get_read_db
+from models import AuditEntry, User as UserModel
+from pagination import keyset_paginate, finish_page
+
+router = APIRouter()
+
+
+@router.get("")
+async def query_audit(
+    response: Response,
+    filters: AuditQuery = Depends(),
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    access: AccessControl = Depends(get_read_access),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Search the audit trail, newest first"""
+    query = keyset_paginate(
+        select(AuditEntry).where(*await filters.visible_criteria(access)),
+        AuditEntry.created_at, AuditEntry.id,
+        cursor=cursor, limit=limit, dialect_name=db.bind.dialect.name
+    )
+    entries = finish_page((await db.scalars(query)).all(), limit, response, "created_at")
+    return [audit_entry_dict(e) for e in entries]
+
+
+@router.get("/export")
+async def export_audit(
+    filters: AuditQuery = Depends(),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    access: AccessControl = Depends(get_read_access),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Stream every matching entry, oldest first, as CSV or NDJSON"""
+    criteria = await filters.visible_criteria(access)
+    filename = f"audit-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.{format}"
+    return StreamingResponse(
+        export_rows(db, criteria, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+def _verify_chain(full: bool, max_entries: int):
+    with engine.connect() as conn:
+        return verify_chain(conn, full=full, max_entries=max_entries)
+
+
+@router.post("/verify")
+async def verify_audit_chain(
+    full: bool = False,
+    max_entries: int = Query(1_000_000, ge=1, le=10_000_000),
+    current_user: UserModel = Depends(admin_required)
+):
+    """Verify the audit hash chain from the last checkpoint (admins only)
+
+    Stops after about ``max_entries`` entries with ``complete: false``; call
+    again to continue. Use ``audit_verify.py`` for large backlogs. Hashing
+    runs in a worker thread on its own connection, off the event loop.
+    """
+    result = await asyncio.to_thread(_verify_chain, full, max_entries)
+    return asdict(result)
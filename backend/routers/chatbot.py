@@ -1,71 +1,60 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any, List, Optional, AsyncGenerator
 import json
 import asyncio
 
-from database import get_db
-from models import Repository as RepositoryModel, User as UserModel, Commit, RepositoryFile
+from database import get_read_db
+from models import User as UserModel, Commit, RepositoryFile
 from auth import verify_clerk_token, contributor_required
+from access_control import AccessControl, get_optional_read_access
 from ai_service import EnhancedAIService
 from repository_analysis_service import RepositoryAnalysisService
 
 router = APIRouter()
 
-async def get_current_user_optional(
-    request: Request,
-    db: Session = Depends(get_db)
-) -> Optional[UserModel]:
-    """Get current user if authenticated, otherwise return None"""
-    try:
-        # Try to get the authorization header
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            return None
-        
-        token = auth_header.split(" ")[1]
-        
-        # Verify the JWT token with Clerk
-        import httpx
-        import os
-        from dotenv import load_dotenv
-        
-        load_dotenv()
-        CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY")
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.clerk.dev/v1/sessions/verify",
-                headers={
-                    "Authorization": f"Bearer {CLERK_SECRET_KEY}",
-                    "Content-Type": "application/json"
-                },
-                params={"token": token}
+async def _repository_context(
+    access: AccessControl,
+    repository_data: Dict[str, Any],
+    commits_data: List[Any],
+    files_data: List[Any]
+):
+    """Check access to the referenced repository and load its data server-side
+
+    Returns (repository_data, commits_data, files_data); the client-provided
+    values are only kept when no repository data can be loaded.
+    """
+    repo_id = repository_data.get("id")
+    if repo_id:
+        # Anonymous callers only get public repositories
+        if access.user is None and not await access.can_read(repo_id):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Authentication required to access this repository"
             )
-            
-            if response.status_code != 200:
-                return None
-            
-            session_data = response.json()
-            clerk_user_id = session_data.get("user_id")
-            
-            if not clerk_user_id:
-                return None
-            
-            # Get user from database
-            user = db.query(UserModel).filter(UserModel.clerk_id == clerk_user_id).first()
-            return user
-            
-    except Exception:
-        return None
+        await access.require_read(repo_id, detail="Insufficient permissions to access this repository")
+    
+    # Get comprehensive repository data if repository ID is provided
+    if repo_id:
+        comprehensive_data = await access.db.run_sync(
+            lambda session: RepositoryAnalysisService(session).get_comprehensive_repository_data(repo_id)
+        )
+        
+        # Use comprehensive data if available, otherwise fall back to provided data
+        if comprehensive_data:
+            repository_data = comprehensive_data.get("repository", repository_data)
+            commits_data = comprehensive_data.get("commits", commits_data)
+            files_data = comprehensive_data.get("files", files_data)
+
+    return repository_data, commits_data, files_data
 
 @router.post("/chatbot/query")
 async def query_repository_chatbot(
     query_data: Dict[str, Any],
     request: Request,
-    current_user: Optional[UserModel] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_optional_read_access),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Handle chatbot queries about repository content"""
     try:
@@ -80,47 +69,9 @@ async def query_repository_chatbot(
                 detail="Question is required"
             )
         
-        # Verify user has access to the repository (if authenticated)
-        repo_id = repository_data.get("id")
-        if repo_id and current_user:
-            repo = db.query(RepositoryModel).filter(RepositoryModel.id == repo_id).first()
-            if not repo:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Repository not found"
-                )
-            
-            # Check permissions for authenticated users
-            if repo.owner_id != current_user.id:
-                from models import RepositoryCollaborator
-                is_collaborator = db.query(RepositoryCollaborator).filter(
-                    RepositoryCollaborator.repository_id == repo_id,
-                    RepositoryCollaborator.user_id == current_user.id
-                ).first()
-                if not is_collaborator:
-                    raise HTTPException(
-                        status_code=status.HTTP_403_FORBIDDEN,
-                        detail="Insufficient permissions to access this repository"
-                    )
-        elif repo_id and not current_user:
-            # For unauthenticated users, only allow access to public repositories
-            repo = db.query(RepositoryModel).filter(RepositoryModel.id == repo_id).first()
-            if not repo or repo.is_private:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Authentication required to access this repository"
-                )
-        
-        # Get comprehensive repository data if repository ID is provided
-        if repo_id:
-            analysis_service = RepositoryAnalysisService(db)
-            comprehensive_data = analysis_service.get_comprehensive_repository_data(repo_id)
-            
-            # Use comprehensive data if available, otherwise fall back to provided data
-            if comprehensive_data:
-                repository_data = comprehensive_data.get("repository", repository_data)
-                commits_data = comprehensive_data.get("commits", commits_data)
-                files_data = comprehensive_data.get("files", files_data)
+        repository_data, commits_data, files_data = await _repository_context(
+            access, repository_data, commits_data, files_data
+        )
         
         # Initialize AI service
         ai_service = EnhancedAIService()
@@ -144,7 +95,7 @@ async def query_repository_chatbot(
 @router.post("/chatbot/query-simple")
 async def query_repository_chatbot_simple(
     query_data: Dict[str, Any],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Handle chatbot queries without authentication (for testing)"""
     try:
@@ -182,8 +133,8 @@ async def query_repository_chatbot_simple(
 async def query_repository_chatbot_stream(
     query_data: Dict[str, Any],
     request: Request,
-    current_user: Optional[UserModel] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_optional_read_access),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Handle chatbot queries with streaming response"""
     try:
@@ -198,6 +149,10 @@ async def query_repository_chatbot_stream(
                 detail="Question is required"
             )
         
+        repository_data, commits_data, files_data = await _repository_context(
+            access, repository_data, commits_data, files_data
+        )
+        
         # Initialize AI service
         ai_service = EnhancedAIService()
         
@@ -1,70 +1,73 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+import asyncio
 
-from database import get_db
-from models import Commit, CommitFile, CommitGraph, Repository as RepositoryModel, User as UserModel
-from schemas import Commit as CommitSchema, CommitFile as CommitFileSchema, CommitGraph as CommitGraphSchema, GraphData
-from auth import verify_clerk_token, contributor_required
-from commit_graph_service import CommitGraphService
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, Header
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Dict, Any, Union
+from datetime import datetime
+
+from database import SessionLocal, get_async_db, get_read_db
+from models import Commit, CommitFile, CommitGraph, CommitGraphEdge, CommitGraphNode, User as UserModel
+from schemas import Commit as CommitSchema, CommitFile as CommitFileSchema, CommitFileSummary, CommitGraph as CommitGraphSchema, GraphData
+from auth import contributor_required
+from access_control import AccessControl, get_access, get_read_access
+from commit_graph_service import CommitGraphService, graph_json_chunks, graph_window
+from git_import import GitImporter
+from graph_columns import GRAPH_COLUMNS_JSON, GRAPH_MSGPACK, encode, negotiate, stored_graph_columns, window_columns
 from audit import log_activity
+from loaders import commit_options, commit_file_summary_options, parse_include
+from pagination import keyset_paginate, finish_page
 
 router = APIRouter()
 
+# generate_commit_graph reads the graph with one joined query, so the cap only bounds the response size
+GRAPH_MAX_COMMITS = 5000
+# Nodes per graph window; a window is meant to cover a viewport
+GRAPH_WINDOW_MAX_NODES = 5000
+# Graph responses can also be columnar (see graph_columns.py), chosen by Accept
+GRAPH_RESPONSES = {200: {"content": {GRAPH_MSGPACK: {}, GRAPH_COLUMNS_JSON: {}}}}
+
+
+def _import_history(repository_id: str, repo_path: str, max_commits: Optional[int]) -> Dict[str, Any]:
+    # Runs in a worker thread with its own session: the import blocks on git and the database
+    with SessionLocal() as session:
+        return GitImporter(session).import_history(repository_id, repo_path, max_commits)
+
+
 @router.post("/repositories/{repository_id}/commits/import")
 async def import_commits_from_repo(
     repository_id: str,
     repo_path: str,
-    max_commits: int = Query(5, ge=1, le=20),
+    max_commits: Optional[int] = Query(None, ge=1, description="Stop after this many commits; the next import continues"),
     current_user: UserModel = Depends(contributor_required),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Import commits from a git repository path"""
-    
-    # Check if repository exists and user has access
-    repo = db.query(RepositoryModel).filter(RepositoryModel.id == repository_id).first()
-    if not repo:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Repository not found"
-        )
+    """Import the history of a git repository path, continuing from the last import"""
     
-    # Check permissions
-    if repo.owner_id != current_user.id:
-        from models import RepositoryCollaborator
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == repository_id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-        if not is_collaborator:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Insufficient permissions to import commits"
-            )
+    await access.require_write(repository_id, detail="Insufficient permissions to import commits")
     
     try:
-        graph_service = CommitGraphService(db)
-        commits = graph_service.add_commits_from_repo(repository_id, repo_path, max_commits)
-        
-        # Create file relationships
-        graph_service.create_file_relationships(repository_id)
+        summary = await asyncio.to_thread(_import_history, repository_id, repo_path, max_commits)
         
         # Audit log
-        log_activity(
+        await log_activity(
             db=db,
             action="commits_import",
             user_id=current_user.id,
             repository_id=repository_id,
             details={
                 "repo_path": repo_path,
-                "commits_imported": len(commits),
-                "max_commits": max_commits
+                "commits_imported": summary["commits_imported"],
+                "max_commits": max_commits,
+                "head_sha": summary["head_sha"]
             }
         )
         
         return {
-            "message": f"Successfully imported {len(commits)} commits",
-            "commits": [CommitSchema.from_orm(commit) for commit in commits]
+            "message": f"Successfully imported {summary['commits_imported']} commits",
+            **summary
         }
         
     except ValueError as e:
@@ -83,33 +86,32 @@ async def create_commit(
     repository_id: str,
     commit_data: dict,
     current_user: UserModel = Depends(contributor_required),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new commit manually"""
     
-    # Check if repository exists and user has access
-    repo = db.query(RepositoryModel).filter(RepositoryModel.id == repository_id).first()
-    if not repo:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Repository not found"
-        )
+    await access.require_write(repository_id, detail="Insufficient permissions to create commits")
     
     try:
+        timestamp = commit_data["timestamp"]
+        if isinstance(timestamp, str):
+            # asyncpg only binds datetime objects for timestamp columns
+            timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
         commit = Commit(
             repository_id=repository_id,
             sha=commit_data["sha"],
             message=commit_data["message"],
             author_id=current_user.id,
-            timestamp=commit_data["timestamp"],
+            timestamp=timestamp,
             parent_sha=commit_data.get("parent_sha")
         )
         db.add(commit)
-        db.commit()
-        db.refresh(commit)
+        await db.commit()
+        commit = await db.get(Commit, commit.id, options=commit_options(), populate_existing=True)
         
         # Audit log
-        log_activity(
+        await log_activity(
             db=db,
             action="commit_create",
             user_id=current_user.id,
@@ -131,37 +133,23 @@ async def create_commit(
 @router.get("/repositories/{repository_id}/commits", response_model=List[CommitSchema])
 async def list_commits(
     repository_id: str,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    access: AccessControl = Depends(get_read_access),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """List commits for a repository"""
     
-    # Check if repository exists and user has access
-    repo = db.query(RepositoryModel).filter(RepositoryModel.id == repository_id).first()
-    if not repo:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Repository not found"
-        )
+    await access.require_read(repository_id)
     
-    # Check access permissions for private repos
-    if repo.is_private and repo.owner_id != current_user.id:
-        from models import RepositoryCollaborator
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == repository_id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-        if not is_collaborator:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied to private repository"
-            )
-    
-    commits = db.query(Commit).filter(
-        Commit.repository_id == repository_id
-    ).order_by(Commit.timestamp.desc()).offset(skip).limit(limit).all()
+    query = keyset_paginate(
+        select(Commit).options(*commit_options()).where(Commit.repository_id == repository_id),
+        Commit.timestamp, Commit.id,
+        cursor=cursor, limit=limit, skip=skip, dialect_name=db.bind.dialect.name
+    )
+    commits = finish_page((await db.scalars(query)).all(), limit, response, "timestamp")
     
     return [CommitSchema.from_orm(commit) for commit in commits]
 
@@ -169,15 +157,19 @@ async def list_commits(
 async def get_commit(
     repository_id: str,
     commit_id: str,
-    current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_read_access),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get a specific commit"""
     
-    commit = db.query(Commit).filter(
-        Commit.id == commit_id,
-        Commit.repository_id == repository_id
-    ).first()
+    await access.require_read(repository_id)
+    
+    commit = await db.scalar(
+        select(Commit).options(*commit_options()).where(
+            Commit.id == commit_id,
+            Commit.repository_id == repository_id
+        ).limit(1)
+    )
     
     if not commit:
         raise HTTPException(
@@ -187,20 +179,23 @@ async def get_commit(
     
     return CommitSchema.from_orm(commit)
 
-@router.get("/repositories/{repository_id}/commits/{commit_id}/files", response_model=List[CommitFileSchema])
+@router.get("/repositories/{repository_id}/commits/{commit_id}/files", response_model=List[Union[CommitFileSchema, CommitFileSummary]])
 async def get_commit_files(
     repository_id: str,
     commit_id: str,
-    current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    include: Optional[str] = Query(None, description="Comma separated extra fields; 'content' returns diffs"),
+    access: AccessControl = Depends(get_read_access),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get files for a specific commit"""
+    """Get files for a specific commit (without diffs unless ?include=content)"""
+    
+    await access.require_read(repository_id)
     
     # Check if commit exists and belongs to repository
-    commit = db.query(Commit).filter(
+    commit = await db.scalar(select(Commit.id).where(
         Commit.id == commit_id,
         Commit.repository_id == repository_id
-    ).first()
+    ).limit(1))
     
     if not commit:
         raise HTTPException(
@@ -208,53 +203,62 @@ async def get_commit_files(
             detail="Commit not found"
         )
     
-    commit_files = db.query(CommitFile).filter(
-        CommitFile.commit_id == commit_id
-    ).all()
+    with_content = "content" in parse_include(include)
+    query = select(CommitFile).where(CommitFile.commit_id == commit_id)
+    if not with_content:
+        query = query.options(*commit_file_summary_options())
+    commit_files = (await db.scalars(query)).all()
     
-    return [CommitFileSchema.from_orm(cf) for cf in commit_files]
+    schema = CommitFileSchema if with_content else CommitFileSummary
+    return [schema.from_orm(cf) for cf in commit_files]
 
 @router.post("/repositories/{repository_id}/graph/generate")
 async def generate_commit_graph(
     repository_id: str,
-    max_commits: int = Query(10, ge=1, le=50),
+    max_commits: int = Query(10, ge=1, le=GRAPH_MAX_COMMITS),
+    rebuild: bool = Query(False, description="Rebuild the graph instead of appending new commits"),
     current_user: UserModel = Depends(contributor_required),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Generate commit graph for a repository"""
+    """Generate or update the commit graph for a repository
     
-    # Check if repository exists and user has access
-    repo = db.query(RepositoryModel).filter(RepositoryModel.id == repository_id).first()
-    if not repo:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Repository not found"
-        )
+    Appends the commits made since the last update; ``graph`` in the
+    response holds the nodes and edges added by this call.
+    """
     
+    await access.require_write(repository_id, detail="Insufficient permissions to generate commit graph")
+    
+    def _generate(session):
+        commit_graph, added = CommitGraphService(session).update_commit_graph(repository_id, max_commits, rebuild)
+        return added, commit_graph.id, commit_graph.node_count, commit_graph.edge_count, commit_graph.version
+
     try:
-        graph_service = CommitGraphService(db)
-        graph_data = graph_service.generate_commit_graph(repository_id, max_commits)
-        
-        # Save graph to database
-        commit_graph = graph_service.save_commit_graph(repository_id, graph_data)
+        added, graph_id, node_count, edge_count, version = await db.run_sync(_generate)
         
         # Audit log
-        log_activity(
+        await log_activity(
             db=db,
             action="commit_graph_generate",
             user_id=current_user.id,
             repository_id=repository_id,
             details={
                 "max_commits": max_commits,
-                "node_count": len(graph_data.get("nodes", [])),
-                "edge_count": len(graph_data.get("edges", []))
+                "rebuild": rebuild,
+                "nodes_added": len(added["nodes"]),
+                "edges_added": len(added["edges"]),
+                "node_count": node_count,
+                "edge_count": edge_count
             }
         )
         
         return {
             "message": "Commit graph generated successfully",
-            "graph": graph_data,
-            "graph_id": commit_graph.id
+            "graph": added,
+            "graph_id": graph_id,
+            "node_count": node_count,
+            "edge_count": edge_count,
+            "version": version
         }
         
     except Exception as e:
@@ -263,37 +267,64 @@ async def generate_commit_graph(
             detail=f"Failed to generate commit graph: {str(e)}"
         )
 
-@router.get("/repositories/{repository_id}/graph", response_model=CommitGraphSchema)
+@router.get(
+    "/repositories/{repository_id}/graph",
+    response_class=StreamingResponse,
+    responses={200: {"model": CommitGraphSchema, **GRAPH_RESPONSES[200]}},
+)
 async def get_commit_graph(
     repository_id: str,
-    current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    accept: Optional[str] = Header(None),
+    access: AccessControl = Depends(get_read_access),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get commit graph for a repository"""
+    """Get commit graph for a repository, streamed from its node and edge rows, or as columns"""
+    
+    await access.require_read(repository_id)
     
-    # Check if repository exists and user has access
-    repo = db.query(RepositoryModel).filter(RepositoryModel.id == repository_id).first()
-    if not repo:
+    commit_graph = await db.scalar(
+        select(CommitGraph).where(CommitGraph.repository_id == repository_id).limit(1)
+    )
+    
+    if not commit_graph:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Repository not found"
+            detail="Commit graph not found. Generate one first."
         )
     
-    # Check access permissions for private repos
-    if repo.is_private and repo.owner_id != current_user.id:
-        from models import RepositoryCollaborator
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == repository_id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-        if not is_collaborator:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied to private repository"
-            )
+    media_type = negotiate(accept)
+    if media_type:
+        document = await stored_graph_columns(db, commit_graph)
+        return Response(encode(document, media_type), media_type=media_type, headers={"Vary": "Accept"})
+    return StreamingResponse(graph_json_chunks(db, commit_graph), media_type="application/json",
+                             headers={"Vary": "Accept"})
+
+@router.get("/repositories/{repository_id}/graph/window", responses=GRAPH_RESPONSES)
+async def get_commit_graph_window(
+    repository_id: str,
+    response: Response,
+    first_layer: Optional[int] = Query(None, ge=0),
+    last_layer: Optional[int] = Query(None, ge=0),
+    from_sha: Optional[str] = Query(None, description="Start a commit range at this commit's layer"),
+    to_sha: Optional[str] = Query(None, description="End a commit range at this commit's layer"),
+    since: Optional[datetime] = Query(None, description="Commits made at or after this time"),
+    until: Optional[datetime] = Query(None, description="Commits made before this time"),
+    x_min: Optional[float] = None,
+    x_max: Optional[float] = None,
+    y_min: Optional[float] = None,
+    y_max: Optional[float] = None,
+    limit: int = Query(1000, ge=1, le=GRAPH_WINDOW_MAX_NODES),
+    accept: Optional[str] = Header(None),
+    access: AccessControl = Depends(get_read_access),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get the nodes of the commit graph inside a layer range, time range or layout box, with the edges touching them"""
     
-    graph_service = CommitGraphService(db)
-    commit_graph = graph_service.get_commit_graph(repository_id)
+    await access.require_read(repository_id)
+    
+    commit_graph = await db.scalar(
+        select(CommitGraph).where(CommitGraph.repository_id == repository_id).limit(1)
+    )
     
     if not commit_graph:
         raise HTTPException(
@@ -301,39 +332,55 @@ async def get_commit_graph(
             detail="Commit graph not found. Generate one first."
         )
     
-    return CommitGraphSchema.from_orm(commit_graph)
+    shas = [sha for sha in (from_sha, to_sha) if sha]
+    if shas:
+        layers = dict((await db.execute(
+            select(CommitGraphNode.commit_sha, CommitGraphNode.layer).where(
+                CommitGraphNode.graph_id == commit_graph.id,
+                CommitGraphNode.node_id.in_([f"commit_{sha}" for sha in shas])
+            )
+        )).all())
+        for sha in shas:
+            if sha not in layers:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Commit {sha} is not in the commit graph"
+                )
+        if from_sha:
+            first_layer = layers[from_sha]
+        if to_sha:
+            last_layer = layers[to_sha]
+    
+    bounds = {
+        "first_layer": first_layer, "last_layer": last_layer, "since": since, "until": until,
+        "x_min": x_min, "x_max": x_max, "y_min": y_min, "y_max": y_max,
+    }
+    if all(bound is None for bound in bounds.values()):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give a commit range, time range or layout box; GET /graph returns the whole graph"
+        )
+    
+    media_type = negotiate(accept)
+    if media_type:
+        document = await window_columns(db, commit_graph, limit, **bounds)
+        return Response(encode(document, media_type), media_type=media_type, headers={"Vary": "Accept"})
+    response.headers["Vary"] = "Accept"
+    return await graph_window(db, commit_graph, limit, **bounds)
 
 @router.get("/repositories/{repository_id}/graph/statistics")
 async def get_graph_statistics(
     repository_id: str,
-    current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_read_access),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get statistics about the commit graph"""
     
-    # Check if repository exists and user has access
-    repo = db.query(RepositoryModel).filter(RepositoryModel.id == repository_id).first()
-    if not repo:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Repository not found"
-        )
-    
-    # Check access permissions for private repos
-    if repo.is_private and repo.owner_id != current_user.id:
-        from models import RepositoryCollaborator
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == repository_id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-        if not is_collaborator:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied to private repository"
-            )
+    await access.require_read(repository_id)
     
-    graph_service = CommitGraphService(db)
-    statistics = graph_service.get_graph_statistics(repository_id)
+    statistics = await db.run_sync(
+        lambda session: CommitGraphService(session).get_graph_statistics(repository_id)
+    )
     
     return statistics
 
@@ -341,41 +388,25 @@ async def get_graph_statistics(
 async def delete_commit_graph(
     repository_id: str,
     current_user: UserModel = Depends(contributor_required),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete commit graph for a repository"""
     
-    # Check if repository exists and user has access
-    repo = db.query(RepositoryModel).filter(RepositoryModel.id == repository_id).first()
-    if not repo:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Repository not found"
-        )
-    
-    # Check permissions
-    if repo.owner_id != current_user.id:
-        from models import RepositoryCollaborator
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == repository_id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-        if not is_collaborator:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Insufficient permissions to delete commit graph"
-            )
+    await access.require_write(repository_id, detail="Insufficient permissions to delete commit graph")
     
-    commit_graph = db.query(CommitGraph).filter(
-        CommitGraph.repository_id == repository_id
-    ).first()
+    commit_graph = await db.scalar(
+        select(CommitGraph).where(CommitGraph.repository_id == repository_id).limit(1)
+    )
     
     if commit_graph:
-        db.delete(commit_graph)
-        db.commit()
+        await db.execute(delete(CommitGraphNode).where(CommitGraphNode.graph_id == commit_graph.id))
+        await db.execute(delete(CommitGraphEdge).where(CommitGraphEdge.graph_id == commit_graph.id))
+        await db.delete(commit_graph)
+        await db.commit()
         
         # Audit log
-        log_activity(
+        await log_activity(
             db=db,
             action="commit_graph_delete",
             user_id=current_user.id,
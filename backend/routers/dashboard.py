@@ -1,28 +1,64 @@
 # backend/routers/dashboard.py
 
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from datetime import datetime, timedelta, timezone
 
-from database import get_db
+from cache import StaleWhileRevalidateCache
+from config import env_float
+from database import ReadSessionLocal
 from models import (
     Repository as RepositoryModel, 
     MergeRequest as MergeRequestModel,
     User as UserModel,
-    AuditEntry
+    AuditEntry,
+    DailyAuthorMergeRequestStats,
+    DailyRepositoryActivity,
+    DailyRepositoryStats
 )
 from auth import verify_clerk_token
+from loaders import audit_entry_options
 
 router = APIRouter()
 
+RECENT_ACTIVITY_DAYS = 7
+# Lead time and efficiency compare this many days with the same span before it
+KPI_WINDOW_DAYS = 30
+SPARKLINE_DAYS = 7
+
+DASHBOARD_CACHE_SECONDS = env_float("DASHBOARD_CACHE_SECONDS", 30.0)
+# How long past that an outdated response may be served while a fresh one is computed
+DASHBOARD_STALE_SECONDS = env_float("DASHBOARD_STALE_SECONDS", 300.0)
+
+# The statistics are the same for every user, so all callers share one entry
+stats_cache = StaleWhileRevalidateCache(DASHBOARD_CACHE_SECONDS, DASHBOARD_STALE_SECONDS)
+
+
 @router.get("/stats")
 async def get_dashboard_stats(
-    db: Session = Depends(get_db),
     current_user: UserModel = Depends(verify_clerk_token)
 ):
     """
     Gathers and returns all the necessary statistics for the main dashboard.
+
+    Served from ``stats_cache``: recomputed after writes or every
+    DASHBOARD_CACHE_SECONDS, at most once at a time per worker.
+    """
+    return await stats_cache.get_or_compute("stats", _compute_stats)
+
+
+async def _compute_stats():
+    # Its own session: a background refresh outlives the request that started it
+    async with ReadSessionLocal() as db:
+        db.info["read_only"] = True
+        return await _dashboard_stats(db)
+
+
+async def _dashboard_stats(db: AsyncSession):
+    """
+    Day-based figures come from the rollup tables (rollups.py); the 24h
+    windows and the open count are index range counts over recent rows.
     """
     
     # --- 1. KPI Data ---
@@ -31,8 +67,14 @@ async def get_dashboard_stats(
     now_utc_naive = datetime.utcnow()
     twenty_four_hours_ago = now_utc_naive - timedelta(hours=24)
     forty_eight_hours_ago = now_utc_naive - timedelta(hours=48)
-    ingested_curr = db.query(RepositoryModel).filter(RepositoryModel.created_at >= twenty_four_hours_ago).count()
-    ingested_prev = db.query(RepositoryModel).filter(RepositoryModel.created_at >= forty_eight_hours_ago, RepositoryModel.created_at < twenty_four_hours_ago).count()
+    today = now_utc_naive.date()
+
+    ingested_curr, ingested_prev = (await db.execute(
+        select(
+            func.count().filter(RepositoryModel.created_at >= twenty_four_hours_ago),
+            func.count().filter(RepositoryModel.created_at < twenty_four_hours_ago),
+        ).where(RepositoryModel.created_at >= forty_eight_hours_ago)
+    )).one()
 
     def pct_delta(curr: int, prev: int) -> tuple[str, bool]:
         if prev == 0:
@@ -45,29 +87,71 @@ async def get_dashboard_stats(
 
     ingested_delta, ingested_positive = pct_delta(ingested_curr, ingested_prev)
 
-    # Active Cases - repositories updated in last 7 days vs previous 7-day window
-    seven_days_ago = now_utc_naive - timedelta(days=7)
-    fourteen_days_ago = now_utc_naive - timedelta(days=14)
-    active_curr = db.query(RepositoryModel).filter(RepositoryModel.updated_at >= seven_days_ago).count()
-    active_prev = db.query(RepositoryModel).filter(RepositoryModel.updated_at >= fourteen_days_ago, RepositoryModel.updated_at < seven_days_ago).count()
+    # Active Cases - repositories with activity in the last 7 days vs previous 7-day window
+    week_start = today - timedelta(days=6)
+    previous_week_start = today - timedelta(days=13)
+    active_curr, active_prev = (await db.execute(
+        select(
+            func.count(func.distinct(DailyRepositoryActivity.repository_id)).filter(
+                DailyRepositoryActivity.day >= week_start),
+            func.count(func.distinct(DailyRepositoryActivity.repository_id)).filter(
+                DailyRepositoryActivity.day < week_start),
+        ).where(DailyRepositoryActivity.day >= previous_week_start)
+    )).one()
     active_delta, active_positive = pct_delta(active_curr, active_prev)
 
     # Open Merge Requests - compare current open count vs count 24h ago snapshot (approximation: count opened before 24h that are still open + opened within)
-    open_curr = db.query(MergeRequestModel).filter(MergeRequestModel.status == 'open').count()
     # Approx previous: open MRs that were created before 24h ago and still open OR closed within last 24h (gives rough baseline)
-    open_prev = db.query(MergeRequestModel).filter(MergeRequestModel.created_at < twenty_four_hours_ago, MergeRequestModel.status == 'open').count()
+    open_curr, open_prev = (await db.execute(
+        select(
+            func.count(),
+            func.count().filter(MergeRequestModel.created_at < twenty_four_hours_ago),
+        ).where(MergeRequestModel.status == 'open')
+    )).one()
     open_delta, open_positive = pct_delta(open_curr, open_prev)
 
-    # Avg Lead Time (dummy) & Investigator Efficiency (dummy) but compute a mock delta relative to baseline constants
-    avg_lead_time_value = 3.4  # days
-    avg_lead_time_prev = 3.7
-    lead_change = avg_lead_time_value - avg_lead_time_prev
+    # Avg Lead Time & Investigator Efficiency - merge requests finished in the last 30 days vs the previous 30,
+    # from the per-day merge request rollups (merge and close transitions in the version history)
+    kpi_start = today - timedelta(days=KPI_WINDOW_DAYS - 1)
+    merge_days = {
+        day: (opened, merged, closed, cycle_days)
+        for day, opened, merged, closed, cycle_days in (await db.execute(
+            select(
+                DailyAuthorMergeRequestStats.day,
+                func.sum(DailyAuthorMergeRequestStats.opened),
+                func.sum(DailyAuthorMergeRequestStats.merged),
+                func.sum(DailyAuthorMergeRequestStats.closed),
+                func.sum(DailyAuthorMergeRequestStats.cycle_days_total),
+            )
+            .where(DailyAuthorMergeRequestStats.day >= kpi_start - timedelta(days=KPI_WINDOW_DAYS))
+            .group_by(DailyAuthorMergeRequestStats.day)
+        )).all()
+    }
+
+    def finished(days) -> tuple[int, int, float]:
+        rows = [merge_days[day] for day in days if day in merge_days]
+        return (sum(row[1] for row in rows), sum(row[2] for row in rows),
+                sum(float(row[3] or 0.0) for row in rows))
+
+    def lead_time(merged: int, closed: int, cycle_days: float):
+        return cycle_days / (merged + closed) if merged + closed else None
+
+    def efficiency(merged: int, closed: int):
+        return round(100 * merged / (merged + closed)) if merged + closed else None
+
+    window = [kpi_start + timedelta(days=i) for i in range(KPI_WINDOW_DAYS)]
+    curr_finished = finished(window)
+    prev_finished = finished(day - timedelta(days=KPI_WINDOW_DAYS) for day in window)
+
+    avg_lead_time_value = lead_time(*curr_finished) or 0.0  # days
+    avg_lead_time_prev = lead_time(*prev_finished)
+    lead_change = avg_lead_time_value - avg_lead_time_prev if avg_lead_time_prev is not None else 0.0
     lead_delta = f"{lead_change:+.1f}d"
     lead_positive = lead_change <= 0  # lower lead time is good
 
-    investigator_efficiency = 82  # percent
-    investigator_eff_prev = 78
-    eff_change = investigator_efficiency - investigator_eff_prev
+    investigator_efficiency = efficiency(*curr_finished[:2]) or 0  # percent merged of finished
+    investigator_eff_prev = efficiency(*prev_finished[:2])
+    eff_change = investigator_efficiency - investigator_eff_prev if investigator_eff_prev is not None else 0
     eff_delta = f"{eff_change:+d}" if abs(eff_change) >= 1 else "+0"
     eff_positive = eff_change >= 0
 
@@ -80,8 +164,14 @@ async def get_dashboard_stats(
     }
 
     # --- 2. Activity Timeline ---
-    # Fetch recent audit entries
-    recent_activity = db.query(AuditEntry).order_by(AuditEntry.created_at.desc()).limit(10).all()
+    # Fetch recent audit entries. Bounding created_at lets PostgreSQL skip all but
+    # the newest monthly partition; only a quiet week falls back to the whole table.
+    recent_query = select(AuditEntry).options(*audit_entry_options()).order_by(AuditEntry.created_at.desc()).limit(10)
+    recent_activity = (await db.scalars(
+        recent_query.where(AuditEntry.created_at >= now_utc_naive - timedelta(days=RECENT_ACTIVITY_DAYS))
+    )).all()
+    if len(recent_activity) < 10:
+        recent_activity = (await db.scalars(recent_query)).all()
     
     # Format activity data for the frontend
     now_utc = datetime.now(timezone.utc)
@@ -114,13 +204,15 @@ async def get_dashboard_stats(
     # Ingest Volume: count repositories created per day for last 30 days.
     days_back = 30
     start_range = now_utc_naive - timedelta(days=days_back - 1)
+    per_day = dict((await db.execute(
+        select(DailyRepositoryStats.day, DailyRepositoryStats.repositories_created)
+        .where(DailyRepositoryStats.day >= start_range.date())
+    )).all())
     # Build a list of dicts with date strings and category splits (web/social/darkweb)
     ingest_volume = []
     for i in range(days_back):
         day = start_range + timedelta(days=i)
-        day_start = datetime(day.year, day.month, day.day)
-        day_end = day_start + timedelta(days=1)
-        count = db.query(RepositoryModel).filter(RepositoryModel.created_at >= day_start, RepositoryModel.created_at < day_end).count()
+        count = per_day.get(day.date(), 0)
         # Derive category splits deterministically so chart has stacked segments even without explicit source field
         if count == 0:
             web = social = darkweb = 0
@@ -136,55 +228,66 @@ async def get_dashboard_stats(
         })
 
     # Investigator Performance: derive from merge requests merged or closed in last 30 days grouped by author
-    recent_period_start = now_utc_naive - timedelta(days=30)
-    mr_q = db.query(MergeRequestModel).filter(
-        MergeRequestModel.created_at >= recent_period_start,
-        MergeRequestModel.status.in_(['merged', 'closed'])
-    ).all()
-    perf_map = {}
-    for mr in mr_q:
-        author = mr.author
-        if not author:
-            continue
-        key = author.id
-        if key not in perf_map:
-            perf_map[key] = {
-                "name": author.username or author.email.split('@')[0],
-                "closedCount": 0,
-                "durations": []  # in days
-            }
-        perf_map[key]["closedCount"] += 1
-        # Approximate cycle time using updated_at if present else created_at
-        end_time = mr.updated_at or mr.created_at or now_utc_naive
-        start_time = mr.created_at or end_time
-        if end_time and start_time:
-            delta_days = max(0.0, (end_time - start_time).total_seconds() / 86400.0)
-            perf_map[key]["durations"].append(delta_days)
-    investigator_perf = []
-    for p in perf_map.values():
-        if p["durations"]:
-            avg_time = sum(p["durations"]) / len(p["durations"])
-        else:
-            avg_time = 0.0
-        investigator_perf.append({
-            "name": p["name"],
-            "closedCount": p["closedCount"],
-            "avgTimeDays": round(avg_time, 2)
-        })
-    # Sort by closedCount desc and limit to top 10 for readability
-    investigator_perf.sort(key=lambda x: x["closedCount"], reverse=True)
-    investigator_perf = investigator_perf[:10]
+    closed_count = func.sum(DailyAuthorMergeRequestStats.merged + DailyAuthorMergeRequestStats.closed)
+    perf_rows = (await db.execute(
+        select(
+            UserModel.username, UserModel.email, closed_count,
+            func.sum(DailyAuthorMergeRequestStats.cycle_days_total) / closed_count,
+        )
+        .join(UserModel, UserModel.id == DailyAuthorMergeRequestStats.author_id)
+        .where(DailyAuthorMergeRequestStats.day >= today - timedelta(days=29))
+        .group_by(UserModel.id, UserModel.username, UserModel.email)
+        .having(closed_count > 0)
+        # Top 10 by closedCount for readability
+        .order_by(closed_count.desc(), UserModel.id)
+        .limit(10)
+    )).all()
+    investigator_perf = [
+        {
+            "name": username or email.split('@')[0],
+            "closedCount": count,
+            "avgTimeDays": round(float(avg_days or 0.0), 2)
+        }
+        for username, email, count, avg_days in perf_rows
+    ]
 
     # Tag trends still placeholder until tagging implemented
     tag_trends = []
 
-    # Dummy data for sparklines, matching the frontend's expectation
+    # Sparklines: one point per day for the last SPARKLINE_DAYS, from the same per-day rows as the KPIs
+    spark_days = [today - timedelta(days=SPARKLINE_DAYS - 1 - i) for i in range(SPARKLINE_DAYS)]
+    active_per_day = dict((await db.execute(
+        select(DailyRepositoryActivity.day, func.count())
+        .where(DailyRepositoryActivity.day >= spark_days[0])
+        .group_by(DailyRepositoryActivity.day)
+    )).all())
+
+    # Open requests at the end of each day: walk back from the current count, undoing each day's net change
+    open_spark = []
+    open_count = open_curr
+    for day in reversed(spark_days):
+        open_spark.append(open_count)
+        opened, merged, closed, _ = merge_days.get(day, (0, 0, 0, 0.0))
+        open_count = max(0, open_count - opened + merged + closed)
+    open_spark.reverse()
+
+    # A day without finished requests carries the previous point forward
+    lead_spark, eff_spark = [], []
+    lead_point = avg_lead_time_prev if avg_lead_time_prev is not None else avg_lead_time_value
+    eff_point = investigator_eff_prev if investigator_eff_prev is not None else investigator_efficiency
+    for day in spark_days:
+        day_finished = finished([day])
+        lead_point = lead_time(*day_finished) if day_finished[0] + day_finished[1] else lead_point
+        eff_point = efficiency(*day_finished[:2]) if day_finished[0] + day_finished[1] else eff_point
+        lead_spark.append(round(lead_point, 1))
+        eff_spark.append(eff_point)
+
     repo_sparks = [
-        {"sparkline": [10, 20, 15, 30, 25, 40]},
-        {"sparkline": [40, 35, 38, 30, 28, 25]},
-        {"sparkline": [5, 8, 10, 12, 15, 17]},
-        {"sparkline": [4.5, 4.2, 4.0, 3.8, 3.5, 3.4]},
-        {"sparkline": [70, 72, 75, 78, 80, 82]},
+        {"sparkline": [per_day.get(day, 0) for day in spark_days]},
+        {"sparkline": [active_per_day.get(day, 0) for day in spark_days]},
+        {"sparkline": open_spark},
+        {"sparkline": lead_spark},
+        {"sparkline": eff_spark},
     ]
     
     # --- 4. Assemble the Final Response ---
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict
 from datetime import datetime
 
-from database import get_db
+from database import get_async_db
 from auth import verify_clerk_token
 from models import (
     Repository as RepositoryModel,
@@ -17,11 +18,11 @@ router = APIRouter()
 DEMO_REPO_NAME = "Malware Case Demo"
 
 
-def _ensure_demo_repo(db: Session, user: UserModel) -> RepositoryModel:
-    repo = (
-        db.query(RepositoryModel)
-        .filter(RepositoryModel.name == DEMO_REPO_NAME, RepositoryModel.owner_id == user.id)
-        .first()
+async def _ensure_demo_repo(db: AsyncSession, user: UserModel) -> RepositoryModel:
+    repo = await db.scalar(
+        select(RepositoryModel)
+        .where(RepositoryModel.name == DEMO_REPO_NAME, RepositoryModel.owner_id == user.id)
+        .limit(1)
     )
     if repo:
         return repo
@@ -32,16 +33,16 @@ def _ensure_demo_repo(db: Session, user: UserModel) -> RepositoryModel:
         is_private=False,
     )
     db.add(repo)
-    db.commit()
-    db.refresh(repo)
+    await db.commit()
+    await db.refresh(repo)
     return repo
 
 
-def _create_file(db: Session, repo: RepositoryModel, user: UserModel, *, name: str, path: str, content: str, file_type: str) -> RepositoryFileModel:
-    existing = (
-        db.query(RepositoryFileModel)
-        .filter(RepositoryFileModel.repository_id == repo.id, RepositoryFileModel.path == path)
-        .first()
+async def _create_file(db: AsyncSession, repo: RepositoryModel, user: UserModel, *, name: str, path: str, content: str, file_type: str) -> RepositoryFileModel:
+    existing = await db.scalar(
+        select(RepositoryFileModel)
+        .where(RepositoryFileModel.repository_id == repo.id, RepositoryFileModel.path == path)
+        .limit(1)
     )
     if existing:
         return existing
@@ -55,13 +56,13 @@ def _create_file(db: Session, repo: RepositoryModel, user: UserModel, *, name: s
         author_id=user.id,
     )
     db.add(f)
-    db.commit()
-    db.refresh(f)
+    await db.commit()
+    await db.refresh(f)
     return f
 
 
-def _create_mr(
-    db: Session,
+async def _create_mr(
+    db: AsyncSession,
     user: UserModel,
     repo: RepositoryModel,
     *,
@@ -88,22 +89,22 @@ def _create_mr(
         ai_validation_concerns=concerns or [],
     )
     db.add(mr)
-    db.commit()
-    db.refresh(mr)
+    await db.commit()
+    await db.refresh(mr)
     return mr
 
 
 @router.post("/seed", summary="Seed demo repository & merge requests")
-async def seed_demo(current_user: UserModel = Depends(verify_clerk_token), db: Session = Depends(get_db)) -> Dict:
+async def seed_demo(current_user: UserModel = Depends(verify_clerk_token), db: AsyncSession = Depends(get_async_db)) -> Dict:
     """Create (or return) a demo repository with representative merge requests.
 
     This avoids triggering real AI validation calls by directly populating
     the ai_validation* columns for different workflow states.
     """
-    repo = _ensure_demo_repo(db, current_user)
+    repo = await _ensure_demo_repo(db, current_user)
 
     # Core demo files
-    _create_file(
+    await _create_file(
         db,
         repo,
         current_user,
@@ -117,7 +118,7 @@ async def seed_demo(current_user: UserModel = Depends(verify_clerk_token), db: S
         ),
         file_type="markdown",
     )
-    _create_file(
+    await _create_file(
         db,
         repo,
         current_user,
@@ -128,7 +129,7 @@ async def seed_demo(current_user: UserModel = Depends(verify_clerk_token), db: S
         ),
         file_type="json",
     )
-    _create_file(
+    await _create_file(
         db,
         repo,
         current_user,
@@ -139,7 +140,7 @@ async def seed_demo(current_user: UserModel = Depends(verify_clerk_token), db: S
         ),
         file_type="markdown",
     )
-    _create_file(
+    await _create_file(
         db,
         repo,
         current_user,
@@ -152,15 +153,15 @@ async def seed_demo(current_user: UserModel = Depends(verify_clerk_token), db: S
     )
 
     # Prevent duplicate seeding of MRs by checking if any exist already for this repo
-    existing_mr_count = (
-        db.query(MergeRequestModel)
-        .filter(MergeRequestModel.source_repo_id == repo.id, MergeRequestModel.target_repo_id == repo.id)
-        .count()
+    existing_mr_count = await db.scalar(
+        select(func.count())
+        .select_from(MergeRequestModel)
+        .where(MergeRequestModel.source_repo_id == repo.id, MergeRequestModel.target_repo_id == repo.id)
     )
     created = []
     if existing_mr_count == 0:
         created.append(
-            _create_mr(
+            await _create_mr(
                 db,
                 current_user,
                 repo,
@@ -173,7 +174,7 @@ async def seed_demo(current_user: UserModel = Depends(verify_clerk_token), db: S
             )
         )
         created.append(
-            _create_mr(
+            await _create_mr(
                 db,
                 current_user,
                 repo,
@@ -187,7 +188,7 @@ async def seed_demo(current_user: UserModel = Depends(verify_clerk_token), db: S
             )
         )
         created.append(
-            _create_mr(
+            await _create_mr(
                 db,
                 current_user,
                 repo,
@@ -199,7 +200,7 @@ async def seed_demo(current_user: UserModel = Depends(verify_clerk_token), db: S
             )
         )
         created.append(
-            _create_mr(
+            await _create_mr(
                 db,
                 current_user,
                 repo,
@@ -212,7 +213,7 @@ async def seed_demo(current_user: UserModel = Depends(verify_clerk_token), db: S
             )
         )
         created.append(
-            _create_mr(
+            await _create_mr(
                 db,
                 current_user,
                 repo,
@@ -1,49 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 
-from database import get_db
-from models import RepositoryFile as RepositoryFileModel, User as UserModel, Repository as RepositoryModel, RepositoryCollaborator
-from schemas import RepositoryFile, RepositoryFileCreate, RepositoryFileUpdate
+from database import get_async_db
+from models import RepositoryFile as RepositoryFileModel, User as UserModel
+from schemas import RepositoryFile, RepositoryFileSummary, RepositoryFileCreate, RepositoryFileUpdate
 from auth import verify_clerk_token, contributor_required
+from access_control import AccessControl, get_access
 from audit import log_activity
+from loaders import repository_file_options, repository_file_summary_options, parse_include
 
 router = APIRouter()
 
+
+async def _load_file(db: AsyncSession, file_id: str, populate_existing: bool = False):
+    """Load a file with its author (for the response)"""
+    return await db.get(
+        RepositoryFileModel,
+        file_id,
+        options=repository_file_options(),
+        populate_existing=populate_existing
+    )
+
+
 @router.post("/", response_model=RepositoryFile)
 async def create_file(
     file_data: RepositoryFileCreate,
     current_user: UserModel = Depends(contributor_required),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new file in repository"""
-    # Check if repository exists and user has access
-    repo = db.query(RepositoryModel).filter(RepositoryModel.id == file_data.repository_id).first()
-    
-    if not repo:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Repository not found"
-        )
-    
-    # Check permissions (owner or collaborator)
-    if repo.owner_id != current_user.id:
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == file_data.repository_id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-        
-        if not is_collaborator:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Insufficient permissions to create files in this repository"
-            )
+    await access.require_write(
+        file_data.repository_id, detail="Insufficient permissions to create files in this repository"
+    )
     
     # Check if file already exists at this path
-    existing_file = db.query(RepositoryFileModel).filter(
+    existing_file = await db.scalar(select(RepositoryFileModel.id).where(
         RepositoryFileModel.repository_id == file_data.repository_id,
         RepositoryFileModel.path == file_data.path
-    ).first()
+    ).limit(1))
     
     if existing_file:
         raise HTTPException(
@@ -58,10 +55,10 @@ async def create_file(
         size=len(file_data.content.encode('utf-8'))
     )
     db.add(db_file)
-    db.commit()
-    db.refresh(db_file)
+    await db.commit()
+    db_file = await _load_file(db, db_file.id, populate_existing=True)
     # Audit log for file creation
-    log_activity(
+    await log_activity(
         db=db,
         action="file_create",
         user_id=current_user.id,
@@ -74,46 +71,33 @@ async def create_file(
     )
     return db_file
 
-@router.get("/repository/{repo_id}", response_model=List[RepositoryFile])
+@router.get("/repository/{repo_id}", response_model=List[Union[RepositoryFile, RepositoryFileSummary]])
 async def list_repository_files(
     repo_id: str,
-    current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    include: Optional[str] = Query(None, description="Comma separated extra fields; 'content' returns file content"),
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """List all files in a repository"""
-    # Check if repository exists and user has access
-    repo = db.query(RepositoryModel).filter(RepositoryModel.id == repo_id).first()
-    
-    if not repo:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Repository not found"
-        )
-    
-    # Check access permissions for private repos
-    if repo.is_private and repo.owner_id != current_user.id:
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == repo_id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-        
-        if not is_collaborator:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied to private repository"
-            )
-    
-    files = db.query(RepositoryFileModel).filter(RepositoryFileModel.repository_id == repo_id).all()
-    return files
+    """List all files in a repository (without content unless ?include=content)"""
+    await access.require_read(repo_id)
+    
+    with_content = "content" in parse_include(include)
+    files = (await db.scalars(
+        select(RepositoryFileModel)
+        .options(*(repository_file_options() if with_content else repository_file_summary_options()))
+        .where(RepositoryFileModel.repository_id == repo_id)
+    )).all()
+    schema = RepositoryFile if with_content else RepositoryFileSummary
+    return [schema.model_validate(file) for file in files]
 
 @router.get("/{file_id}", response_model=RepositoryFile)
 async def get_file(
     file_id: str,
-    current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get file by ID"""
-    file = db.query(RepositoryFileModel).filter(RepositoryFileModel.id == file_id).first()
+    file = await _load_file(db, file_id)
     
     if not file:
         raise HTTPException(
@@ -121,19 +105,7 @@ async def get_file(
             detail="File not found"
         )
     
-    # Check repository access
-    repo = file.repository
-    if repo.is_private and repo.owner_id != current_user.id:
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == repo.id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-        
-        if not is_collaborator:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied to private repository"
-            )
+    await access.require_read(file.repository_id)
     
     return file
 
@@ -142,10 +114,11 @@ async def update_file(
     file_id: str,
     file_update: RepositoryFileUpdate,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update file content"""
-    file = db.query(RepositoryFileModel).filter(RepositoryFileModel.id == file_id).first()
+    file = await _load_file(db, file_id)
     
     if not file:
         raise HTTPException(
@@ -153,19 +126,7 @@ async def update_file(
             detail="File not found"
         )
     
-    # Check permissions (owner or collaborator)
-    repo = file.repository
-    if repo.owner_id != current_user.id:
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == repo.id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-        
-        if not is_collaborator:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Insufficient permissions to update this file"
-            )
+    await access.require_write(file.repository_id, detail="Insufficient permissions to update this file")
     
     update_data = file_update.dict(exclude_unset=True)
     
@@ -176,10 +137,10 @@ async def update_file(
     if "content" in update_data:
         file.size = len(file.content.encode('utf-8'))
     
-    db.commit()
-    db.refresh(file)
+    await db.commit()
+    file = await _load_file(db, file_id, populate_existing=True)
     # Audit log for file update
-    log_activity(
+    await log_activity(
         db=db,
         action="file_update",
         user_id=current_user.id,
@@ -196,10 +157,11 @@ async def update_file(
 async def delete_file(
     file_id: str,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete file"""
-    file = db.query(RepositoryFileModel).filter(RepositoryFileModel.id == file_id).first()
+    file = await _load_file(db, file_id)
     
     if not file:
         raise HTTPException(
@@ -207,24 +169,12 @@ async def delete_file(
             detail="File not found"
         )
     
-    # Check permissions (owner or collaborator)
-    repo = file.repository
-    if repo.owner_id != current_user.id:
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == repo.id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-        
-        if not is_collaborator:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Insufficient permissions to delete this file"
-            )
-    
-    db.delete(file)
-    db.commit()
+    await access.require_write(file.repository_id, detail="Insufficient permissions to delete this file")
+    
+    await db.delete(file)
+    await db.commit()
     # Audit log for file deletion
-    log_activity(
+    await log_activity(
         db=db,
         action="file_delete",
         user_id=current_user.id,
@@ -233,6 +183,7 @@ async def delete_file(
             "file_id": file.id,
             "filename": file.name,
             "path": file.path
-        }
+        },
+        durable=True
     )
     return {"message": "File deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException, Header, status
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import hmac
+import os
+
+from database import (
+    engine, async_engine, replica_engines, read_your_writes, pool_status,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_PGBOUNCER, REPLICA_STICKY_SECONDS
+)
+import instrumentation
+
+router = APIRouter()
+
+INTERNAL_METRICS_TOKEN = os.getenv("INTERNAL_METRICS_TOKEN")
+
+
+def require_internal_token(x_internal_token: Optional[str] = Header(None)):
+    """Guard internal endpoints with INTERNAL_METRICS_TOKEN; hidden entirely when it is not set"""
+    if not INTERNAL_METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_internal_token or not hmac.compare_digest(x_internal_token, INTERNAL_METRICS_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid internal token"
+        )
+
+
+@router.get("/db-pool", dependencies=[Depends(require_internal_token)])
+async def get_db_pool_metrics():
+    """Connection pool occupancy, overflow and checkout latency for this worker"""
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    # Each replica gets its own pool of the same size, on its own server
+    per_worker = None if DB_PGBOUNCER else DB_POOL_SIZE + DB_MAX_OVERFLOW
+    return {
+        "pid": os.getpid(),
+        "primary": pool_status(async_engine),
+        "primary_sync": pool_status(engine),
+        "replicas": [
+            {"url": replica.url.render_as_string(hide_password=True), **pool_status(replica)}
+            for replica in replica_engines
+        ],
+        "read_your_writes": {
+            "sticky_seconds": REPLICA_STICKY_SECONDS,
+            "sticky_callers": read_your_writes.active(),
+        },
+        "sizing": {
+            "workers": workers,
+            "max_connections_per_worker": per_worker,
+            "max_connections_total": per_worker * workers if per_worker is not None else None,
+        },
+    }
+
+
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_internal_token)])
+async def get_metrics():
+    """Per-route latency, SQL, AI and traffic metrics for this worker, in Prometheus text format"""
+    return PlainTextResponse(instrumentation.render(), media_type="text/plain; version=0.0.4")
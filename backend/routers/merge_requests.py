@@ -1,34 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
 
-from database import get_db
+from database import get_async_db
 from models import MergeRequest as MergeRequestModel, User as UserModel, Repository as RepositoryModel, Comment as CommentModel, MergeRequestVersion
 from schemas import MergeRequest, MergeRequestCreate, MergeRequestUpdate, MergeRequestStatus, Comment, CommentCreate, MergeRequestVersion as MergeRequestVersionSchema
 from auth import verify_clerk_token, contributor_required
+from access_control import AccessControl, get_access
 from ai_service import EnhancedAIService
 from audit import log_activity
+from loaders import merge_request_options, comment_options, merge_request_version_options
+from pagination import keyset_paginate, finish_page
 import httpx
 
 router = APIRouter()
 ai_service = EnhancedAIService()
 
+
+async def _load_merge_request(db: AsyncSession, mr_id: str, populate_existing: bool = False):
+    """Load a merge request with the author/repository graph needed by the response schema"""
+    return await db.get(MergeRequestModel, mr_id, options=merge_request_options(), populate_existing=populate_existing)
+
+
+async def _latest_version_number(db: AsyncSession, mr_id: str) -> int:
+    last_version = await db.scalar(
+        select(MergeRequestVersion.version_number)
+        .where(MergeRequestVersion.merge_request_id == mr_id)
+        .order_by(MergeRequestVersion.version_number.desc())
+        .limit(1)
+    )
+    return last_version or 0
+
+
+def _version_of(mr: MergeRequestModel, version_number: int, author_id: str) -> MergeRequestVersion:
+    """Snapshot of the merge request's current state"""
+    return MergeRequestVersion(
+        merge_request_id=mr.id,
+        version_number=version_number,
+        title=mr.title,
+        description=mr.description,
+        status=mr.status,
+        ai_validation_status=mr.ai_validation_status,
+        ai_validation_score=mr.ai_validation_score,
+        ai_validation_feedback=mr.ai_validation_feedback,
+        ai_validation_concerns=mr.ai_validation_concerns,
+        ai_validation_suggestions=mr.ai_validation_suggestions,
+        author_id=author_id
+    )
+
 @router.post("/", response_model=MergeRequest)
 async def create_merge_request(
     mr_data: MergeRequestCreate,
     current_user: UserModel = Depends(contributor_required),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new merge request"""
     # Verify source and target repositories exist
-    source_repo = db.query(RepositoryModel).filter(RepositoryModel.id == mr_data.source_repo_id).first()
-    target_repo = db.query(RepositoryModel).filter(RepositoryModel.id == mr_data.target_repo_id).first()
+    source_repo = await db.get(RepositoryModel, mr_data.source_repo_id)
+    target_repo = await db.get(RepositoryModel, mr_data.target_repo_id)
     
     if not source_repo or not target_repo:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Source or target repository not found"
         )
+    await access.require_read(source_repo)
+    await access.require_read(target_repo)
     
     # Create merge request
     db_mr = MergeRequestModel(
@@ -59,27 +99,14 @@ async def create_merge_request(
         db_mr.ai_validation_feedback = f"AI validation failed: {str(e)}"
     
     db.add(db_mr)
-    db.commit()
-    db.refresh(db_mr)
+    await db.commit()
+    db_mr = await _load_merge_request(db, db_mr.id, populate_existing=True)
     # Versioning: first version
-    from models import MergeRequestVersion
-    mr_version = MergeRequestVersion(
-        merge_request_id=db_mr.id,
-        version_number=1,
-        title=db_mr.title,
-        description=db_mr.description,
-        status=db_mr.status,
-        ai_validation_status=db_mr.ai_validation_status,
-        ai_validation_score=db_mr.ai_validation_score,
-        ai_validation_feedback=db_mr.ai_validation_feedback,
-        ai_validation_concerns=db_mr.ai_validation_concerns,
-        ai_validation_suggestions=db_mr.ai_validation_suggestions,
-        author_id=current_user.id
-    )
+    mr_version = _version_of(db_mr, 1, current_user.id)
     db.add(mr_version)
-    db.commit()
+    await db.commit()
     # Audit log for MR creation
-    log_activity(
+    await log_activity(
         db=db,
         action="merge_request_create",
         user_id=current_user.id,
@@ -95,46 +122,56 @@ async def create_merge_request(
 
 @router.get("/", response_model=List[MergeRequest])
 async def list_merge_requests(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     status: Optional[MergeRequestStatus] = None,
     repository_id: Optional[str] = None,
     author_id: Optional[str] = None,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List merge requests with optional filters"""
-    query = db.query(MergeRequestModel)
+    query = select(MergeRequestModel).options(*merge_request_options()).where(
+        MergeRequestModel.target_repo.has(access.readable_filter())
+    )
     
     if status:
-        query = query.filter(MergeRequestModel.status == status)
+        query = query.where(MergeRequestModel.status == status)
     
     if repository_id:
-        query = query.filter(
+        query = query.where(
             (MergeRequestModel.source_repo_id == repository_id) |
             (MergeRequestModel.target_repo_id == repository_id)
         )
     
     if author_id:
-        query = query.filter(MergeRequestModel.author_id == author_id)
+        query = query.where(MergeRequestModel.author_id == author_id)
     
-    merge_requests = query.offset(skip).limit(limit).all()
-    return merge_requests
+    query = keyset_paginate(
+        query, MergeRequestModel.created_at, MergeRequestModel.id,
+        cursor=cursor, limit=limit, skip=skip, dialect_name=db.bind.dialect.name
+    )
+    return finish_page((await db.scalars(query)).all(), limit, response, "created_at")
 
 @router.get("/{mr_id}", response_model=MergeRequest)
 async def get_merge_request(
     mr_id: str,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get merge request by ID"""
-    mr = db.query(MergeRequestModel).filter(MergeRequestModel.id == mr_id).first()
+    mr = await _load_merge_request(db, mr_id)
     
     if not mr:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Merge request not found"
         )
+    await access.require_read(mr.target_repo)
     
     return mr
 
@@ -143,10 +180,11 @@ async def update_merge_request(
     mr_id: str,
     mr_update: MergeRequestUpdate,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update merge request"""
-    mr = db.query(MergeRequestModel).filter(MergeRequestModel.id == mr_id).first()
+    mr = await _load_merge_request(db, mr_id)
     
     if not mr:
         raise HTTPException(
@@ -155,40 +193,27 @@ async def update_merge_request(
         )
     
     # Check permissions (author or target repo owner can update)
-    if mr.author_id != current_user.id and mr.target_repo.owner_id != current_user.id:
+    if mr.author_id != current_user.id and not await access.is_owner(mr.target_repo):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Insufficient permissions to update this merge request"
         )
     
     update_data = mr_update.dict(exclude_unset=True)
+    previous_status = mr.status
     
     for field, value in update_data.items():
         setattr(mr, field, value)
     
-    db.commit()
-    db.refresh(mr)
+    await db.commit()
+    mr = await _load_merge_request(db, mr_id, populate_existing=True)
     # Versioning: save new version after update
-    from models import MergeRequestVersion
-    last_version = db.query(MergeRequestVersion).filter(MergeRequestVersion.merge_request_id == mr.id).order_by(MergeRequestVersion.version_number.desc()).first()
-    next_version = (last_version.version_number + 1) if last_version else 1
-    mr_version = MergeRequestVersion(
-        merge_request_id=mr.id,
-        version_number=next_version,
-        title=mr.title,
-        description=mr.description,
-        status=mr.status,
-        ai_validation_status=mr.ai_validation_status,
-        ai_validation_score=mr.ai_validation_score,
-        ai_validation_feedback=mr.ai_validation_feedback,
-        ai_validation_concerns=mr.ai_validation_concerns,
-        ai_validation_suggestions=mr.ai_validation_suggestions,
-        author_id=current_user.id
-    )
+    next_version = await _latest_version_number(db, mr.id) + 1
+    mr_version = _version_of(mr, next_version, current_user.id)
     db.add(mr_version)
-    db.commit()
+    await db.commit()
     # Audit log for MR update
-    log_activity(
+    await log_activity(
         db=db,
         action="merge_request_update",
         user_id=current_user.id,
@@ -197,6 +222,7 @@ async def update_merge_request(
             "merge_request_id": mr.id,
             "title": mr.title,
             "status": mr.status,
+            "previous_status": previous_status,
             "version": next_version
         }
     )
@@ -206,16 +232,17 @@ async def update_merge_request(
 async def merge_request(
     mr_id: str,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Merge a merge request (target repo owner only). Returns structured JSON with error reasons."""
-    mr = db.query(MergeRequestModel).filter(MergeRequestModel.id == mr_id).first()
+    mr = await _load_merge_request(db, mr_id)
 
     if not mr:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Merge request not found")
 
     # Permission: only target repo owner merges (explicit) – keep for now
-    if mr.target_repo.owner_id != current_user.id:
+    if not await access.is_owner(mr.target_repo):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail={
             "message": "Insufficient permissions to merge",
             "reason": "not_target_owner"
@@ -238,15 +265,18 @@ async def merge_request(
         })
 
     mr.status = "merged"
-    db.commit()
-    db.refresh(mr)
+    # The status change is part of the version history (dashboard lead time reads it)
+    db.add(_version_of(mr, await _latest_version_number(db, mr.id) + 1, current_user.id))
+    await db.commit()
+    await db.refresh(mr)
 
-    log_activity(
+    await log_activity(
         db=db,
         action="merge_request_merged",
         user_id=current_user.id,
         repository_id=mr.target_repo_id,
-        details={"merge_request_id": mr.id, "title": mr.title, "status": mr.status}
+        details={"merge_request_id": mr.id, "title": mr.title, "status": mr.status},
+        durable=True
     )
     await send_mr_status_webhook(mr, "merged", db)
     return {"message": "Merge request merged successfully", "merge_request_id": mr.id, "status": mr.status}
@@ -255,10 +285,11 @@ async def merge_request(
 async def close_merge_request(
     mr_id: str,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Close a merge request"""
-    mr = db.query(MergeRequestModel).filter(MergeRequestModel.id == mr_id).first()
+    mr = await _load_merge_request(db, mr_id)
     
     if not mr:
         raise HTTPException(
@@ -267,7 +298,7 @@ async def close_merge_request(
         )
     
     # Check permissions (author or target repo owner can close)
-    if mr.author_id != current_user.id and mr.target_repo.owner_id != current_user.id:
+    if mr.author_id != current_user.id and not await access.is_owner(mr.target_repo):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Insufficient permissions to close this merge request"
@@ -281,9 +312,10 @@ async def close_merge_request(
     
     # Update status to closed
     mr.status = "closed"
-    db.commit()
+    db.add(_version_of(mr, await _latest_version_number(db, mr.id) + 1, current_user.id))
+    await db.commit()
     # Audit log for close action
-    log_activity(
+    await log_activity(
         db=db,
         action="merge_request_closed",
         user_id=current_user.id,
@@ -302,15 +334,17 @@ async def close_merge_request(
 async def validate_merge_request(
     mr_id: str,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Trigger AI validation for a merge request. On AI failure, fallback to needs_review without 500."""
-    mr = db.query(MergeRequestModel).filter(MergeRequestModel.id == mr_id).first()
+    mr = await db.get(MergeRequestModel, mr_id, options=[selectinload(MergeRequestModel.file_changes)])
     if not mr:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Merge request not found")
+    await access.require_read(mr.target_repo_id)
 
-    source_repo = db.query(RepositoryModel).filter(RepositoryModel.id == mr.source_repo_id).first()
-    target_repo = db.query(RepositoryModel).filter(RepositoryModel.id == mr.target_repo_id).first()
+    source_repo = await db.get(RepositoryModel, mr.source_repo_id)
+    target_repo = await db.get(RepositoryModel, mr.target_repo_id)
     if not source_repo or not target_repo:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Source or target repository not found")
 
@@ -336,15 +370,15 @@ async def validate_merge_request(
         mr.ai_validation_feedback = ai_validation["feedback"]
         mr.ai_validation_concerns = ai_validation["concerns"]
         mr.ai_validation_suggestions = ai_validation["suggestions"]
-        db.commit()
-        db.refresh(mr)
+        await db.commit()
+        await db.refresh(mr)
         return {"message": "AI validation completed", "validation_result": ai_validation, "merge_request_id": mr.id, "ai_status": mr.ai_validation_status}
     except Exception as e:
         # Graceful fallback
         mr.ai_validation_status = "needs_review"
         mr.ai_validation_feedback = f"Automatic AI validation failed: {e}. Manual review required."
-        db.commit()
-        db.refresh(mr)
+        await db.commit()
+        await db.refresh(mr)
         return {"message": "AI validation failed - fallback to needs_review", "error": str(e), "merge_request_id": mr.id, "ai_status": mr.ai_validation_status}
 
 @router.post("/{mr_id}/comments", response_model=Comment)
@@ -352,12 +386,14 @@ async def add_comment(
     mr_id: str,
     comment_data: CommentCreate,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add a comment to a merge request"""
-    mr = db.query(MergeRequestModel).filter(MergeRequestModel.id == mr_id).first()
+    mr = await db.get(MergeRequestModel, mr_id)
     if not mr:
         raise HTTPException(status_code=404, detail="Merge request not found")
+    await access.require_read(mr.target_repo_id)
     db_comment = CommentModel(
         merge_request_id=mr_id,
         author_id=current_user.id,
@@ -366,10 +402,10 @@ async def add_comment(
         file_path=comment_data.file_path
     )
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
+    await db.commit()
+    db_comment = await db.get(CommentModel, db_comment.id, options=comment_options(), populate_existing=True)
     # Audit log for comment add
-    log_activity(
+    await log_activity(
         db=db,
         action="merge_request_comment_add",
         user_id=current_user.id,
@@ -385,45 +421,54 @@ async def add_comment(
 @router.get("/{mr_id}/versions", response_model=List[MergeRequestVersionSchema])
 async def list_merge_request_versions(
     mr_id: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db),
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None
 ):
     """List all versions of a merge request by mr_id"""
-    versions = db.query(MergeRequestVersion).filter(MergeRequestVersion.merge_request_id == mr_id).order_by(MergeRequestVersion.version_number.desc()).offset(skip).limit(limit).all()
-    return versions
+    target_repo_id = await db.scalar(
+        select(MergeRequestModel.target_repo_id).where(MergeRequestModel.id == mr_id).limit(1)
+    )
+    if not target_repo_id:
+        raise HTTPException(status_code=404, detail="Merge request not found")
+    await access.require_read(target_repo_id)
+    query = keyset_paginate(
+        select(MergeRequestVersion)
+        .options(*merge_request_version_options())
+        .where(MergeRequestVersion.merge_request_id == mr_id),
+        MergeRequestVersion.version_number, MergeRequestVersion.id,
+        cursor=cursor, limit=limit, skip=skip, dialect_name=db.bind.dialect.name
+    )
+    return finish_page((await db.scalars(query)).all(), limit, response, "version_number")
 
 @router.post("/{mr_id}/restore/{version_number}")
 async def restore_merge_request_version(
     mr_id: str,
     version_number: int,
     current_user: UserModel = Depends(contributor_required),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Restore a merge request to a previous version by version_number"""
-    mr = db.query(MergeRequestModel).filter(MergeRequestModel.id == mr_id).first()
+    mr = await db.get(MergeRequestModel, mr_id)
     if not mr:
         raise HTTPException(status_code=404, detail="Merge request not found")
-    version = db.query(MergeRequestVersion).filter(MergeRequestVersion.merge_request_id == mr_id, MergeRequestVersion.version_number == version_number).first()
+    if mr.author_id != current_user.id and not await access.is_owner(mr.target_repo_id):
+        raise HTTPException(status_code=403, detail="Insufficient permissions to restore this merge request")
+    version = await db.scalar(select(MergeRequestVersion).where(
+        MergeRequestVersion.merge_request_id == mr_id,
+        MergeRequestVersion.version_number == version_number
+    ).limit(1))
     if not version:
         raise HTTPException(status_code=404, detail="Version not found")
     # Save current as new version before restoring
-    last_version = db.query(MergeRequestVersion).filter(MergeRequestVersion.merge_request_id == mr_id).order_by(MergeRequestVersion.version_number.desc()).first()
-    next_version = (last_version.version_number + 1) if last_version else 1
-    mr_version = MergeRequestVersion(
-        merge_request_id=mr_id,
-        version_number=next_version,
-        title=mr.title,
-        description=mr.description,
-        status=mr.status,
-        ai_validation_status=mr.ai_validation_status,
-        ai_validation_score=mr.ai_validation_score,
-        ai_validation_feedback=mr.ai_validation_feedback,
-        ai_validation_concerns=mr.ai_validation_concerns,
-        ai_validation_suggestions=mr.ai_validation_suggestions,
-        author_id=current_user.id
-    )
+    next_version = await _latest_version_number(db, mr_id) + 1
+    mr_version = _version_of(mr, next_version, current_user.id)
     db.add(mr_version)
+    previous_status = mr.status
     # Restore fields
     mr.title = version.title
     mr.description = version.description
@@ -433,10 +478,13 @@ async def restore_merge_request_version(
     mr.ai_validation_feedback = version.ai_validation_feedback
     mr.ai_validation_concerns = version.ai_validation_concerns
     mr.ai_validation_suggestions = version.ai_validation_suggestions
-    db.commit()
-    db.refresh(mr)
+    # The restored state is a version too, like merge and close (dashboard lead time reads status changes)
+    restored_version = next_version + 1
+    db.add(_version_of(mr, restored_version, current_user.id))
+    await db.commit()
+    await db.refresh(mr)
     # Audit log for MR restore
-    log_activity(
+    await log_activity(
         db=db,
         action="merge_request_restore_version",
         user_id=current_user.id,
@@ -444,14 +492,16 @@ async def restore_merge_request_version(
         details={
             "merge_request_id": mr.id,
             "restored_version": version_number,
-            "current_version": next_version
+            "current_version": restored_version,
+            "status": mr.status,
+            "previous_status": previous_status
         }
     )
-    return {"message": f"Merge request restored to version {version_number}", "merge_request": mr.id, "current_version": next_version}
+    return {"message": f"Merge request restored to version {version_number}", "merge_request": mr.id, "current_version": restored_version}
 
 async def send_mr_status_webhook(mr, status: str, db):
     # Get user email (author of MR)
-    user = db.query(UserModel).filter(UserModel.id == mr.author_id).first()
+    user = await db.get(UserModel, mr.author_id)
     to_email = user.email if user and hasattr(user, 'email') else None
     webhook_data = {
         "merge_request_id": mr.id,
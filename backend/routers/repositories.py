@@ -1,35 +1,49 @@
 # backend/routers/repositories.py (Complete Fixed Version)
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import logging
 
-from database import get_db
-from models import Repository as RepositoryModel, User as UserModel, RepositoryCollaborator, AuditEntry as AuditEntryModel
+from database import get_async_db
+from models import Repository as RepositoryModel, User as UserModel, AuditEntry as AuditEntryModel
 from schemas import Repository, RepositoryCreate, RepositoryUpdate
 from auth import verify_clerk_token, contributor_required
+from access_control import AccessControl, get_access
 from audit import log_activity
+from audit_query import AuditQuery
+from audit_stream import open_stream
+from loaders import repository_options
+from pagination import keyset_paginate, finish_page
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+
+async def _load_repository(db: AsyncSession, repo_id: str) -> Optional[RepositoryModel]:
+    """Load a repository with the owner/collaborator graph needed by the response schema"""
+    return await db.get(RepositoryModel, repo_id, options=repository_options(), populate_existing=True)
+
+
+
 @router.post("/", response_model=Repository, status_code=status.HTTP_201_CREATED)
 async def create_repository(
     repo_data: RepositoryCreate,
     current_user: UserModel = Depends(contributor_required),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new repository"""
     try:
         logger.info(f"Creating repository: {repo_data.dict()} for user: {current_user.email}")
         
         # Check if repository name is unique for this user
-        existing_repo = db.query(RepositoryModel).filter(
+        existing_repo = await db.scalar(select(RepositoryModel).where(
             RepositoryModel.name == repo_data.name,
             RepositoryModel.owner_id == current_user.id
-        ).first()
+        ).limit(1))
         
         if existing_repo:
             raise HTTPException(
@@ -45,13 +59,13 @@ async def create_repository(
         )
         
         db.add(db_repo)
-        db.commit()
-        db.refresh(db_repo)
+        await db.commit()
+        db_repo = await _load_repository(db, db_repo.id)
 
         logger.info(f"Repository created successfully: {db_repo.id}")
 
         # Audit log for repository creation
-        log_activity(
+        await log_activity(
             db=db,
             action="repository_create",
             user_id=current_user.id,
@@ -69,7 +83,7 @@ async def create_repository(
         raise
     except Exception as e:
         logger.error(f"Error creating repository: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create repository"
@@ -78,41 +92,43 @@ async def create_repository(
 
 @router.get("/", response_model=List[Repository])
 async def list_repositories(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     is_private: Optional[bool] = None,
     owner_id: Optional[str] = None,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List repositories with optional filters"""
     try:
         logger.info(f"Listing repositories for user: {current_user.email}")
         
-        query = db.query(RepositoryModel).options(
-            joinedload(RepositoryModel.owner),
-            joinedload(RepositoryModel.collaborators)
-        )
+        query = select(RepositoryModel).options(*repository_options())
 
         # Filter by privacy (only show public repos unless user is owner/collaborator)
         if is_private is not None:
-            query = query.filter(RepositoryModel.is_private == is_private)
+            query = query.where(RepositoryModel.is_private == is_private)
         else:
             # Show public repos + user's private repos + repos shared with user
-            query = query.filter(
-                (RepositoryModel.is_private == False) |
-                (RepositoryModel.owner_id == current_user.id) |
-                (RepositoryModel.collaborators.any(RepositoryCollaborator.user_id == current_user.id))
-            )
+            query = query.where(access.readable_filter())
         
         if owner_id:
-            query = query.filter(RepositoryModel.owner_id == owner_id)
+            query = query.where(RepositoryModel.owner_id == owner_id)
         
-        repositories = query.offset(skip).limit(limit).all()
+        query = keyset_paginate(
+            query, RepositoryModel.created_at, RepositoryModel.id,
+            cursor=cursor, limit=limit, skip=skip, dialect_name=db.bind.dialect.name
+        )
+        repositories = finish_page((await db.scalars(query)).all(), limit, response, "created_at")
         
         logger.info(f"Found {len(repositories)} repositories")
         return repositories
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing repositories: {str(e)}")
         raise HTTPException(
@@ -124,15 +140,12 @@ async def list_repositories(
 @router.get("/{repo_id}", response_model=Repository)
 async def get_repository(
     repo_id: str,
-    current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get repository by ID"""
     try:
-        repo = db.query(RepositoryModel).options(
-            joinedload(RepositoryModel.owner),
-            joinedload(RepositoryModel.collaborators)
-        ).filter(RepositoryModel.id == repo_id).first()
+        repo = await _load_repository(db, repo_id)
 
         if not repo:
             raise HTTPException(
@@ -140,25 +153,14 @@ async def get_repository(
                 detail="Repository not found"
             )
         
-        # Check access permissions for private repos
-        if repo.is_private and repo.owner_id != current_user.id:
-            is_collaborator = db.query(RepositoryCollaborator).filter(
-                RepositoryCollaborator.repository_id == repo_id,
-                RepositoryCollaborator.user_id == current_user.id
-            ).first()
-            
-            if not is_collaborator:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Access denied to private repository"
-                )
+        await access.require_read(repo)
         
         return repo
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error updating repository {repo_id}: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update repository"
@@ -170,11 +172,12 @@ async def update_repository(
     repo_id: str,
     repo_update: RepositoryUpdate,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update repository (owner only)"""
     try:
-        repo = db.query(RepositoryModel).filter(RepositoryModel.id == repo_id).first()
+        repo = await db.get(RepositoryModel, repo_id)
         
         if not repo:
             raise HTTPException(
@@ -182,22 +185,18 @@ async def update_repository(
                 detail="Repository not found"
             )
         
-        if repo.owner_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Only repository owner can update repository"
-            )
+        await access.require_owner(repo, detail="Only repository owner can update repository")
         
         # Use model_dump() for Pydantic v2 compatibility
         update_data = repo_update.model_dump(exclude_unset=True) if hasattr(repo_update, 'model_dump') else repo_update.dict(exclude_unset=True)
         
         # Check if name is being changed and if it's unique
         if "name" in update_data:
-            existing_repo = db.query(RepositoryModel).filter(
+            existing_repo = await db.scalar(select(RepositoryModel).where(
                 RepositoryModel.name == update_data["name"],
                 RepositoryModel.owner_id == current_user.id,
                 RepositoryModel.id != repo_id
-            ).first()
+            ).limit(1))
             if existing_repo:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -207,11 +206,11 @@ async def update_repository(
         for field, value in update_data.items():
             setattr(repo, field, value)
         
-        db.commit()
-        db.refresh(repo)
+        await db.commit()
+        repo = await _load_repository(db, repo_id)
 
         # Audit log for repository update
-        log_activity(
+        await log_activity(
             db=db,
             action="repository_update",
             user_id=current_user.id,
@@ -237,29 +236,21 @@ async def update_repository(
 @router.get("/{repo_id}/audit")
 async def list_repository_audit(
     repo_id: str,
-    limit: int = 50,
-    current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    response: Response,
+    filters: AuditQuery = Depends(),
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Return recent audit entries for a repository (Case History feed)."""
-    repo = db.query(RepositoryModel).filter(RepositoryModel.id == repo_id).first()
-    if not repo:
-        raise HTTPException(status_code=404, detail="Repository not found")
-    # Basic access reuse: if private verify access
-    if repo.is_private and repo.owner_id != current_user.id:
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == repo_id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-        if not is_collaborator:
-            raise HTTPException(status_code=403, detail="Access denied to private repository")
-    entries = (
-        db.query(AuditEntryModel)
-        .filter(AuditEntryModel.repository_id == repo_id)
-        .order_by(AuditEntryModel.created_at.desc())
-        .limit(limit)
-        .all()
+    """Return recent audit entries for a repository (Case History feed), filtered like /api/audit."""
+    filters.repository_id = repo_id
+    query = keyset_paginate(
+        select(AuditEntryModel).where(*await filters.visible_criteria(access)),
+        AuditEntryModel.created_at, AuditEntryModel.id,
+        cursor=cursor, limit=limit, dialect_name=db.bind.dialect.name
     )
+    entries = finish_page((await db.scalars(query)).all(), limit, response, "created_at")
     return [
         {
             "id": e.id,
@@ -272,15 +263,42 @@ async def list_repository_audit(
     ]
 
 
+@router.get("/{repo_id}/audit/stream")
+async def stream_repository_audit(
+    repo_id: str,
+    cursor: Optional[str] = None,
+    backlog: int = Query(0, ge=0, le=200),
+    last_event_id: Optional[str] = Header(None),
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Live Case History feed as server-sent events.
+
+    Starts after ``cursor`` (an event id, or a cursor from the audit list) or
+    with the ``backlog`` latest entries, then pushes entries as they are
+    written. ``Last-Event-ID`` takes precedence so reconnects resume.
+    """
+    await access.require_read(repo_id)
+    events = open_stream(repo_id, cursor=last_event_id or cursor, backlog=backlog)
+    # The stream reads with its own short sessions; don't pin this one until the client leaves
+    await db.close()
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.delete("/{repo_id}")
 async def delete_repository(
     repo_id: str,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete repository (owner only)"""
     try:
-        repo = db.query(RepositoryModel).filter(RepositoryModel.id == repo_id).first()
+        repo = await db.get(RepositoryModel, repo_id)
         
         if not repo:
             raise HTTPException(
@@ -288,20 +306,16 @@ async def delete_repository(
                 detail="Repository not found"
             )
         
-        if repo.owner_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Only repository owner can delete repository"
-            )
+        await access.require_owner(repo, detail="Only repository owner can delete repository")
         
         # Store repo info for audit log before deletion
         repo_name = repo.name
         
-        db.delete(repo)
-        db.commit()
+        await db.delete(repo)
+        await db.commit()
 
         # Audit log for repository deletion
-        log_activity(
+        await log_activity(
             db=db,
             action="repository_delete",
             user_id=current_user.id,
@@ -309,7 +323,8 @@ async def delete_repository(
             details={
                 "repository_id": repo_id,
                 "name": repo_name
-            }
+            },
+            durable=True
         )
         
         return {"message": "Repository deleted successfully"}
@@ -318,7 +333,7 @@ async def delete_repository(
         raise
     except Exception as e:
         logger.error(f"Error deleting repository {repo_id}: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete repository"
@@ -329,13 +344,12 @@ async def delete_repository(
 async def fork_repository(
     repo_id: str,
     current_user: UserModel = Depends(contributor_required),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Fork a repository"""
     try:
-        original_repo = db.query(RepositoryModel).options(
-            joinedload(RepositoryModel.owner)
-        ).filter(RepositoryModel.id == repo_id).first()
+        original_repo = await _load_repository(db, repo_id)
         
         if not original_repo:
             raise HTTPException(
@@ -343,11 +357,13 @@ async def fork_repository(
                 detail="Repository not found"
             )
         
+        await access.require_read(original_repo)
+        
         # Check if user already has a fork
-        existing_fork = db.query(RepositoryModel).filter(
+        existing_fork = await db.scalar(select(RepositoryModel).where(
             RepositoryModel.forked_from_id == repo_id,
             RepositoryModel.owner_id == current_user.id
-        ).first()
+        ).limit(1))
         
         if existing_fork:
             raise HTTPException(
@@ -358,10 +374,10 @@ async def fork_repository(
         # Create fork with unique name
         fork_name = f"{original_repo.name}-fork"
         counter = 1
-        while db.query(RepositoryModel).filter(
+        while await db.scalar(select(RepositoryModel.id).where(
             RepositoryModel.name == fork_name,
             RepositoryModel.owner_id == current_user.id
-        ).first():
+        ).limit(1)):
             fork_name = f"{original_repo.name}-fork-{counter}"
             counter += 1
         
@@ -378,11 +394,11 @@ async def fork_repository(
         # Increment fork count on original repo
         original_repo.fork_count += 1
         
-        db.commit()
-        db.refresh(fork_repo)
+        await db.commit()
+        fork_repo = await _load_repository(db, fork_repo.id)
 
         # Audit log for repository fork
-        log_activity(
+        await log_activity(
             db=db,
             action="repository_fork",
             user_id=current_user.id,
@@ -400,7 +416,7 @@ async def fork_repository(
         raise
     except Exception as e:
         logger.error(f"Error forking repository {repo_id}: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fork repository"
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Query, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, func, select
+from sqlalchemy.orm import defer
 from typing import Optional, List
 
-from database import get_db
-from models import Repository as RepositoryModel, RepositoryFile as RepositoryFileModel, MergeRequest as MergeRequestModel, User as UserModel
-from auth import verify_clerk_token
+from database import get_read_db
+from models import Repository as RepositoryModel, RepositoryFile as RepositoryFileModel, MergeRequest as MergeRequestModel
+from access_control import AccessControl, get_read_access
+from loaders import parse_include
 
 router = APIRouter()
 
@@ -13,34 +15,50 @@ router = APIRouter()
 async def search_content(
     q: str = Query(..., min_length=3),
     type: Optional[str] = Query(None),  # "repositories", "files", "merge_requests"
-    current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    include: Optional[str] = Query(None, description="Comma separated extra fields; 'content' returns file content"),
+    access: AccessControl = Depends(get_read_access),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Full-text search across repositories, files, and merge requests"""
     results = {}
+    hit_repo_ids = set()
     query_str = f"%{q.lower()}%"
 
     if type in (None, "repositories"):
-        repos = db.query(RepositoryModel).filter(
+        repos = (await db.scalars(select(RepositoryModel).where(
             or_(func.lower(RepositoryModel.name).like(query_str),
-                func.lower(RepositoryModel.description).like(query_str))
-        ).all()
+                func.lower(RepositoryModel.description).like(query_str)),
+            access.readable_filter()
+        ))).all()
         results["repositories"] = repos
 
     if type in (None, "files"):
-        files = db.query(RepositoryFileModel).filter(
+        query = select(RepositoryFileModel)
+        if "content" not in parse_include(include):
+            # Match on content without shipping it back for every hit
+            query = query.options(defer(RepositoryFileModel.content, raiseload=True))
+        files = (await db.scalars(query.where(
             or_(func.lower(RepositoryFileModel.name).like(query_str),
                 func.lower(RepositoryFileModel.content).like(query_str),
                 func.lower(RepositoryFileModel.path).like(query_str))
-        ).all()
+        ))).all()
         results["files"] = files
+        hit_repo_ids.update(f.repository_id for f in files)
 
     if type in (None, "merge_requests"):
-        mrs = db.query(MergeRequestModel).filter(
+        mrs = (await db.scalars(select(MergeRequestModel).where(
             or_(func.lower(MergeRequestModel.title).like(query_str),
                 func.lower(MergeRequestModel.description).like(query_str))
-        ).all()
+        ))).all()
         results["merge_requests"] = mrs
+        hit_repo_ids.update(mr.target_repo_id for mr in mrs)
+
+    # Drop hits in repositories the caller cannot read, with one lookup for all of them
+    readable = await access.filter_readable(hit_repo_ids)
+    if "files" in results:
+        results["files"] = [f for f in results["files"] if f.repository_id in readable]
+    if "merge_requests" in results:
+        results["merge_requests"] = [mr for mr in results["merge_requests"] if mr.target_repo_id in readable]
 
     return results
 
@@ -1,19 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 import os
 import uuid
 import shutil
 from pathlib import Path
 
-from database import get_db
-from models import RepositoryFile as RepositoryFileModel, User as UserModel, Repository as RepositoryModel, \
-    RepositoryCollaborator, FileVersion
-from schemas import RepositoryFile, FileVersion as FileVersionSchema
-from auth import verify_clerk_token, contributor_required
+from database import get_async_db
+from models import RepositoryFile as RepositoryFileModel, User as UserModel, FileVersion
+from schemas import RepositoryFile, FileVersion as FileVersionSchema, FileVersionSummary
+from auth import contributor_required
+from access_control import AccessControl, get_access
 from document_parser import DocumentParser, DocumentVersionService
 from ai_service import EnhancedAIService
 from audit import log_activity
+from loaders import repository_file_options, file_version_options, file_version_summary_options, parse_include
+from pagination import keyset_paginate, finish_page
 
 router = APIRouter()
 document_parser = DocumentParser()
@@ -29,13 +32,25 @@ ALLOWED_EXTENSIONS = {'.pdf', '.docx', '.doc', '.txt', '.md', '.json', '.csv'}
 os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
 
 
+
+async def _latest_version_number(db: AsyncSession, file_id: str) -> int:
+    last_version = await db.scalar(
+        select(FileVersion.version_number)
+        .where(FileVersion.file_id == file_id)
+        .order_by(FileVersion.version_number.desc())
+        .limit(1)
+    )
+    return last_version or 0
+
+
 @router.post("/upload/{repository_id}")
 async def upload_file(
         repository_id: str,
         file: UploadFile = File(...),
         path: str = Form("/"),
         current_user: UserModel = Depends(contributor_required),
-        db: Session = Depends(get_db)
+        access: AccessControl = Depends(get_access),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Upload a file to a repository"""
 
@@ -54,25 +69,9 @@ async def upload_file(
             detail=f"File type {file_extension} not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
         )
 
-    # Check repository exists and permissions
-    repo = db.query(RepositoryModel).filter(RepositoryModel.id == repository_id).first()
-    if not repo:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Repository not found"
-        )
-
-    # Check permissions
-    if repo.owner_id != current_user.id:
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == repository_id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-        if not is_collaborator:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Insufficient permissions to upload files to this repository"
-            )
+    await access.require_write(
+        repository_id, detail="Insufficient permissions to upload files to this repository"
+    )
 
     # Read file content
     file_content = await file.read()
@@ -89,10 +88,10 @@ async def upload_file(
 
     # Check if file already exists at this path
     file_path = f"{path.rstrip('/')}/{file.filename}"
-    existing_file = db.query(RepositoryFileModel).filter(
+    existing_file = await db.scalar(select(RepositoryFileModel).where(
         RepositoryFileModel.repository_id == repository_id,
         RepositoryFileModel.path == file_path
-    ).first()
+    ).limit(1))
 
     old_content = None
     if existing_file:
@@ -147,8 +146,7 @@ async def upload_file(
             existing_file.storage_path = str(storage_path)
             db_file = existing_file
             # Versioning: get latest version number
-            last_version = db.query(FileVersion).filter(FileVersion.file_id == existing_file.id).order_by(FileVersion.version_number.desc()).first()
-            next_version = (last_version.version_number + 1) if last_version else 1
+            next_version = await _latest_version_number(db, existing_file.id) + 1
             file_version = FileVersion(
                 file_id=existing_file.id,
                 version_number=next_version,
@@ -182,11 +180,11 @@ async def upload_file(
             )
             db.add(file_version)
 
-        db.commit()
-        db.refresh(db_file)
+        await db.commit()
+        db_file = await db.get(RepositoryFileModel, db_file.id, options=repository_file_options(), populate_existing=True)
 
         # Audit log for file upload/update
-        log_activity(
+        await log_activity(
             db=db,
             action="file_upload" if not existing_file else "file_update",
             user_id=current_user.id,
@@ -229,7 +227,8 @@ async def batch_upload_files(
         files: List[UploadFile] = File(...),
         path: str = Form("/"),
         current_user: UserModel = Depends(contributor_required),
-        db: Session = Depends(get_db)
+        access: AccessControl = Depends(get_access),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Upload multiple files to a repository"""
 
@@ -245,7 +244,7 @@ async def batch_upload_files(
     for file in files:
         try:
             # Process each file individually
-            result = await upload_file(repository_id, file, path, current_user, db)
+            result = await upload_file(repository_id, file, path, current_user, access, db)
             results.append({
                 "filename": file.filename,
                 "status": "success",
@@ -270,14 +269,12 @@ async def batch_upload_files(
 @router.get("/download/{file_id}")
 async def download_file(
         file_id: str,
-        current_user: UserModel = Depends(verify_clerk_token),
-        db: Session = Depends(get_db)
+        access: AccessControl = Depends(get_access),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Download a file by ID"""
 
-    file_record = db.query(RepositoryFileModel).filter(
-        RepositoryFileModel.id == file_id
-    ).first()
+    file_record = await db.get(RepositoryFileModel, file_id)
 
     if not file_record:
         raise HTTPException(
@@ -285,19 +282,7 @@ async def download_file(
             detail="File not found"
         )
 
-    # Check repository access
-    repo = file_record.repository
-    if repo.is_private and repo.owner_id != current_user.id:
-        is_collaborator = db.query(RepositoryCollaborator).filter(
-            RepositoryCollaborator.repository_id == repo.id,
-            RepositoryCollaborator.user_id == current_user.id
-        ).first()
-
-        if not is_collaborator:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You do not have access to this file."
-            )
+    await access.require_read(file_record.repository_id, detail="You do not have access to this file.")
 
     # Return file as response
     from fastapi.responses import FileResponse
@@ -315,16 +300,33 @@ async def download_file(
     )
 
 
-@router.get("/file/{file_id}/versions", response_model=List[FileVersionSchema])
+@router.get("/file/{file_id}/versions", response_model=List[Union[FileVersionSchema, FileVersionSummary]])
 async def list_file_versions(
     file_id: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db),
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include: Optional[str] = Query(None, description="Comma separated extra fields; 'content' returns version content")
 ):
-    """List all versions of a file by file_id"""
-    versions = db.query(FileVersion).filter(FileVersion.file_id == file_id).order_by(FileVersion.version_number.desc()).offset(skip).limit(limit).all()
-    return versions
+    """List all versions of a file by file_id (without content unless ?include=content)"""
+    repository_id = await db.scalar(select(RepositoryFileModel.repository_id).where(RepositoryFileModel.id == file_id))
+    if not repository_id:
+        raise HTTPException(status_code=404, detail="File not found")
+    await access.require_read(repository_id)
+    with_content = "content" in parse_include(include)
+    query = keyset_paginate(
+        select(FileVersion)
+        .options(*(file_version_options() if with_content else file_version_summary_options()))
+        .where(FileVersion.file_id == file_id),
+        FileVersion.version_number, FileVersion.id,
+        cursor=cursor, limit=limit, skip=skip, dialect_name=db.bind.dialect.name
+    )
+    versions = finish_page((await db.scalars(query)).all(), limit, response, "version_number")
+    schema = FileVersionSchema if with_content else FileVersionSummary
+    return [schema.model_validate(version) for version in versions]
 
 
 @router.post("/file/{file_id}/restore/{version_number}")
@@ -332,18 +334,22 @@ async def restore_file_version(
     file_id: str,
     version_number: int,
     current_user: UserModel = Depends(contributor_required),
-    db: Session = Depends(get_db)
+    access: AccessControl = Depends(get_access),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Restore a file to a previous version by version_number"""
-    file = db.query(RepositoryFileModel).filter(RepositoryFileModel.id == file_id).first()
+    file = await db.get(RepositoryFileModel, file_id)
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
-    version = db.query(FileVersion).filter(FileVersion.file_id == file_id, FileVersion.version_number == version_number).first()
+    await access.require_write(file.repository_id, detail="Insufficient permissions to restore this file")
+    version = await db.scalar(select(FileVersion).where(
+        FileVersion.file_id == file_id,
+        FileVersion.version_number == version_number
+    ).limit(1))
     if not version:
         raise HTTPException(status_code=404, detail="Version not found")
     # Save current as new version before restoring
-    last_version = db.query(FileVersion).filter(FileVersion.file_id == file_id).order_by(FileVersion.version_number.desc()).first()
-    next_version = (last_version.version_number + 1) if last_version else 1
+    next_version = await _latest_version_number(db, file_id) + 1
     file_version = FileVersion(
         file_id=file_id,
         version_number=next_version,
@@ -354,10 +360,10 @@ async def restore_file_version(
     db.add(file_version)
     # Restore content
     file.content = version.content
-    db.commit()
-    db.refresh(file)
+    await db.commit()
+    await db.refresh(file)
     # Audit log for file restore
-    log_activity(
+    await log_activity(
         db=db,
         action="file_restore_version",
         user_id=current_user.id,
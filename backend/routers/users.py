@@ -1,22 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
-from database import get_db
+from database import get_async_db
 from models import User as UserModel
 from schemas import User, UserCreate, UserUpdate
-from auth import verify_clerk_token, admin_required
+from auth import verify_clerk_token, admin_required, invalidate_user
+from pagination import keyset_paginate, finish_page
 
 router = APIRouter()
 
 @router.post("/", response_model=User)
 async def create_user(
     user_data: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new user (typically called by Clerk webhook)"""
     # Check if user already exists
-    existing_user = db.query(UserModel).filter(UserModel.clerk_id == user_data.clerk_id).first()
+    existing_user = await db.scalar(select(UserModel.id).where(UserModel.clerk_id == user_data.clerk_id).limit(1))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -24,7 +26,7 @@ async def create_user(
         )
     
     # Check if username is taken
-    username_taken = db.query(UserModel).filter(UserModel.username == user_data.username).first()
+    username_taken = await db.scalar(select(UserModel.id).where(UserModel.username == user_data.username).limit(1))
     if username_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -34,8 +36,8 @@ async def create_user(
     # Create new user
     db_user = UserModel(**user_data.dict())
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
@@ -50,50 +52,58 @@ async def get_current_user(
 async def update_current_user(
     user_update: UserUpdate,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update current user profile"""
     update_data = user_update.dict(exclude_unset=True)
     
     # Check if username is being changed and if it's available
     if "username" in update_data:
-        existing_user = db.query(UserModel).filter(
+        existing_user = await db.scalar(select(UserModel.id).where(
             UserModel.username == update_data["username"],
             UserModel.id != current_user.id
-        ).first()
+        ).limit(1))
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Username already taken"
             )
     
+    # current_user is detached (see verify_clerk_token); update this session's copy
+    user = await db.get(UserModel, current_user.id)
     for field, value in update_data.items():
-        setattr(current_user, field, value)
+        setattr(user, field, value)
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user(user.clerk_id)
     
-    return current_user
+    return user
 
 @router.get("/", response_model=List[User])
 async def list_users(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     current_user: UserModel = Depends(admin_required),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List all users (admin only)"""
-    users = db.query(UserModel).offset(skip).limit(limit).all()
-    return users
+    query = keyset_paginate(
+        select(UserModel), UserModel.created_at, UserModel.id,
+        cursor=cursor, limit=limit, skip=skip, dialect_name=db.bind.dialect.name
+    )
+    return finish_page((await db.scalars(query)).all(), limit, response, "created_at")
 
 @router.get("/{user_id}", response_model=User)
 async def get_user(
     user_id: str,
     current_user: UserModel = Depends(verify_clerk_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user by ID"""
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    user = await db.get(UserModel, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
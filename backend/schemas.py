@@ -56,6 +56,14 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class UserSummary(BaseModel):
+    """Just enough of a user to label a row in a list"""
+    id: str
+    username: str
+
+    class Config:
+        from_attributes = True
+
 # Repository schemas
 class RepositoryBase(BaseModel):
     name: str
@@ -109,6 +117,22 @@ class RepositoryFile(RepositoryFileBase):
     class Config:
         from_attributes = True
 
+class RepositoryFileSummary(BaseModel):
+    """RepositoryFile without its content, for list endpoints"""
+    id: str
+    repository_id: str
+    name: str
+    path: str
+    file_type: FileType
+    size: int
+    author_id: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    author: UserSummary
+
+    class Config:
+        from_attributes = True
+
 # Merge Request schemas
 class MergeRequestBase(BaseModel):
     title: str
@@ -263,6 +287,19 @@ class FileVersion(FileVersionBase):
     class Config:
         from_attributes = True
 
+class FileVersionSummary(BaseModel):
+    """FileVersion without its content, for list endpoints"""
+    id: str
+    file_id: str
+    version_number: int
+    commit_message: str
+    author_id: str
+    created_at: datetime
+    author: Optional[UserSummary] = None
+
+    class Config:
+        from_attributes = True
+
 # Commit schemas
 class CommitBase(BaseModel):
     sha: str
@@ -306,6 +343,20 @@ class CommitFile(CommitFileBase):
     class Config:
         from_attributes = True
 
+class CommitFileSummary(BaseModel):
+    """CommitFile without its diff, for list endpoints"""
+    id: str
+    commit_id: str
+    file_id: str
+    previous_file_id: Optional[str] = None
+    file_path: str
+    change_type: ChangeType
+    additions: int = 0
+    deletions: int = 0
+
+    class Config:
+        from_attributes = True
+
 # Commit Graph schemas
 class CommitGraphBase(BaseModel):
     graph_data: Dict[str, Any]
@@ -318,6 +369,11 @@ class CommitGraphCreate(CommitGraphBase):
 class CommitGraph(CommitGraphBase):
     id: str
     repository_id: str
+    commit_count: int = 0
+    version: int = 0
+    layer_count: int = 0
+    lane_count: int = 0
+    layout_height: float = 0.0
     last_updated: datetime
     created_at: datetime
 
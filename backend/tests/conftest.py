@@ -0,0 +1,269 @@
+"""Test harness: the real FastAPI app on a shared in-memory SQLite database.
+
+The environment is configured before ``main`` is imported so that both the
+sync and the async engine point at the same in-memory database, and the
+Gemini-backed ``EnhancedAIService`` is replaced by ``FakeAIService`` so no
+test talks to the network. Session tokens are real RS256 JWTs signed with a
+key pair generated here and served to the app through ``jwks.jwks_cache``.
+"""
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+os.environ["DATABASE_URL"] = "sqlite:///file:osinthub_tests?mode=memory&cache=shared&uri=true"
+os.environ["GOOGLE_API_KEY"] = "test"
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+os.environ.pop("AUTH_DEV_BYPASS", None)
+TEST_ISSUER = "https://clerk.osinthub.test"
+os.environ["CLERK_ISSUER"] = TEST_ISSUER
+os.environ["CLERK_JWKS_URL"] = f"{TEST_ISSUER}/.well-known/jwks.json"
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+
+class FakeAIService:
+    """Deterministic stand-in for EnhancedAIService"""
+
+    async def validate_merge_request(self, **kwargs):
+        return {"status": "approved", "score": 90.0, "feedback": "ok", "concerns": [], "suggestions": []}
+
+    async def analyze_document_credibility(self, content, filename):
+        return {"credibility_score": 1.0}
+
+    async def detect_sensitive_information(self, content):
+        return {"has_sensitive_info": False}
+
+    async def generate_repository_chatbot_response(self, question, repository_data, commits_data, files_data):
+        return f"{len(files_data)} files, {len(commits_data)} commits"
+
+    async def generate_repository_chatbot_response_stream(self, question, repository_data, commits_data, files_data):
+        yield f"{len(files_data)} files, {len(commits_data)} commits"
+
+
+import ai_service
+
+ai_service.EnhancedAIService = FakeAIService
+
+# upload_file creates its upload directory relative to the working directory on import
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix="osinthub-tests-"))
+import main
+os.chdir(_cwd)
+import audit
+import auth
+import jwks
+from routers import dashboard
+from database import engine, async_engine, SessionLocal
+from models import (
+    Base, User, Repository, RepositoryCollaborator, RepositoryFile, FileVersion, MergeRequest,
+    MergeRequestVersion, Commit, CommitFile, AuditEntry
+)
+
+TEST_USER_CLERK_ID = "test_user_123"
+
+
+class SigningKeys:
+    """RSA key pairs published through a local JWKS document"""
+
+    def __init__(self):
+        self.private_keys = {}
+        self.jwks = {"keys": []}
+
+    def add(self, kid: str):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.private_keys[kid] = private_key
+        jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+        self.jwks["keys"].append({**jwk, "kid": kid, "use": "sig", "alg": "RS256"})
+        return private_key
+
+    async def fetch(self):
+        return self.jwks
+
+
+signing_keys = SigningKeys()
+signing_keys.add("test-key-1")
+jwks.jwks_cache = jwks.JWKSCache(os.environ["CLERK_JWKS_URL"], min_refresh_seconds=0, fetch=signing_keys.fetch)
+
+
+def make_token(subject: str = TEST_USER_CLERK_ID, kid: str = "test-key-1", private_key=None,
+               expires_in: int = 3600, **claims) -> str:
+    """A Clerk-style session token for ``subject``"""
+    now = int(time.time())
+    payload = {"sub": subject, "iss": TEST_ISSUER, "iat": now, "nbf": now, "exp": now + expires_in,
+               "sid": uuid.uuid4().hex, **claims}
+    return jwt.encode(payload, private_key or signing_keys.private_keys[kid], algorithm="RS256",
+                      headers={"kid": kid})
+
+
+def bearer(token: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+AUTH_HEADERS = bearer(make_token())
+
+
+@dataclass
+class SeededData:
+    """Ids of the rows created by ``seed``; path templates are formatted with ``ids``"""
+    size: int
+    ids: Dict[str, str] = field(default_factory=dict)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __len__(self):
+        return len(self.statements)
+
+
+def _seed(size: int) -> SeededData:
+    """Reset the database and create a dataset where every collection has ``size`` rows"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    # Cached users point at rows that no longer exist
+    auth.user_cache.clear()
+    dashboard.stats_cache.clear()
+    data = SeededData(size=size)
+    now = datetime.utcnow()
+
+    db = SessionLocal()
+    try:
+        me = User(clerk_id=TEST_USER_CLERK_ID, username="testuser", email="test@example.com", role="admin")
+        others = [
+            User(clerk_id=f"seed_{i}", username=f"seed_user_{i}", email=f"seed_{i}@example.com", role="contributor")
+            for i in range(size)
+        ]
+        db.add_all([me, *others])
+        db.flush()
+
+        repo = Repository(name="seeded-case", description="seeded", owner_id=me.id, is_private=False)
+        extra_repos = [
+            Repository(name=f"seeded-case-{i}", description="seeded", owner_id=others[i].id, is_private=False)
+            for i in range(size)
+        ]
+        db.add_all([repo, *extra_repos])
+        db.flush()
+
+        for i, user in enumerate(others):
+            db.add(RepositoryCollaborator(repository_id=repo.id, user_id=user.id, role="contributor"))
+            db.add(RepositoryCollaborator(repository_id=extra_repos[i].id, user_id=me.id, role="contributor"))
+
+        files = []
+        for i in range(size):
+            file = RepositoryFile(
+                repository_id=repo.id, name=f"note_{i}.md", path=f"/notes/note_{i}.md",
+                content=f"seeded note {i}", file_type="markdown", size=14, author_id=others[i].id,
+            )
+            files.append(file)
+        db.add_all(files)
+        db.flush()
+        for file in files:
+            for version_number in (1, 2):
+                db.add(FileVersion(file_id=file.id, version_number=version_number, content=file.content,
+                                   commit_message="seeded", author_id=file.author_id))
+
+        parent_sha = None
+        commits = []
+        for i in range(size):
+            sha = uuid.uuid4().hex
+            commit = Commit(repository_id=repo.id, sha=sha, message=f"seeded commit {i}",
+                            author_id=others[i].id, timestamp=now - timedelta(hours=i), parent_sha=parent_sha)
+            parent_sha = sha
+            commits.append(commit)
+        db.add_all(commits)
+        db.flush()
+        for commit in commits:
+            for file in files[:2]:
+                db.add(CommitFile(commit_id=commit.id, file_id=file.id, file_path=file.path,
+                                  change_type="modified", additions=1, deletions=0))
+
+        merge_requests = []
+        for i in range(size):
+            merge_request = MergeRequest(
+                title=f"seeded change {i}", description="seeded", author_id=others[i].id,
+                source_repo_id=extra_repos[i].id, target_repo_id=repo.id,
+                status=["open", "merged", "closed"][i % 3],
+            )
+            merge_requests.append(merge_request)
+        db.add_all(merge_requests)
+        db.flush()
+        for merge_request in merge_requests:
+            for version_number in (1, 2):
+                db.add(MergeRequestVersion(merge_request_id=merge_request.id, version_number=version_number,
+                                           title=merge_request.title, status=merge_request.status,
+                                           author_id=merge_request.author_id))
+
+        for i in range(size):
+            db.add(AuditEntry(action="file_create", user_id=others[i].id, repository_id=repo.id, details={}))
+
+        db.commit()
+        data.ids = {
+            "user_id": me.id,
+            "repo_id": repo.id,
+            "file_id": files[0].id,
+            "commit_id": commits[0].id,
+            "mr_id": merge_requests[0].id,
+        }
+        return data
+    finally:
+        db.close()
+
+
+@pytest.fixture(scope="session")
+def app():
+    return main.app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    with TestClient(app) as test_client:
+        yield test_client
+        # Write buffered audit entries, then close the aiosqlite connection on
+        # the app's event loop; its worker thread would otherwise keep the
+        # test process alive.
+        test_client.portal.call(audit.audit_writer.stop)
+        test_client.portal.call(async_engine.dispose)
+
+
+@pytest.fixture
+def auth_headers():
+    return dict(AUTH_HEADERS)
+
+
+@pytest.fixture
+def seed(client):
+    def _flush_and_seed(size: int) -> SeededData:
+        # Entries still buffered from the previous test belong to the database being dropped
+        client.portal.call(audit.audit_writer.flush)
+        return _seed(size)
+
+    return _flush_and_seed
+
+
+@pytest.fixture
+def count_queries():
+    """Context manager collecting every SQL statement the app's async engine executes"""
+
+    @contextmanager
+    def _count():
+        counter = QueryCounter()
+        event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+        try:
+            yield counter
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", counter)
+
+    return _count
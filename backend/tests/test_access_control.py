@@ -0,0 +1,67 @@
+"""Private repositories are visible to their owner and collaborators only.
+
+The seeded repository is made private; ``seed_0`` collaborates on it and
+``stranger`` is a fresh user with no membership.
+"""
+import pytest
+from sqlalchemy import update
+
+from conftest import bearer, make_token
+from database import SessionLocal
+from models import Repository
+
+READS = [
+    "/api/repositories/{repo_id}",
+    "/api/repositories/{repo_id}/audit",
+    "/api/files/repository/{repo_id}",
+    "/api/files/{file_id}",
+    "/api/file/{file_id}/versions",
+    "/api/repositories/{repo_id}/commits",
+    "/api/repositories/{repo_id}/commits/{commit_id}",
+    "/api/repositories/{repo_id}/commits/{commit_id}/files",
+    "/api/merge-requests/{mr_id}",
+    "/api/merge-requests/{mr_id}/versions",
+]
+
+COLLABORATOR = bearer(make_token("seed_0"))
+STRANGER = bearer(make_token("stranger", email="stranger@example.com"))
+
+
+@pytest.fixture
+def private_data(seed):
+    data = seed(2)
+    with SessionLocal() as db:
+        db.execute(update(Repository).where(Repository.id == data.ids["repo_id"]).values(is_private=True))
+        db.commit()
+    return data
+
+
+@pytest.mark.parametrize("path", READS)
+def test_private_reads(path, client, private_data):
+    path = path.format(**private_data.ids)
+    assert client.get(path, headers=COLLABORATOR).status_code == 200
+    assert client.get(path, headers=STRANGER).status_code == 403
+
+
+def test_search_hides_private_hits(client, private_data):
+    results = client.get("/api/search?q=seeded", headers=STRANGER).json()
+    assert private_data.ids["repo_id"] not in {repo["id"] for repo in results["repositories"]}
+    assert results["files"] == []
+    assert results["merge_requests"] == []
+
+    results = client.get("/api/search?q=seeded", headers=COLLABORATOR).json()
+    assert private_data.ids["repo_id"] in {repo["id"] for repo in results["repositories"]}
+    assert len(results["files"]) == private_data.size
+
+
+def test_merge_request_list_hides_private_targets(client, private_data):
+    assert client.get("/api/merge-requests/", headers=STRANGER).json() == []
+    assert len(client.get("/api/merge-requests/", headers=COLLABORATOR).json()) == private_data.size
+
+
+def test_one_membership_lookup_per_request(client, private_data, count_queries):
+    client.get("/api/users/me", headers=COLLABORATOR)
+    with count_queries() as queries:
+        response = client.get("/api/files/{file_id}".format(**private_data.ids), headers=COLLABORATOR)
+    assert response.status_code == 200, response.text
+    assert len([statement for statement in queries.statements if "repository_collaborators" in statement]) == 1
@@ -0,0 +1,233 @@
+"""Audit entries are buffered and written in batches, or at once when durable."""
+from sqlalchemy import select
+
+from audit import audit_writer
+from database import SessionLocal
+from models import AuditEntry
+
+
+def _actions(repo_id):
+    with SessionLocal() as db:
+        return set(db.scalars(select(AuditEntry.action).where(AuditEntry.repository_id == repo_id)))
+
+
+def test_entries_are_buffered_until_flush(client, seed, auth_headers):
+    data = seed(2)
+    body = {"repository_id": data.ids["repo_id"], "name": "new.md", "path": "/new.md", "content": "hello",
+            "file_type": "markdown"}
+    assert client.post("/api/files/", json=body, headers=auth_headers).status_code < 400
+
+    assert audit_writer.running
+    client.portal.call(audit_writer.flush)
+    assert "file_create" in _actions(data.ids["repo_id"])
+
+
+def test_durable_entries_are_written_before_the_response(client, seed, auth_headers):
+    data = seed(2)
+    assert client.delete(f"/api/files/{data.ids['file_id']}", headers=auth_headers).status_code == 200
+    assert "file_delete" in _actions(data.ids["repo_id"])
+
+
+def test_flush_keeps_entries_queued_or_trimmed_during_an_insert(client):
+    import asyncio
+
+    from audit import AuditWriter
+
+    writer = AuditWriter(broker=None, batch_size=2, max_pending=3)
+    stored = []
+
+    async def slow_insert(batch):
+        if not stored:
+            # The buffer overflows while the first batch is being written
+            for n in range(10, 14):
+                writer.enqueue({"n": n})
+        await asyncio.sleep(0)
+        stored.extend(row["n"] for row in batch)
+        return batch
+
+    async def failing_insert(batch):
+        writer.enqueue({"n": 30})
+        raise ConnectionError("database unreachable")
+
+    async def run():
+        writer._ensure_partitions = lambda: asyncio.sleep(0)
+        writer._insert = slow_insert
+        for n in (0, 1):
+            writer.enqueue({"n": n})
+        await writer.flush()
+
+        writer._insert = failing_insert
+        for n in (20, 21):
+            writer.enqueue({"n": n})
+        try:
+            await writer.flush()
+        except ConnectionError:
+            pass
+        return [row["n"] for row in writer._pending]
+
+    pending = client.portal.call(run)
+    assert stored == [0, 1, 11, 12, 13]
+    # A failed batch goes back in front of the entries that arrived meanwhile
+    assert pending == [20, 21, 30]
+
+
+def test_partition_months_roll_over_years():
+    from datetime import datetime, timezone
+
+    from audit_partitions import add_months, month_floor, partition_month, partition_name
+
+    month = month_floor(datetime(2026, 11, 17, 8, 30))
+    assert [partition_name(add_months(month, offset)) for offset in range(3)] == [
+        "audit_entries_2026_11", "audit_entries_2026_12", "audit_entries_2027_01",
+    ]
+    assert add_months(month, -11) == datetime(2025, 12, 1, tzinfo=timezone.utc)
+    assert partition_month("audit_entries_2027_01") == datetime(2027, 1, 1, tzinfo=timezone.utc)
+    assert partition_month("audit_entries_default") is None
+
+
+def test_stream_replays_after_cursor_then_pushes_live_entries(client, seed):
+    import asyncio
+    import json
+
+    from audit import log_activity
+    from audit_stream import open_stream
+
+    data = seed(2)
+    repo_id, user_id = data.ids["repo_id"], data.ids["user_id"]
+
+    def _event(chunk):
+        fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+        return fields["id"], json.loads(fields["data"])
+
+    async def scenario():
+        await log_activity(None, "first", user_id, repo_id, durable=True)
+        live = open_stream(repo_id, backlog=1, keepalive=5)
+        assert (await live.__anext__()).startswith("retry:")
+        cursor, first = _event(await live.__anext__())
+        assert first["action"] == "first"
+
+        pending = asyncio.ensure_future(live.__anext__())
+        await log_activity(None, "second", user_id, repo_id, durable=True)
+        _, second = _event(await asyncio.wait_for(pending, 5))
+        assert second["action"] == "second"
+        await live.aclose()
+
+        resumed = open_stream(repo_id, cursor=cursor, keepalive=0.05)
+        await resumed.__anext__()
+        assert _event(await resumed.__anext__())[1]["id"] == second["id"]
+        assert await resumed.__anext__() == ": keepalive\n\n"
+        await resumed.aclose()
+
+    client.portal.call(scenario)
+
+
+def test_stream_rejects_a_bad_cursor(client, seed, auth_headers):
+    data = seed(2)
+    response = client.get(f"/api/repositories/{data.ids['repo_id']}/audit/stream",
+                          params={"cursor": "garbage"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def _log(client, *entries):
+    from audit import log_activity
+
+    async def write():
+        for user_id, repo_id, action, details in entries:
+            await log_activity(None, action, user_id, repo_id, details)
+        await audit_writer.flush()
+
+    client.portal.call(write)
+
+
+def test_query_filters_by_action_user_and_details(client, seed, auth_headers):
+    data = seed(2)
+    repo_id, user_id = data.ids["repo_id"], data.ids["user_id"]
+    _log(client,
+         (user_id, repo_id, "file_export", {"format": "pdf"}),
+         (user_id, repo_id, "file_export", {"format": "csv"}),
+         (user_id, repo_id, "file_view", {"format": "pdf"}))
+
+    params = {"action": "file_export", "user_id": user_id, "repository_id": repo_id, "detail": "format:pdf"}
+    response = client.get("/api/audit", params=params, headers=auth_headers)
+    assert response.status_code == 200
+    assert [(e["action"], e["details"]) for e in response.json()] == [("file_export", {"format": "pdf"})]
+
+    params = {"action": ["file_export", "file_view"], "detail": "format", "limit": 2}
+    first = client.get("/api/audit", params=params, headers=auth_headers)
+    second = client.get("/api/audit", params={**params, "cursor": first.headers["X-Next-Cursor"]},
+                        headers=auth_headers)
+    assert len(first.json()) == 2 and len(second.json()) == 1
+    assert client.get("/api/audit", params={"detail": ":x"}, headers=auth_headers).status_code == 400
+
+
+def test_query_hides_private_repositories(client, seed):
+    from sqlalchemy import update
+
+    from conftest import bearer, make_token
+    from models import Repository
+
+    data = seed(2)
+    _log(client, (data.ids["user_id"], data.ids["repo_id"], "secret_action", {}))
+    with SessionLocal() as db:
+        db.execute(update(Repository).where(Repository.id == data.ids["repo_id"]).values(is_private=True))
+        db.commit()
+
+    stranger = bearer(make_token("stranger", email="stranger@example.com"))
+    assert client.get("/api/audit", params={"action": "secret_action"}, headers=stranger).json() == []
+    assert client.get("/api/audit", params={"repository_id": data.ids["repo_id"]},
+                      headers=stranger).status_code == 403
+    collaborator = bearer(make_token("seed_0"))
+    assert len(client.get("/api/audit", params={"action": "secret_action"}, headers=collaborator).json()) == 1
+
+
+def test_export_streams_csv_and_ndjson(client, seed, auth_headers, monkeypatch):
+    import csv
+    import json
+
+    import audit_query
+
+    monkeypatch.setattr(audit_query, "AUDIT_EXPORT_BATCH", 2)
+    data = seed(2)
+    _log(client, *[(data.ids["user_id"], data.ids["repo_id"], "bulk_action", {"n": str(i)}) for i in range(5)])
+
+    params = {"action": "bulk_action", "format": "ndjson"}
+    response = client.get("/api/audit/export", params=params, headers=auth_headers)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["details"]["n"] for line in lines] == ["0", "1", "2", "3", "4"]
+
+    response = client.get("/api/audit/export", params={**params, "format": "csv"}, headers=auth_headers)
+    rows = list(csv.DictReader(response.text.splitlines()))
+    assert [json.loads(row["details"])["n"] for row in rows] == ["0", "1", "2", "3", "4"]
+    assert {row["repository_id"] for row in rows} == {data.ids["repo_id"]}
+
+
+def test_hash_chain_verifies_incrementally_and_detects_tampering(client, seed, auth_headers):
+    from sqlalchemy import delete, update
+
+    from audit_chain import verify_chain
+    from database import engine
+
+    data = seed(2)
+    repo_id, user_id = data.ids["repo_id"], data.ids["user_id"]
+    _log(client, *[(user_id, repo_id, "first_batch", {"n": i}) for i in range(5)])
+    _log(client, *[(user_id, repo_id, "second_batch", {"n": i}) for i in range(3)])
+
+    result = client.post("/api/audit/verify", headers=auth_headers).json()
+    assert result["ok"] and result["verified"] == 8 and result["to_seq"] == result["head_seq"] == 8
+    again = client.post("/api/audit/verify", headers=auth_headers).json()
+    assert again["ok"] and again["verified"] == 0 and again["from_seq"] == 9
+
+    with engine.connect() as conn:
+        # Ranges of three entries are verified separately and stitched together
+        assert verify_chain(conn, full=True, range_size=3).verified == 8
+
+        conn.execute(update(AuditEntry).where(AuditEntry.chain_seq == 3).values(details={"n": 99}))
+        conn.commit()
+        broken = verify_chain(conn, full=True, range_size=3)
+        assert (broken.ok, broken.error_seq) == (False, 3)
+
+        conn.execute(delete(AuditEntry).where(AuditEntry.chain_seq.in_([3, 7])))
+        conn.commit()
+        broken = verify_chain(conn, full=True, range_size=3)
+        assert (broken.error_seq, broken.error) == (3, "entry missing")
@@ -0,0 +1,65 @@
+"""Session tokens are verified locally and users come from the in-process cache."""
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from conftest import bearer, make_token, signing_keys
+
+
+def test_valid_token_authenticates(client, seed):
+    seed(2)
+    response = client.get("/api/users/me", headers=bearer(make_token()))
+    assert response.status_code == 200, response.text
+    assert response.json()["username"] == "testuser"
+
+
+@pytest.mark.parametrize("token", [
+    "not-a-jwt-at-all",
+    make_token(expires_in=-60),
+    make_token(iss="https://someone-else.example"),
+    make_token(private_key=rsa.generate_private_key(public_exponent=65537, key_size=2048)),
+    make_token(kid="never-published", private_key=signing_keys.private_keys["test-key-1"]),
+])
+def test_bad_tokens_are_rejected(token, client, seed):
+    seed(2)
+    response = client.get("/api/users/me", headers=bearer(token))
+    assert response.status_code == 401, response.text
+
+
+def test_rotated_signing_key_is_fetched(client, seed):
+    seed(2)
+    signing_keys.add("test-key-rotated")
+    response = client.get("/api/users/me", headers=bearer(make_token(kid="test-key-rotated")))
+    assert response.status_code == 200, response.text
+
+
+def test_warm_requests_do_not_query_users(client, seed, count_queries):
+    seed(2)
+    headers = bearer(make_token())
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+    with count_queries() as queries:
+        assert client.get("/api/users/me", headers=bearer(make_token())).status_code == 200
+    assert not [statement for statement in queries.statements if "FROM users" in statement]
+
+
+def test_profile_update_is_visible_immediately(client, seed):
+    seed(2)
+    headers = bearer(make_token())
+    assert client.put("/api/users/me", json={"username": "renamed"}, headers=headers).status_code == 200
+    assert client.get("/api/users/me", headers=headers).json()["username"] == "renamed"
+
+
+def test_unknown_subject_is_registered(client, seed):
+    seed(2)
+    response = client.get("/api/users/me", headers=bearer(make_token("user_new", email="new@example.com")))
+    assert response.status_code == 200, response.text
+    assert response.json()["email"] == "new@example.com"
+    assert response.json()["role"] == "contributor"
+
+
+def test_chatbot_treats_invalid_token_as_anonymous(client, seed):
+    data = seed(2)
+    body = {"question": "What changed?", "repository": {"id": data.ids["repo_id"]}}
+    response = client.post("/api/chatbot/query", json=body, headers=bearer("garbage-token-value"))
+    # The seeded repository is public, so anonymous access is allowed
+    assert response.status_code == 200, response.text
+
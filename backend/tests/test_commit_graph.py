@@ -0,0 +1,142 @@
+"""Commit graphs are stored as node and edge rows and grow by appending."""
+import json
+from datetime import datetime, timedelta
+
+import msgpack
+
+from graph_columns import GRAPH_COLUMNS_JSON, GRAPH_MSGPACK, graph_from_columns
+
+
+def _generate(client, repo_id, headers, query="max_commits=3"):
+    response = client.post(f"/api/repositories/{repo_id}/graph/generate?{query}", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_generate_graph_links_commits_and_files(client, seed, auth_headers):
+    data = seed(4)
+    generated = _generate(client, data.ids["repo_id"], auth_headers)
+    graph = generated["graph"]
+
+    commits = [node for node in graph["nodes"] if node["type"] == "commit"]
+    files = [node for node in graph["nodes"] if node["type"] == "file"]
+    # The three newest of four commits, oldest first, each touching two files
+    assert [node["metadata"]["message"] for node in commits] == [f"seeded commit {i}" for i in (2, 1, 0)]
+    assert {node["metadata"]["author"] for node in commits} == {f"seed_user_{i}" for i in range(3)}
+    assert len(files) == 6
+    edge_types = [edge["type"] for edge in graph["edges"]]
+    assert edge_types.count("commit_parent") == 2
+    assert edge_types.count("commit_to_file") == 6
+    assert edge_types.count("file_evolution") == 4
+    assert set(graph["layout"]) == {node["id"] for node in graph["nodes"]}
+    # Seeded commit 0 is the root (the others descend from it), so it heads the layers
+    assert [graph["layout"][node["id"]]["layer"] for node in commits] == [2, 1, 0]
+    assert [graph["layout"][node["id"]]["y"] for node in commits] == [400, 200, 0]
+    assert len({(position["x"], position["y"]) for position in graph["layout"].values()}) == len(graph["nodes"])
+    assert (generated["node_count"], generated["edge_count"]) == (9, 12)
+
+    stored = client.get(f"/api/repositories/{data.ids['repo_id']}/graph", headers=auth_headers)
+    assert stored.status_code == 200
+    stored = stored.json()
+    assert stored["graph_data"] == graph
+    assert (stored["node_count"], stored["edge_count"], stored["version"]) == (9, 12, 1)
+
+
+def test_regenerating_appends_only_new_commits(client, seed, auth_headers):
+    data = seed(4)
+    repo_id = data.ids["repo_id"]
+    first = _generate(client, repo_id, auth_headers)
+    head_sha = [node for node in first["graph"]["nodes"] if node["type"] == "commit"][-1]["metadata"]["sha"]
+
+    assert _generate(client, repo_id, auth_headers)["graph"]["nodes"] == []
+    commit = {"sha": "f" * 40, "message": "new lead", "timestamp": datetime.utcnow().isoformat(),
+              "parent_sha": head_sha}
+    assert client.post(f"/api/repositories/{repo_id}/commits", json=commit, headers=auth_headers).status_code == 200
+
+    appended = _generate(client, repo_id, auth_headers)
+    assert [node["id"] for node in appended["graph"]["nodes"]] == ["commit_" + "f" * 40]
+    assert appended["graph"]["edges"] == [{
+        "source": f"commit_{head_sha}", "target": "commit_" + "f" * 40, "type": "commit_parent",
+        "metadata": {"relationship": "parent_child"},
+    }]
+    # A second child of the root: a new lane, on a new layer below the graph
+    assert appended["graph"]["layout"]["commit_" + "f" * 40] == {"x": 600, "y": 600, "level": 0, "layer": 3, "lane": 1}
+    assert (appended["node_count"], appended["edge_count"]) == (10, 13)
+
+    stored = client.get(f"/api/repositories/{repo_id}/graph", headers=auth_headers).json()
+    assert stored["graph_data"]["nodes"][:9] == first["graph"]["nodes"]
+    assert stored["graph_data"]["nodes"][9]["metadata"]["message"] == "new lead"
+    assert len(stored["graph_data"]["edges"]) == 13
+
+    rebuilt = _generate(client, repo_id, auth_headers, "max_commits=2&rebuild=true")
+    assert [node["metadata"]["message"] for node in rebuilt["graph"]["nodes"] if node["type"] == "commit"] == [
+        "seeded commit 0", "new lead"]
+    assert client.get(f"/api/repositories/{repo_id}/graph", headers=auth_headers).json()["node_count"] == 4
+
+    assert client.delete(f"/api/repositories/{repo_id}/graph", headers=auth_headers).status_code == 200
+    assert client.get(f"/api/repositories/{repo_id}/graph", headers=auth_headers).status_code == 404
+
+
+def test_graph_window_returns_visible_nodes_and_boundary_edges(client, seed, auth_headers):
+    data = seed(4)
+    repo_id = data.ids["repo_id"]
+    graph = _generate(client, repo_id, auth_headers)["graph"]
+    middle = next(node for node in graph["nodes"] if node["metadata"].get("message") == "seeded commit 1")
+    sha = middle["metadata"]["sha"]
+
+    def window(query):
+        response = client.get(f"/api/repositories/{repo_id}/graph/window?{query}", headers=auth_headers)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    # Seeded commit 1 is on layer 1; it and its two files, by layer, commit or time
+    now = datetime.utcnow()
+    time_range = f"since={(now - timedelta(minutes=90)).isoformat()}&until={(now - timedelta(minutes=30)).isoformat()}"
+    for query in ("first_layer=1&last_layer=1", f"from_sha={sha}&to_sha={sha}", time_range):
+        layer = window(query)
+        assert {node["id"] for node in layer["nodes"]} == {
+            node["id"] for node in graph["nodes"] if sha in node["id"]}
+        inside = {node["id"] for node in layer["nodes"]}
+        # Parent edges to commits 0 and 2, file edges, and file evolution on both sides
+        assert len(layer["edges"]) == 8
+        assert all(edge["source"] in inside or edge["target"] in inside for edge in layer["edges"])
+        assert len(layer["boundary_nodes"]) == 6
+        assert set(layer["layout"]) == inside | {node["id"] for node in layer["boundary_nodes"]}
+        assert not layer["truncated"]
+
+    # The commit lane, without the files to its right
+    box = window("x_min=0&x_max=0")
+    assert [node["type"] for node in box["nodes"]] == ["commit"] * 3
+    assert {node["type"] for node in box["boundary_nodes"]} == {"file"}
+
+    assert window("first_layer=0&limit=1")["truncated"]
+    assert client.get(f"/api/repositories/{repo_id}/graph/window", headers=auth_headers).status_code == 400
+    assert client.get(f"/api/repositories/{repo_id}/graph/window?from_sha=abc",
+                      headers=auth_headers).status_code == 404
+
+
+def test_columnar_graph_matches_the_json_graph(client, seed, auth_headers):
+    data = seed(6)
+    repo_id = data.ids["repo_id"]
+    _generate(client, repo_id, auth_headers, "max_commits=5")
+    stored = client.get(f"/api/repositories/{repo_id}/graph", headers=auth_headers)
+
+    packed = client.get(f"/api/repositories/{repo_id}/graph", headers={**auth_headers, "Accept": GRAPH_MSGPACK})
+    assert packed.headers["content-type"] == GRAPH_MSGPACK
+    document = msgpack.unpackb(packed.content)
+    assert graph_from_columns(document) == stored.json()["graph_data"]
+    assert document["graph"]["version"] == stored.json()["version"]
+    assert len(packed.content) * 3 < len(stored.content)
+
+    as_json = client.get(f"/api/repositories/{repo_id}/graph",
+                         headers={**auth_headers, "Accept": f"{GRAPH_COLUMNS_JSON}, application/json;q=0.5"})
+    assert as_json.headers["content-type"] == GRAPH_COLUMNS_JSON
+    assert json.loads(as_json.content) == document
+
+    path = f"/api/repositories/{repo_id}/graph/window?first_layer=2&last_layer=2"
+    window = client.get(path, headers=auth_headers).json()
+    columns = msgpack.unpackb(client.get(path, headers={**auth_headers, "Accept": GRAPH_MSGPACK}).content)
+    rebuilt = graph_from_columns(columns)
+    assert rebuilt["nodes"] == window["nodes"] + window["boundary_nodes"]
+    assert rebuilt["edges"] == window["edges"] and rebuilt["layout"] == window["layout"]
+    assert [rebuilt["nodes"][row] for row in columns["boundary"]] == window["boundary_nodes"]
@@ -0,0 +1,170 @@
+"""Dashboard statistics come from the daily rollups."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+import audit
+from database import SessionLocal, engine
+from models import (
+    DailyAuthorMergeRequestStats, DailyRepositoryActivity, DailyRepositoryStats, MergeRequest, MergeRequestVersion,
+    Repository,
+)
+from rollups import reconcile
+
+
+def _rollups():
+    with SessionLocal() as db:
+        return (
+            sorted(tuple(row) for row in db.execute(select(DailyRepositoryStats.day, DailyRepositoryStats.repositories_created))),
+            sorted(tuple(row) for row in db.execute(select(
+                DailyRepositoryActivity.day, DailyRepositoryActivity.repository_id,
+                DailyRepositoryActivity.events, DailyRepositoryActivity.uploads))),
+            sorted(tuple(row) for row in db.execute(select(
+                DailyAuthorMergeRequestStats.day, DailyAuthorMergeRequestStats.author_id,
+                DailyAuthorMergeRequestStats.opened, DailyAuthorMergeRequestStats.merged,
+                DailyAuthorMergeRequestStats.closed))),
+        )
+
+
+def test_stats_read_reconciled_rollups(client, seed, auth_headers):
+    data = seed(6)
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        db.execute(update(Repository).where(Repository.id == data.ids["repo_id"])
+                   .values(created_at=now - timedelta(days=3)))
+        db.execute(update(MergeRequest).values(created_at=now - timedelta(days=2), updated_at=now - timedelta(days=1)))
+        # Opened two days ago, merged or closed (version 2) yesterday
+        db.execute(update(MergeRequestVersion).where(MergeRequestVersion.version_number == 1)
+                   .values(status="open", created_at=now - timedelta(days=2)))
+        db.execute(update(MergeRequestVersion).where(MergeRequestVersion.version_number == 2)
+                   .values(created_at=now - timedelta(days=1)))
+        db.commit()
+    # Seeded rows bypass the audit path, so the rollups start empty
+    with engine.connect() as conn:
+        reconcile(conn, (now - timedelta(days=30)).date(), now.date())
+
+    stats = client.get("/api/dashboard/stats", headers=auth_headers).json()
+
+    assert stats["kpis"]["ingestedItems"]["value"] == 6
+    assert stats["kpis"]["openMergeRequests"]["value"] == 2
+    assert stats["kpis"]["activeCases"]["value"] == 1
+    volume = {day["date"]: day["web"] + day["social"] + day["darkweb"] for day in stats["ingestVolume"]}
+    assert len(volume) == 30
+    assert volume[now.strftime("%Y-%m-%d")] == 6
+    assert volume[(now - timedelta(days=3)).strftime("%Y-%m-%d")] == 1
+    # seed_user_1, 2, 4 and 5 each closed or merged one change request
+    assert sorted(p["name"] for p in stats["investigatorPerf"]) == [f"seed_user_{i}" for i in (1, 2, 4, 5)]
+    assert {p["closedCount"] for p in stats["investigatorPerf"]} == {1}
+    assert {p["avgTimeDays"] for p in stats["investigatorPerf"]} == {1.0}
+    assert stats["kpis"]["avgLeadTime"]["value"] == "1.0d"
+    assert stats["kpis"]["investigatorEfficiency"]["value"] == 50
+    sparks = [spark["sparkline"] for spark in stats["repoSparks"]]
+    assert sparks[0][-1] == 6 and sparks[0][-4] == 1
+    assert sparks[1][-1] == 1
+    # Open at the end of each day: none, six opened, four of them finished
+    assert sparks[2][-3:] == [6, 2, 2] and sparks[2][0] == 0
+    assert sparks[3] == [1.0] * 7
+    assert sparks[4] == [50] * 7
+
+
+def test_audited_writes_update_rollups_like_a_rebuild(client, seed, auth_headers):
+    data = seed(2)
+    with engine.connect() as conn:
+        reconcile(conn, datetime.utcnow().date(), datetime.utcnow().date())
+
+    created = client.post("/api/repositories/", json={"name": "rolled-up", "description": "x", "is_private": False},
+                          headers=auth_headers)
+    assert created.status_code == 201
+    body = {"repository_id": data.ids["repo_id"], "name": "new.md", "path": "/new.md", "content": "hello",
+            "file_type": "markdown"}
+    assert client.post("/api/files/", json=body, headers=auth_headers).status_code < 400
+    # The test database is one shared in-memory connection: keep a timed flush out of the next request
+    client.portal.call(audit.audit_writer.flush)
+    assert client.post(f"/api/merge-requests/{data.ids['mr_id']}/close", headers=auth_headers).status_code == 200
+    client.portal.call(audit.audit_writer.flush)
+    incremental = _rollups()
+
+    with engine.connect() as conn:
+        reconcile(conn, datetime.utcnow().date(), datetime.utcnow().date())
+    assert incremental == _rollups()
+    stats = client.get("/api/dashboard/stats", headers=auth_headers).json()
+    assert stats["kpis"]["activeCases"]["value"] == 2
+    # The seeded merged request (versions created as merged) and the one just closed
+    assert [p["closedCount"] for p in stats["investigatorPerf"]] == [1, 1]
+    assert stats["kpis"]["investigatorEfficiency"]["value"] == 50
+
+
+def test_restoring_a_closed_version_counts_as_closing(client, seed, auth_headers):
+    data = seed(2)
+    mr_id = data.ids["mr_id"]
+    with SessionLocal() as db:
+        db.execute(update(MergeRequestVersion).where(MergeRequestVersion.merge_request_id == mr_id,
+                                                     MergeRequestVersion.version_number == 1)
+                   .values(status="closed"))
+        db.commit()
+    with engine.connect() as conn:
+        reconcile(conn, datetime.utcnow().date(), datetime.utcnow().date())
+    before = _rollups()[2]
+
+    restored = client.post(f"/api/merge-requests/{mr_id}/restore/1", headers=auth_headers)
+    assert restored.status_code == 200 and restored.json()["current_version"] == 4
+    client.portal.call(audit.audit_writer.flush)
+    with SessionLocal() as db:
+        history = db.execute(select(MergeRequestVersion.version_number, MergeRequestVersion.status)
+                             .where(MergeRequestVersion.merge_request_id == mr_id)
+                             .order_by(MergeRequestVersion.version_number)).all()
+    # The state before the restore, then the restored one
+    assert [tuple(row) for row in history][2:] == [(3, "open"), (4, "closed")]
+    incremental = _rollups()
+    assert sum(row[-1] for row in incremental[2]) == sum(row[-1] for row in before) + 1
+
+    with engine.connect() as conn:
+        reconcile(conn, datetime.utcnow().date(), datetime.utcnow().date())
+    assert incremental == _rollups()
+
+
+def test_stats_are_cached_until_a_write(client, seed, auth_headers, count_queries):
+    import asyncio
+
+    from routers import dashboard
+
+    seed(2)
+    first = client.get("/api/dashboard/stats", headers=auth_headers).json()
+    with count_queries() as queries:
+        assert client.get("/api/dashboard/stats", headers=auth_headers).json() == first
+    assert not any("repositories" in statement for statement in queries.statements)
+
+    assert client.post("/api/repositories/", json={"name": "bump", "description": "x", "is_private": False},
+                       headers=auth_headers).status_code == 201
+    client.portal.call(audit.audit_writer.flush)
+    # The write made the entry stale: served once more while it is recomputed
+    assert client.get("/api/dashboard/stats", headers=auth_headers).json() == first
+
+    async def settle():
+        while dashboard.stats_cache._inflight:
+            await asyncio.sleep(0.01)
+
+    client.portal.call(settle)
+    fresh = client.get("/api/dashboard/stats", headers=auth_headers).json()
+    assert fresh["kpis"]["ingestedItems"]["value"] == first["kpis"]["ingestedItems"]["value"] + 1
+
+
+def test_concurrent_misses_share_one_computation():
+    import asyncio
+
+    from cache import StaleWhileRevalidateCache, WriteGeneration
+
+    generation = WriteGeneration()
+    cache = StaleWhileRevalidateCache(ttl_seconds=60, stale_seconds=60, generation=generation)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def burst():
+        return await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(50)))
+
+    assert asyncio.run(burst()) == [1] * 50
+    assert len(calls) == 1
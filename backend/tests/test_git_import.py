@@ -0,0 +1,121 @@
+"""Git history import streams the whole history and resumes from the last imported commit."""
+import os
+import subprocess
+
+from sqlalchemy import select
+
+from database import SessionLocal
+from git_import import _username, parse_log
+from models import Commit, CommitFile, Repository, User
+
+
+def _git(repo, *args, author="Ada Analyst <ada@example.com>"):
+    name, email = author[:-1].split(" <")
+    env = {**os.environ, "GIT_AUTHOR_NAME": name, "GIT_AUTHOR_EMAIL": email, "GIT_COMMITTER_NAME": name,
+           "GIT_COMMITTER_EMAIL": email}
+    return subprocess.run(["git", *args], cwd=repo, env=env, check=True, capture_output=True, text=True).stdout
+
+
+def _commit(repo, message, files, **kwargs):
+    for path, content in files.items():
+        os.makedirs(os.path.dirname(os.path.join(repo, path)) or repo, exist_ok=True)
+        with open(os.path.join(repo, path), "w") as handle:
+            handle.write(content)
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", message, **kwargs)
+    return _git(repo, "rev-parse", "HEAD").strip()
+
+
+def _import(client, repo_id, path, headers, query=""):
+    response = client.post(f"/api/repositories/{repo_id}/commits/import?repo_path={path}{query}", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_import_records_parents_files_and_resumes(client, seed, auth_headers, tmp_path):
+    repo_id = seed(1).ids["repo_id"]
+    repo = str(tmp_path)
+    _git(repo, "init", "-q", "-b", "main")
+    first = _commit(repo, "Add notes", {"notes/a.md": "one\ntwo\n", "data.json": "{}\n"})
+    second = _commit(repo, "Edit notes", {"notes/a.md": "one\nthree\n"}, author="Bo Reviewer <bo@example.com>")
+
+    summary = _import(client, repo_id, repo, auth_headers, "&max_commits=1")
+    assert (summary["commits_imported"], summary["complete"], summary["head_sha"]) == (1, False, first)
+    summary = _import(client, repo_id, repo, auth_headers)
+    assert (summary["commits_imported"], summary["complete"], summary["head_sha"]) == (1, True, second)
+    assert summary["authors_created"] == 1
+
+    os.remove(os.path.join(repo, "data.json"))
+    third = _commit(repo, "Drop data", {})
+    summary = _import(client, repo_id, repo, auth_headers)
+    assert (summary["commits_read"], summary["commits_imported"], summary["head_sha"]) == (1, 1, third)
+    assert _import(client, repo_id, repo, auth_headers)["commits_read"] == 0
+
+    with SessionLocal() as db:
+        imported = select(Commit).where(Commit.sha.in_([first, second, third]))
+        commits = {commit.sha: commit for commit in db.scalars(imported)}
+        assert [commits[sha].parent_sha for sha in (first, second, third)] == [None, first, second]
+        assert commits[second].message == "Edit notes"
+        assert db.scalar(select(User.username).where(User.id == commits[second].author_id)) == "bo_reviewer"
+        changes = {
+            (commit_file.commit_id, commit_file.file_path): commit_file
+            for commit_file in db.scalars(select(CommitFile).where(CommitFile.commit_id.in_(
+                [commit.id for commit in commits.values()])))
+        }
+        assert len(changes) == 4
+        edit = changes[(commits[second].id, "/notes/a.md")]
+        assert (edit.change_type, edit.additions, edit.deletions) == ("modified", 1, 1)
+        assert edit.previous_file_id == edit.file_id
+        assert changes[(commits[third].id, "/data.json")].change_type == "deleted"
+        assert db.scalar(select(Repository.git_import_head).where(Repository.id == repo_id)) == third
+
+
+def test_import_suffixes_taken_usernames_and_skips_commits_of_other_repositories(
+    client, seed, auth_headers, tmp_path
+):
+    repo_id = seed(1).ids["repo_id"]
+    repo = str(tmp_path)
+    _git(repo, "init", "-q", "-b", "main")
+    sha = _commit(repo, "Add notes", {"a.md": "one\n"})
+    with SessionLocal() as db:
+        # Both the plain username and its first suffix belong to other users
+        for username in ("ada_analyst", _username("Ada Analyst", "ada@example.com", 1)):
+            db.add(User(clerk_id=f"clerk_{username}", username=username, email=f"{username}@example.org"))
+        db.commit()
+
+    summary = _import(client, repo_id, repo, auth_headers)
+    assert (summary["commits_imported"], summary["authors_created"]) == (1, 1)
+    with SessionLocal() as db:
+        author = db.scalar(select(User).join(Commit, Commit.author_id == User.id).where(Commit.sha == sha))
+        assert (author.email, author.username) == ("ada@example.com", _username("Ada Analyst", "ada@example.com", 2))
+
+    other = client.post("/api/repositories/", json={"name": "fork", "description": "x", "is_private": False},
+                        headers=auth_headers).json()["id"]
+    summary = _import(client, other, repo, auth_headers)
+    assert (summary["commits_imported"], summary["commits_in_other_repositories"]) == (0, 1)
+    assert summary["head_sha"] == sha
+
+
+def test_import_rejects_a_path_that_is_not_a_git_repository(client, seed, auth_headers, tmp_path):
+    repo_id = seed(1).ids["repo_id"]
+    response = client.post(f"/api/repositories/{repo_id}/commits/import?repo_path={tmp_path}", headers=auth_headers)
+    assert response.status_code == 400
+    assert "Failed to read git repository" in response.json()["detail"]
+
+
+def test_parse_log_keeps_first_parent_and_binary_files():
+    lines = [
+        "\x1emerge\x1fa b\x1fAda\x1fada@example.com\x1f1700000000\x1fMerge branch 'topic'\n",
+        "\n",
+        "\x1echild\x1fmerge\x1fAda\x1fada@example.com\x1f1700000060\x1fAdd scan\n",
+        "\n",
+        ":000000 100644 0000000 1234567 A\tscans/photo.png\n",
+        ":100644 120000 89abcde 7654321 T\tlinks/latest\n",
+        "-\t-\tscans/photo.png\n",
+        "1\t0\tlinks/latest\n",
+    ]
+    merge, child = parse_log(iter(lines))
+
+    assert (merge.parent_sha, merge.files) == ("a", {})
+    assert child.timestamp.isoformat() == "2023-11-14T22:14:20+00:00"
+    assert child.files == {"scans/photo.png": ["added", 0, 0], "links/latest": ["modified", 1, 0]}
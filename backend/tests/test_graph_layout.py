@@ -0,0 +1,56 @@
+"""Layered commit graph layout."""
+import numpy as np
+
+from graph_layout import LANE_X_SPACING, _reduce_crossings, layered_layout
+
+
+def test_branches_get_lanes_and_layers_follow_parents():
+    # 0 - 1 - 3 - 5        the main line, three layers deep below 1
+    #      \
+    #       2 - 4          a branch off 1
+    layout = layered_layout([-1, 0, 1, 1, 2, 3, 5], [0, 1, 2, 0, 0, 6, 0])
+
+    assert layout.layer.tolist() == [0, 1, 2, 2, 3, 3, 4]
+    # The child with the deeper history keeps its parent's lane
+    assert layout.lane[[0, 1, 3, 5, 6]].tolist() == [0] * 5
+    assert layout.lane[2] == layout.lane[4] == 1
+    assert layout.x[2] == LANE_X_SPACING
+    assert layout.lane_count == 2
+    # Commit 5's six files make its layer taller
+    assert layout.y.tolist() == [0, 200, 400, 400, 600, 600, 950]
+    assert layout.height == 1150
+
+
+def test_ended_branches_free_their_lane():
+    # Two short branches off a long main line, one after the other
+    layout = layered_layout([-1, 0, 1, 2, 3, 0, 2], [0] * 7)
+
+    assert layout.lane.tolist() == [0, 0, 0, 0, 0, 1, 1]
+
+
+def test_forks_are_pulled_next_to_their_branch():
+    # Lane 3 forks from lane 0 and lane 1 from lane 2, across each other
+    position = _reduce_crossings((np.array([0, 2]), np.array([3, 1])), 4)
+
+    assert position.tolist() == [0, 2, 3, 1]
+
+
+def test_branched_history_layout_does_not_overlap():
+    rng = np.random.default_rng(7)
+    parents = np.arange(-1, 2999)
+    forks = rng.random(3000) < 0.2
+    parents[forks] = (rng.random(forks.sum()) * np.arange(3000)[forks]).astype(int)
+    parents[0] = -1
+
+    layout = layered_layout(parents, rng.integers(0, 4, 3000))
+
+    assert (layout.layer[1:] == layout.layer[parents[1:]] + 1).all()
+    assert len(set(zip(layout.x.tolist(), layout.y.tolist()))) == 3000
+    assert layout.lane_count < 3000
+
+
+def test_cycles_and_outside_parents_become_roots():
+    layout = layered_layout([1, 0, 7, 2], [0] * 4)
+
+    assert layout.layer.tolist() == [0, 0, 0, 1]
+    assert layered_layout([], []).layer_count == 0
@@ -0,0 +1,33 @@
+from routers import internal
+
+
+def test_db_pool_is_hidden_without_configured_token(client, monkeypatch):
+    monkeypatch.setattr(internal, "INTERNAL_METRICS_TOKEN", None)
+    assert client.get("/api/internal/db-pool").status_code == 404
+
+
+def test_db_pool_requires_matching_token(client, monkeypatch):
+    monkeypatch.setattr(internal, "INTERNAL_METRICS_TOKEN", "s3cret")
+    assert client.get("/api/internal/db-pool").status_code == 403
+    assert client.get("/api/internal/db-pool", headers={"X-Internal-Token": "wrong"}).status_code == 403
+    response = client.get("/api/internal/db-pool", headers={"X-Internal-Token": "s3cret"})
+    assert response.status_code == 200
+    assert "primary" in response.json()
+
+
+def test_metrics_label_routes_by_template(client, seed, monkeypatch, auth_headers):
+    data = seed(2)
+    monkeypatch.setattr(internal, "INTERNAL_METRICS_TOKEN", "s3cret")
+    assert client.get(f"/api/files/{data.ids['file_id']}", headers=auth_headers).status_code == 200
+    assert client.get("/api/no-such-endpoint").status_code == 404
+
+    assert client.get("/api/internal/metrics").status_code == 403
+    response = client.get("/api/internal/metrics", headers={"X-Internal-Token": "s3cret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_requests_total{method="GET",route="/api/files/{file_id}",status="200"}' in text
+    assert 'db_statements_total{route="/api/files/{file_id}"}' in text
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"}' in text
+    assert data.ids["file_id"] not in text
+    assert "http_requests_in_flight 1.0" in text
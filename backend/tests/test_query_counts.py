@@ -0,0 +1,53 @@
+"""SQL statement counts per endpoint must not grow with the amount of data.
+
+Each endpoint is called against datasets of different sizes; a count that
+differs between sizes means some path issues a query per row (N+1).
+"""
+import pytest
+
+SIZES = (2, 8)
+
+ENDPOINTS = [
+    ("GET", "/api/repositories/", None),
+    ("GET", "/api/repositories/{repo_id}", None),
+    ("GET", "/api/repositories/{repo_id}/audit", None),
+    ("GET", "/api/files/repository/{repo_id}", None),
+    ("GET", "/api/files/repository/{repo_id}?include=content", None),
+    ("GET", "/api/files/{file_id}", None),
+    ("GET", "/api/file/{file_id}/versions", None),
+    ("GET", "/api/merge-requests/", None),
+    ("GET", "/api/merge-requests/{mr_id}", None),
+    ("GET", "/api/merge-requests/{mr_id}/versions", None),
+    ("GET", "/api/repositories/{repo_id}/commits", None),
+    ("GET", "/api/repositories/{repo_id}/commits/{commit_id}/files", None),
+    ("GET", "/api/repositories/{repo_id}/graph/statistics", None),
+    ("GET", "/api/users/", None),
+    ("GET", "/api/search?q=seeded", None),
+    ("GET", "/api/dashboard/stats", None),
+    ("POST", "/api/chatbot/query", {"question": "What changed?", "repository": {"id": "{repo_id}"}}),
+    ("POST", "/api/chatbot/query-stream", {"question": "What changed?", "repository": {"id": "{repo_id}"}}),
+    ("POST", "/api/repositories/{repo_id}/graph/generate", None),
+]
+
+
+def _format(value, ids):
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, dict):
+        return {key: _format(item, ids) for key, item in value.items()}
+    return value
+
+
+@pytest.mark.parametrize("method, path, body", ENDPOINTS)
+def test_query_count_does_not_grow_with_data(method, path, body, client, seed, count_queries, auth_headers):
+    counts = {}
+    for size in SIZES:
+        data = seed(size)
+        with count_queries() as queries:
+            response = client.request(
+                method, _format(path, data.ids), json=_format(body, data.ids), headers=auth_headers
+            )
+        assert response.status_code < 400, response.text
+        counts[size] = len(queries)
+
+    assert len(set(counts.values())) == 1, f"{method} {path}: statement count grows with data size {counts}"
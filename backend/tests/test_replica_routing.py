@@ -0,0 +1,62 @@
+"""Read-only endpoints go to a replica unless the caller wrote recently.
+
+The replica is a second SQLite file holding a repository the primary does
+not have, so each response shows which database served it.
+"""
+import itertools
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import database
+from conftest import bearer, make_token
+from models import Base, Repository, User
+
+REPLICA_ONLY = "replica-only-case"
+
+
+@pytest.fixture
+def replica(tmp_path, client, monkeypatch):
+    path = tmp_path / "replica.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(User.__table__.insert().values(
+            id="replica-owner", clerk_id="replica_owner", username="replica_owner", email="replica@example.com"))
+        conn.execute(Repository.__table__.insert().values(
+            id="replica-repo", name=REPLICA_ONLY, description="seeded", owner_id="replica-owner", is_private=False))
+    sync_engine.dispose()
+
+    replica_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    monkeypatch.setattr(database, "_replica_cycle", itertools.cycle([replica_engine]))
+    monkeypatch.setattr(database, "read_your_writes", database.ReadYourWritesTracker(ttl_seconds=60))
+    yield replica_engine
+    client.portal.call(replica_engine.dispose)
+
+
+def _served_by_replica(client, headers) -> bool:
+    response = client.get("/api/search?q=case&type=repositories", headers=headers)
+    assert response.status_code == 200, response.text
+    return REPLICA_ONLY in {repo["name"] for repo in response.json()["repositories"]}
+
+
+def test_reads_use_replica_until_caller_writes(client, seed, replica, auth_headers):
+    seed(2)
+    assert _served_by_replica(client, auth_headers)
+
+    response = client.post("/api/repositories/", json={"name": "fresh-case", "description": "new"},
+                           headers=auth_headers)
+    assert response.status_code < 400, response.text
+
+    assert not _served_by_replica(client, auth_headers)
+
+
+def test_stickiness_survives_token_change(client, seed, replica, auth_headers):
+    seed(2)
+    response = client.post("/api/repositories/", json={"name": "fresh-case", "description": "new"},
+                           headers=auth_headers)
+    assert response.status_code < 400, response.text
+
+    # Same user, refreshed token
+    assert not _served_by_replica(client, bearer(make_token()))
@@ -22,7 +22,7 @@ export default function SingleRepositoryPage() {
   interface RawUser { id?: string; username?: string; avatar?: string; role?: string; email?: string }
   interface RawCollaborator { user?: RawUser; user_id?: string }
   interface RawRepo { id: string; name: string; description?: string; owner?: RawUser; owner_id?: string; is_private?: boolean; isPrivate?: boolean; created_at?: string; createdAt?: string; updated_at?: string; updatedAt?: string; fork_count?: number; collaborators?: RawCollaborator[] }
-  interface RawFile { id: string; name: string; path: string; content?: string; file_type?: string; size?: number; updated_at?: string; created_at?: string }
+  interface RawFile { id: string; name: string; path: string; content?: string; file_type?: string; size?: number; updated_at?: string; created_at?: string; author?: RawUser }
   const mapBackendRepo = useCallback((raw: RawRepo): Repository => {
     const owner: User = {
       id: raw.owner?.id || raw.owner_id || 'owner',
@@ -89,11 +89,13 @@ export default function SingleRepositoryPage() {
               id: rf.id,
               name: rf.name,
               path: rf.path,
-              content: rf.content || '',
+              content: rf.content || '', // summaries carry no content; loaded on selection
               type: safeType,
               size: rf.size || 0,
               lastModified: rf.updated_at || rf.created_at || new Date().toISOString(),
-              author: mapped.owner
+              author: rf.author?.id
+                ? { ...mapped.owner, id: rf.author.id, username: rf.author.username || mapped.owner.username }
+                : mapped.owner
             };
           });
           setFiles(mappedFiles);
@@ -112,6 +114,12 @@ export default function SingleRepositoryPage() {
     return () => { aborted = true; };
   }, [isLoaded, repoId, getToken, mapBackendRepo, setTitle]);
 
+  // File list entries are summaries; content is fetched when a file is opened
+  const handleLoadFile = useCallback(async (file: RepositoryFile): Promise<RepositoryFile> => {
+    const rawFile = await apiService.getFile(file.id, getToken);
+    return { ...file, content: rawFile.content || '' };
+  }, [getToken]);
+
   // Skeleton UI
   if (loading) {
     return (
@@ -156,6 +164,7 @@ export default function SingleRepositoryPage() {
       onBack={handleBack}
       onFork={handleFork}
       onViewMergeRequests={handleViewMergeRequests}
+      onLoadFile={handleLoadFile}
     />
   );
 }
@@ -93,8 +93,8 @@ What would you like to know?`,
           path: file.path,
           type: file.type,
           size: file.size,
-          lastModified: file.lastModified,
-          content: file.content // Send full content for better analysis
+          lastModified: file.lastModified
+          // Contents are loaded server-side from the repository id
         })),
         getToken,
         (chunk: string) => {
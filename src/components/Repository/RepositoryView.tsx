@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import {
   GitFork,
   Eye,
@@ -9,7 +9,7 @@ import {
   Lock,
   GitCommit
 } from 'lucide-react';
-import { Repository } from '../../types';
+import { Repository, RepositoryFile } from '../../types';
 import { FileExplorer } from '../Files/FileExplorer';
 import { FileEditor } from '../Files/FileEditor';
 import { CommitGraphViewer } from '../CommitGraph/CommitGraphViewer';
@@ -22,13 +22,16 @@ interface RepositoryViewProps {
   onBack: () => void;
   onFork: (repo: Repository) => void;
   onViewMergeRequests: () => void;
+  // Fetches a file's content; the file list only carries summaries
+  onLoadFile?: (file: RepositoryFile) => Promise<RepositoryFile>;
 }
 
 export const RepositoryView: React.FC<RepositoryViewProps> = ({
   repository,
   onBack,
   onFork,
-  onViewMergeRequests
+  onViewMergeRequests,
+  onLoadFile
 }) => {
   // Guard: repository.files may be empty until files are loaded or repo initialized
   const initialFile = repository.files && repository.files.length > 0 ? repository.files[0] : undefined;
@@ -37,6 +40,20 @@ export const RepositoryView: React.FC<RepositoryViewProps> = ({
   const [showCommitGraph, setShowCommitGraph] = useState(false);
   const [showImportModal, setShowImportModal] = useState(false);
   const [showChatbot, setShowChatbot] = useState(false);
+  const [loadedFiles, setLoadedFiles] = useState<Record<string, RepositoryFile>>({});
+
+  useEffect(() => {
+    if (!selectedFile || !onLoadFile || loadedFiles[selectedFile.id]) return;
+    let cancelled = false;
+    onLoadFile(selectedFile)
+      .catch(() => selectedFile) // fall back to what the list provided
+      .then((file) => {
+        if (!cancelled) setLoadedFiles(prev => ({ ...prev, [file.id]: file }));
+      });
+    return () => { cancelled = true; };
+  }, [selectedFile, onLoadFile, loadedFiles]);
+
+  const openFile = selectedFile && (onLoadFile ? loadedFiles[selectedFile.id] : selectedFile);
 
   const formatDate = (date: string) => {
     return new Date(date).toLocaleDateString('en-US', {
@@ -167,8 +184,12 @@ export const RepositoryView: React.FC<RepositoryViewProps> = ({
             </div>
 
             <div className="lg:col-span-2">
-              {selectedFile ? (
-                <FileEditor file={selectedFile} />
+              {openFile ? (
+                <FileEditor file={openFile} />
+              ) : selectedFile ? (
+                <div className="h-full flex items-center justify-center text-gray-500 text-sm border border-gray-700 rounded-lg p-8 bg-gray-800">
+                  Loading {selectedFile.name}…
+                </div>
               ) : (
                 <div className="h-full flex items-center justify-center text-gray-500 text-sm border border-dashed border-gray-700 rounded-lg p-8 bg-gray-800">
                   Select or add a file to begin.
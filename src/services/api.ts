@@ -81,6 +81,7 @@ class ApiService {
   }
 
   // Files
+  // Returns file summaries (no content); load a file's content with getFile
   async getRepositoryFiles(repoId: string, getToken: () => Promise<string | null>) {
     const headers = await this.getAuthHeaders(getToken);
     const response = await fetch(`${API_BASE_URL}/files/repository/${repoId}`, { headers });